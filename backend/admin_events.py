@@ -0,0 +1,179 @@
+"""
+Admin event stream (server-sent events).
+
+Endpoints publish small deltas ("registration.created", "registration.approved", ...) instead of
+clients polling whole lists. Every published event is inserted into a capped collection, and each
+worker runs one tailing cursor on it that fans the events out to the streams connected to that
+worker, so an event published on any worker reaches admins on all of them.
+
+While the tailer is not running (startup, Mongo errors, a server without tailable cursors) events
+are also delivered straight to the local subscribers. A client reconnecting with Last-Event-ID
+gets the events it missed replayed from the capped collection; when they have already rolled
+off, it gets a "resync" event and reloads the list.
+"""
+
+import asyncio
+import logging
+from typing import AsyncIterator, Callable, List, Optional, Set
+
+from bson import ObjectId
+from pymongo import CursorType
+from pymongo.errors import CollectionInvalid
+
+from timestamps import utcnow
+
+logger = logging.getLogger(__name__)
+
+RESYNC = "resync"
+# Tailable cursors die at once on an empty capped collection
+_INIT = "init"
+
+
+class _Subscriber:
+    __slots__ = ("queue", "overflowed")
+
+    def __init__(self, maxsize: int):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.overflowed = False
+
+
+class AdminEvents:
+    def __init__(self, get_db: Callable, collection: str = "admin_events", size_bytes: int = 1 << 20,
+                 max_events: int = 1000, subscriber_queue: int = 256, heartbeat_seconds: float = 15.0,
+                 retry_seconds: float = 2.0, max_retry_seconds: float = 60.0):
+        self.get_db = get_db
+        self.collection = collection
+        self.size_bytes = size_bytes
+        self.max_events = max_events
+        self.subscriber_queue = subscriber_queue
+        self.heartbeat_seconds = heartbeat_seconds
+        self.retry_seconds = retry_seconds
+        self.max_retry_seconds = max_retry_seconds
+        self.tailing = False
+        self._subscribers: Set[_Subscriber] = set()
+        self.published = 0
+        self.delivered = 0
+        self.overflows = 0
+        self.replayed = 0
+
+    async def _capped_collection(self):
+        db = self.get_db()
+        try:
+            await db.create_collection(self.collection, capped=True, size=self.size_bytes, max=self.max_events)
+        except CollectionInvalid:
+            pass
+        coll = db[self.collection]
+        if not (await coll.options()).get("capped"):
+            raise RuntimeError(f"Collection {self.collection} exists but is not capped")
+        if await coll.find_one({}, {"_id": 1}) is None:
+            await coll.insert_one({"id": str(ObjectId()), "type": _INIT})
+        return coll
+
+    async def publish(self, event_type: str, data: dict) -> dict:
+        event = {
+            "id": str(ObjectId()),
+            "type": event_type,
+            "data": data,
+            "created_at": utcnow()
+        }
+        self.published += 1
+        tailing = self.tailing
+        try:
+            await self.get_db()[self.collection].insert_one(dict(event))
+        except Exception as e:
+            logger.error(f"Admin event {event_type} not stored: {str(e)}")
+            tailing = False
+        if not tailing:
+            self._fanout(event)
+        return event
+
+    def _fanout(self, event: dict):
+        for subscriber in list(self._subscribers):
+            if subscriber.overflowed:
+                continue
+            try:
+                subscriber.queue.put_nowait(event)
+                self.delivered += 1
+            except asyncio.QueueFull:
+                # A stalled client; its stream ends and the reconnect replays from the collection
+                subscriber.overflowed = True
+                self.overflows += 1
+
+    async def run(self):
+        """Per-worker tailer of the capped collection"""
+        last_id = None
+        delay = self.retry_seconds
+        while True:
+            try:
+                coll = await self._capped_collection()
+                if last_id is None:
+                    newest = await coll.find_one({}, {"_id": 1}, sort=[("$natural", -1)])
+                    last_id = newest["_id"]
+                cursor = coll.find({"_id": {"$gt": last_id}}, {"_id": 1, "id": 1, "type": 1, "data": 1,
+                                                               "created_at": 1},
+                                   cursor_type=CursorType.TAILABLE_AWAIT)
+                self.tailing = True
+                delay = self.retry_seconds
+                while cursor.alive:
+                    async for doc in cursor:
+                        last_id = doc.pop("_id")
+                        if doc.get("type") != _INIT:
+                            self._fanout(doc)
+                    await asyncio.sleep(0.05)
+            except asyncio.CancelledError:
+                self.tailing = False
+                raise
+            except Exception as e:
+                self.tailing = False
+                logger.error(f"Admin event tailer stopped, delivering locally: {str(e)}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.max_retry_seconds)
+
+    async def _since(self, last_event_id: str) -> Optional[List[dict]]:
+        """Events stored after last_event_id, oldest first; None when it is no longer stored"""
+        docs = await self.get_db()[self.collection].find({}, {"_id": 0}).sort("$natural", 1).to_list(None)
+        for i, doc in enumerate(docs):
+            if doc.get("id") == last_event_id:
+                return [d for d in docs[i + 1:] if d.get("type") != _INIT]
+        return None
+
+    async def events(self, last_event_id: Optional[str] = None) -> AsyncIterator[Optional[dict]]:
+        """Events for one connected client; None is yielded as a heartbeat when nothing happens"""
+        subscriber = _Subscriber(self.subscriber_queue)
+        self._subscribers.add(subscriber)
+        try:
+            replayed = set()
+            if last_event_id:
+                try:
+                    missed = await self._since(last_event_id)
+                except Exception as e:
+                    logger.error(f"Admin event replay failed: {str(e)}")
+                    missed = None
+                if missed is None:
+                    yield {"id": None, "type": RESYNC, "data": {}}
+                else:
+                    for event in missed:
+                        replayed.add(event["id"])
+                        self.replayed += 1
+                        yield event
+
+            while not subscriber.overflowed:
+                try:
+                    event = await asyncio.wait_for(subscriber.queue.get(), self.heartbeat_seconds)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                if event["id"] not in replayed:
+                    yield event
+        finally:
+            self._subscribers.discard(subscriber)
+
+    def stats(self) -> dict:
+        return {
+            "tailing": self.tailing,
+            "subscribers": len(self._subscribers),
+            "published": self.published,
+            "delivered": self.delivered,
+            "replayed": self.replayed,
+            "overflows": self.overflows,
+        }
@@ -0,0 +1,182 @@
+"""
+Admission control for LLM calls.
+
+- a global cap on concurrent provider calls
+- a token bucket per user, so one student cannot burn the whole class budget
+- fair queuing: waiting calls are served round-robin across users, teachers first
+- waiting longer than the queue deadline (or a queue too long to make it) -> AdmissionRejected (HTTP 429)
+"""
+
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, Optional
+
+
+class AdmissionRejected(Exception):
+    """The call was not admitted; retry_after is a hint in seconds"""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    def __init__(self, rate_per_second: float, capacity: float):
+        self.rate = rate_per_second
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self) -> float:
+        """Take one token; returns 0 on success or the seconds until a token is available"""
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    @property
+    def is_full(self) -> bool:
+        self._refill()
+        return self.tokens >= self.capacity
+
+
+class AdmissionController:
+    MAX_IDLE_BUCKETS = 10000
+
+    def __init__(self, max_concurrent: int, user_rate_per_minute: float, user_burst: int, queue_timeout: float):
+        self.max_concurrent = max_concurrent
+        self.user_rate = user_rate_per_minute / 60
+        self.user_burst = user_burst
+        self.queue_timeout = queue_timeout
+
+        self.active = 0
+        self._buckets: Dict[str, TokenBucket] = {}
+        # user_id -> waiting futures; dict order is the round-robin order
+        self._priority: "OrderedDict[str, Deque[asyncio.Future]]" = OrderedDict()
+        self._normal: "OrderedDict[str, Deque[asyncio.Future]]" = OrderedDict()
+        self._queued = 0
+        # Smoothed slot hold time, used for Retry-After and early rejection
+        self._avg_service_seconds = None
+
+        self.admitted = 0
+        self.rejected_rate = 0
+        self.rejected_queue = 0
+
+    # ---------- per-user rate ----------
+
+    def check_rate(self, user_id: str):
+        """Charge one request to the user's token bucket or raise AdmissionRejected"""
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            if len(self._buckets) >= self.MAX_IDLE_BUCKETS:
+                self._buckets = {k: b for k, b in self._buckets.items() if not b.is_full}
+            bucket = self._buckets[user_id] = TokenBucket(self.user_rate, self.user_burst)
+        wait = bucket.take()
+        if wait:
+            self.rejected_rate += 1
+            raise AdmissionRejected("rate", max(1, math.ceil(wait)))
+
+    # ---------- concurrency slots ----------
+
+    def _estimated_wait(self) -> float:
+        if self._avg_service_seconds is None:
+            return 0.0
+        return (self._queued + 1) / self.max_concurrent * self._avg_service_seconds
+
+    def _enqueue(self, user_id: str, priority: bool) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        queues = self._priority if priority else self._normal
+        queues.setdefault(user_id, deque()).append(future)
+        self._queued += 1
+        return future
+
+    def _remove(self, user_id: str, future: asyncio.Future):
+        for queues in (self._priority, self._normal):
+            waiting = queues.get(user_id)
+            if waiting and future in waiting:
+                waiting.remove(future)
+                self._queued -= 1
+                if not waiting:
+                    del queues[user_id]
+                return
+
+    def _next_waiter(self):
+        for queues in (self._priority, self._normal):
+            while queues:
+                user_id, waiting = queues.popitem(last=False)
+                future = waiting.popleft()
+                self._queued -= 1
+                if waiting:
+                    # Move the user to the back of the round-robin
+                    queues[user_id] = waiting
+                if not future.done():
+                    return future
+        return None
+
+    def _release(self, held_seconds: Optional[float]):
+        if held_seconds is None:
+            pass
+        elif self._avg_service_seconds is None:
+            self._avg_service_seconds = held_seconds
+        else:
+            self._avg_service_seconds = 0.8 * self._avg_service_seconds + 0.2 * held_seconds
+        self.active -= 1
+        while self.active < self.max_concurrent:
+            future = self._next_waiter()
+            if future is None:
+                break
+            self.active += 1
+            future.set_result(True)
+
+    @asynccontextmanager
+    async def slot(self, user_id: str, priority: bool = False):
+        """Hold one of the global concurrency slots for the duration of the block"""
+        if self.active >= self.max_concurrent or self._queued:
+            if self._estimated_wait() > self.queue_timeout:
+                self.rejected_queue += 1
+                raise AdmissionRejected("queue", max(1, math.ceil(self._estimated_wait())))
+            future = self._enqueue(user_id, priority)
+            try:
+                await asyncio.wait_for(asyncio.shield(future), self.queue_timeout)
+            except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+                if future.done() and not future.cancelled():
+                    # Granted just as we gave up - hand the slot on
+                    self._release(None)
+                else:
+                    future.cancel()
+                    self._remove(user_id, future)
+                if isinstance(e, asyncio.CancelledError):
+                    raise
+                self.rejected_queue += 1
+                raise AdmissionRejected("queue", max(1, math.ceil(self._estimated_wait())))
+        else:
+            self.active += 1
+
+        self.admitted += 1
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self._release(time.monotonic() - start)
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrent": self.max_concurrent,
+            "active": self.active,
+            "queued": self._queued,
+            "queued_users": len(self._priority) + len(self._normal),
+            "admitted": self.admitted,
+            "rejected_rate_limited": self.rejected_rate,
+            "rejected_queue_timeout": self.rejected_queue,
+            "avg_service_seconds": round(self._avg_service_seconds or 0.0, 3),
+        }
@@ -0,0 +1,189 @@
+"""
+Near-duplicate answer cache for first-turn chat questions.
+
+"Čo je fotosyntéza?", "co je fotosynteza" and "Čo to je fotosyntéza??" should reuse one answer.
+Questions are normalized (case, diacritics, punctuation, Slovak stop words) and cut into
+character trigrams. A MinHash signature split into LSH bands finds candidates in constant time;
+a candidate is a hit when the exact Jaccard similarity of the trigram sets reaches the threshold.
+
+Entries are scoped, so an answer is only reused for the same grade and the same rendered
+source context. Numbers and math operators are not part of the fuzzy match: "2x + 5 = 15" and
+"2x + 5 = 17" are 90 % similar as trigrams but need different answers, so they have to be
+identical (in order) for a question to hit. The cache is per worker, bounded (LRU) and expires entries after a TTL.
+"""
+
+import random
+import re
+import time
+import unicodedata
+import zlib
+from collections import OrderedDict
+from typing import Dict, FrozenSet, List, Optional, Set, Tuple
+
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 3
+MIN_SHINGLES = 4
+
+_PRIME = (1 << 61) - 1
+_rng = random.Random(20240917)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+
+# Diacritics-free, as they appear after normalization
+STOP_WORDS = frozenset("""
+a aj ale alebo ani ako by co je k ku mi mna mne mozes na nam o od po pre prosim pri s sa si
+so som su ta tak ten to tu v vo z za ze
+""".split())
+
+_NON_WORD = re.compile(r"[^\w]+")
+_LITERAL = re.compile(r"\d+(?:[.,]\d+)*|[-+*/^=<>×·÷√%()]")
+
+
+def normalize(text: str) -> str:
+    folded = unicodedata.normalize("NFKD", text.casefold())
+    folded = "".join(ch for ch in folded if not unicodedata.combining(ch))
+    words = [w for w in _NON_WORD.sub(" ", folded).split() if w not in STOP_WORDS]
+    return " ".join(words)
+
+
+def literals(text: str) -> str:
+    """Numbers and operators of a question, in order; they must match exactly"""
+    return " ".join(_LITERAL.findall(unicodedata.normalize("NFKC", text)))
+
+
+def shingles(normalized: str) -> FrozenSet[str]:
+    if len(normalized) < SHINGLE_SIZE:
+        return frozenset([normalized]) if normalized else frozenset()
+    return frozenset(normalized[i:i + SHINGLE_SIZE] for i in range(len(normalized) - SHINGLE_SIZE + 1))
+
+
+def minhash(items: FrozenSet[str]) -> Tuple[int, ...]:
+    hashes = [zlib.crc32(item.encode("utf-8")) for item in items]
+    return tuple(min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMUTATIONS)
+
+
+def jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+class _Entry:
+    __slots__ = ("scope", "shingles", "bands", "answer", "created")
+
+    def __init__(self, scope: str, items: FrozenSet[str], bands: List[tuple], answer: str, created: float):
+        self.scope = scope
+        self.shingles = items
+        self.bands = bands
+        self.answer = answer
+        self.created = created
+
+
+class AnswerCache:
+    def __init__(self, threshold: float, max_entries: int, ttl_seconds: float):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        self._buckets: Dict[tuple, Set[int]] = {}
+        self._next_id = 0
+        self.lookups = 0
+        self.hits = 0
+        self.stores = 0
+        self.evictions = 0
+        self._lookup_seconds = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    @staticmethod
+    def _bands(scope: str, signature: Tuple[int, ...]) -> List[tuple]:
+        return [(scope, band, signature[band * ROWS:(band + 1) * ROWS]) for band in range(BANDS)]
+
+    @staticmethod
+    def _scoped(scope: str, question: str) -> str:
+        return f"{scope}|{literals(question)}"
+
+    @staticmethod
+    def _prepare(question: str) -> Optional[FrozenSet[str]]:
+        items = shingles(normalize(question))
+        # Too little left to compare ("ahoj", "?") - never cached
+        return items if len(items) >= MIN_SHINGLES else None
+
+    def get(self, scope: str, question: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+        start = time.perf_counter()
+        self.lookups += 1
+        answer = self._lookup(self._scoped(scope, question), question)
+        if answer is not None:
+            self.hits += 1
+        self._lookup_seconds += time.perf_counter() - start
+        return answer
+
+    def _lookup(self, scope: str, question: str) -> Optional[str]:
+        items = self._prepare(question)
+        if items is None:
+            return None
+        candidates = set()
+        for key in self._bands(scope, minhash(items)):
+            candidates |= self._buckets.get(key, set())
+
+        now = time.monotonic()
+        best_id, best_score = None, self.threshold
+        for entry_id in candidates:
+            entry = self._entries[entry_id]
+            if now - entry.created >= self.ttl_seconds:
+                self._remove(entry_id)
+                continue
+            score = jaccard(items, entry.shingles)
+            if score >= best_score:
+                best_id, best_score = entry_id, score
+        if best_id is None:
+            return None
+        self._entries.move_to_end(best_id)
+        return self._entries[best_id].answer
+
+    def put(self, scope: str, question: str, answer: str):
+        if not self.enabled:
+            return
+        items = self._prepare(question)
+        if items is None:
+            return
+        scope = self._scoped(scope, question)
+        entry_id = self._next_id
+        self._next_id += 1
+        bands = self._bands(scope, minhash(items))
+        self._entries[entry_id] = _Entry(scope, items, bands, answer, time.monotonic())
+        for key in bands:
+            self._buckets.setdefault(key, set()).add(entry_id)
+        self.stores += 1
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _remove(self, entry_id: int):
+        entry = self._entries.pop(entry_id)
+        for key in entry.bands:
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del self._buckets[key]
+
+    def clear(self):
+        self._entries.clear()
+        self._buckets.clear()
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "threshold": self.threshold,
+            "entries": len(self._entries),
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "hit_rate": round(self.hits / self.lookups, 4) if self.lookups else 0.0,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "avg_lookup_ms": round(self._lookup_seconds * 1000 / self.lookups, 3) if self.lookups else 0.0,
+        }
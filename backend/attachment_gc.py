@@ -0,0 +1,175 @@
+"""
+Garbage collection for uploaded files.
+
+Two passes, both limited to objects older than a grace period (an upload writes the blob
+before its document, and a chat message links its attachments only after the upload):
+
+- orphaned attachments: chat_attachments / attachments documents never linked to a message
+- unreferenced blobs: files in storage that no document points at
+
+Work is done in small batches with a pause in between, so a sweep never competes with requests.
+"""
+
+import asyncio
+import logging
+import os
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Optional
+
+from storage import BlobStorage
+from timestamps import utcnow
+
+logger = logging.getLogger(__name__)
+
+ATTACHMENT_COLLECTIONS = ("chat_attachments", "attachments")
+# Every collection whose documents own a blob
+BLOB_COLLECTIONS = ("ai_sources",) + ATTACHMENT_COLLECTIONS
+
+
+class AttachmentSweeper:
+    def __init__(self, get_db: Callable, storage: BlobStorage, grace_seconds: float,
+                 batch_size: int = 100, pause_seconds: float = 0.5, concurrency: int = 8):
+        self.get_db = get_db
+        self.storage = storage
+        self.grace_seconds = grace_seconds
+        self.batch_size = batch_size
+        self.pause_seconds = pause_seconds
+        self.concurrency = concurrency
+        self._lock = asyncio.Lock()
+        self.last_report: Optional[dict] = None
+
+    async def sweep(self, dry_run: bool = False) -> dict:
+        """One full pass; returns what was (or, with dry_run, would be) reclaimed"""
+        async with self._lock:
+            start = time.perf_counter()
+            report = {
+                "dry_run": dry_run,
+                "started_at": datetime.now(timezone.utc).isoformat(),
+                "orphaned_attachments": 0,
+                "unreferenced_files": 0,
+                "bytes_reclaimed": 0,
+                "errors": 0,
+            }
+            await self._sweep_orphaned_attachments(report, dry_run)
+            await self._sweep_unreferenced_files(report, dry_run)
+            report["duration_ms"] = round((time.perf_counter() - start) * 1000, 1)
+            if not dry_run:
+                self.last_report = report
+            return report
+
+    async def _delete_blobs(self, keys, report):
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def delete(key):
+            async with semaphore:
+                try:
+                    await self.storage.delete(key)
+                except Exception as e:
+                    logger.error(f"Attachment GC could not delete blob {key}: {str(e)}")
+                    report["errors"] += 1
+
+        await asyncio.gather(*(delete(key) for key in keys))
+
+    async def _blob_size(self, doc) -> int:
+        if doc.get("file_size") is not None:
+            return doc["file_size"]
+        if doc.get("storage_key"):
+            return await self.storage.size(doc["storage_key"]) or 0
+        if doc.get("file_path") and os.path.isfile(doc["file_path"]):
+            return os.path.getsize(doc["file_path"])
+        return 0
+
+    async def _delete_files(self, docs, report):
+        await self._delete_blobs([doc["storage_key"] for doc in docs if doc.get("storage_key")], report)
+        # Documents from before the storage backend point at a plain file
+        for doc in docs:
+            if not doc.get("storage_key") and doc.get("file_path"):
+                try:
+                    os.remove(doc["file_path"])
+                except FileNotFoundError:
+                    pass
+
+    # ---------- orphaned attachment documents ----------
+
+    async def _sweep_orphaned_attachments(self, report, dry_run):
+        db = self.get_db()
+        cutoff = utcnow() - timedelta(seconds=self.grace_seconds)
+        orphan_filter = {"message_id": None, "created_at": {"$lt": cutoff}, "gc_claim": {"$exists": False}}
+        projection = {"_id": 0, "id": 1, "storage_key": 1, "file_path": 1, "file_size": 1}
+
+        for name in ATTACHMENT_COLLECTIONS:
+            collection = db[name]
+            last_id = ""
+            while True:
+                batch = await collection.find(
+                    {**orphan_filter, "id": {"$gt": last_id}}, projection
+                ).sort("id", 1).limit(self.batch_size).to_list(self.batch_size)
+                if not batch:
+                    break
+                last_id = batch[-1]["id"]
+
+                if dry_run:
+                    sizes = await asyncio.gather(*(self._blob_size(doc) for doc in batch))
+                    report["orphaned_attachments"] += len(batch)
+                    report["bytes_reclaimed"] += sum(sizes)
+                    continue
+
+                # Claim first: linking only touches unclaimed documents, so a message sent
+                # while we sweep either links the attachment before the claim or not at all
+                claim = str(uuid.uuid4())
+                await collection.update_many(
+                    {**orphan_filter, "id": {"$in": [doc["id"] for doc in batch]}},
+                    {"$set": {"gc_claim": claim}}
+                )
+                claimed = await collection.find({"gc_claim": claim}, projection).to_list(self.batch_size)
+                if claimed:
+                    sizes = await asyncio.gather(*(self._blob_size(doc) for doc in claimed))
+                    await self._delete_files(claimed, report)
+                    await collection.delete_many({"gc_claim": claim})
+                    report["orphaned_attachments"] += len(claimed)
+                    report["bytes_reclaimed"] += sum(sizes)
+                await asyncio.sleep(self.pause_seconds)
+
+    # ---------- blobs without a document ----------
+
+    async def _sweep_unreferenced_files(self, report, dry_run):
+        db = self.get_db()
+        cutoff = time.time() - self.grace_seconds
+
+        async for blobs in self.storage.list_blobs(self.batch_size):
+            candidates = {blob.key: blob for blob in blobs if blob.modified < cutoff}
+            if not candidates:
+                continue
+            keys = list(candidates)
+            referenced = set()
+            for name in BLOB_COLLECTIONS:
+                docs = await db[name].find(
+                    {"storage_key": {"$in": keys}}, {"_id": 0, "storage_key": 1}
+                ).to_list(len(keys))
+                referenced.update(doc["storage_key"] for doc in docs)
+            garbage = [key for key in keys if key not in referenced]
+            if not garbage:
+                continue
+            if not dry_run:
+                await self._delete_blobs(garbage, report)
+            report["unreferenced_files"] += len(garbage)
+            report["bytes_reclaimed"] += sum(candidates[key].size for key in garbage)
+            await asyncio.sleep(self.pause_seconds)
+
+    async def run(self, interval_seconds: float):
+        """Background sweep loop"""
+        while True:
+            await asyncio.sleep(interval_seconds)
+            try:
+                report = await self.sweep()
+            except Exception as e:
+                logger.error(f"Attachment GC failed: {str(e)}")
+                continue
+            if report["orphaned_attachments"] or report["unreferenced_files"]:
+                logger.info(
+                    f"Attachment GC removed {report['orphaned_attachments']} orphaned attachments and "
+                    f"{report['unreferenced_files']} unreferenced files, "
+                    f"reclaimed {report['bytes_reclaimed'] / 1024 / 1024:.1f} MB in {report['duration_ms']} ms"
+                )
@@ -0,0 +1,115 @@
+"""
+Audit log of administrative changes.
+
+Endpoints hand events to an in-memory queue and return; a background writer drains the queue
+and stores the events with one insert_many per batch. The queue is bounded: when the writer
+falls behind (or Mongo is down), record() waits briefly for room, which slows the callers
+down, and drops the event only if no room frees up in time.
+"""
+
+import asyncio
+import logging
+import uuid
+from typing import Callable, List, Optional
+
+from pymongo.errors import BulkWriteError
+
+from timestamps import utcnow
+
+logger = logging.getLogger(__name__)
+
+
+def changes(before: dict, after: dict) -> dict:
+    """{field: [old, new]} for the fields of `after` whose value differs from `before`"""
+    return {k: [before.get(k), v] for k, v in after.items() if before.get(k) != v and k != "updated_at"}
+
+
+class AuditLog:
+    def __init__(self, get_collection: Callable, max_queue: int = 10000, batch_size: int = 500,
+                 put_timeout: float = 0.5, retry_seconds: float = 2.0):
+        self.get_collection = get_collection
+        self.batch_size = batch_size
+        self.put_timeout = put_timeout
+        self.retry_seconds = retry_seconds
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._batch: List[dict] = []
+        self._write_lock = asyncio.Lock()
+        self.recorded = 0
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+
+    async def record(self, actor: Optional[dict], action: str, target_type: str, target_id: Optional[str],
+                     details: Optional[dict] = None, target_name: Optional[str] = None):
+        event = {
+            "id": str(uuid.uuid4()),
+            "action": action,
+            "actor_id": actor["id"] if actor else None,
+            "actor_email": actor.get("email") if actor else None,
+            "target_type": target_type,
+            "target_id": target_id,
+            "target_name": target_name,
+            "details": details or {},
+            "created_at": utcnow()
+        }
+        try:
+            await asyncio.wait_for(self._queue.put(event), self.put_timeout)
+        except asyncio.TimeoutError:
+            self.dropped += 1
+            logger.error(f"Audit queue full, dropped {action} on {target_type} {target_id}")
+            return
+        self.recorded += 1
+
+    def _drain(self):
+        while len(self._batch) < self.batch_size:
+            try:
+                self._batch.append(self._queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+
+    async def _write_batch(self) -> int:
+        """Insert the current batch; on failure it is kept and retried"""
+        async with self._write_lock:
+            self._drain()
+            if not self._batch:
+                return 0
+            batch = self._batch
+            try:
+                await self.get_collection().insert_many(batch, ordered=False)
+            except BulkWriteError as e:
+                # A retried batch: events stored by the failed attempt come back as duplicate keys
+                if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+                    raise
+            self._batch = []
+            self.written += len(batch)
+            self.batches += 1
+            return len(batch)
+
+    async def flush(self) -> int:
+        """Write everything queued so far (shutdown, tests)"""
+        total = 0
+        while True:
+            written = await self._write_batch()
+            if not written:
+                return total
+            total += written
+
+    async def run(self):
+        """Background writer"""
+        while True:
+            if not self._batch:
+                self._batch.append(await self._queue.get())
+            try:
+                await self._write_batch()
+            except Exception as e:
+                logger.error(f"Audit write of {len(self._batch)} events failed, retrying: {str(e)}")
+                await asyncio.sleep(self.retry_seconds)
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize() + len(self._batch),
+            "recorded": self.recorded,
+            "written": self.written,
+            "dropped": self.dropped,
+            "batches": self.batches,
+        }
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Date-range benchmark: ISO string timestamps against BSON dates.
+
+Seeds a scratch database with messages whose created_at is an ISO string (the old format),
+measures the typical range queries, converts the collection with migrate_timestamps.py and
+measures again:
+- count of one week of messages (index range scan on created_at)
+- newest 100 messages of a day (range + sort + limit)
+- messages per day over 30 days (aggregation; $substr on strings, $dateToString on dates)
+- data and index size of the collection
+
+    python bench_date_ranges.py --docs 200000 --runs 5
+    python bench_date_ranges.py --mongo mongodb://localhost:27017 --json dates.json
+
+The scratch database is dropped afterwards unless --keep is given.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from migrate_timestamps import migrate_collection
+
+DAYS = 365
+ORIGIN = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+def day(offset: int) -> datetime:
+    return ORIGIN + timedelta(days=offset)
+
+
+def bound(value: datetime, as_string: bool):
+    return value.isoformat() if as_string else value
+
+
+async def seed(collection, docs: int, batch: int = 5000):
+    rng = random.Random(7)
+    chat_ids = [str(uuid.uuid4()) for _ in range(max(1, docs // 50))]
+    for start in range(0, docs, batch):
+        await collection.insert_many([{
+            "id": str(uuid.uuid4()),
+            "chat_id": rng.choice(chat_ids),
+            "sender_type": "user" if i % 2 else "ai",
+            "content": "Čo je fotosyntéza? " * rng.randint(1, 4),
+            "created_at": (ORIGIN + timedelta(seconds=rng.randrange(DAYS * 86400),
+                                              microseconds=rng.randrange(1000000))).isoformat()
+        } for i in range(start, min(start + batch, docs))], ordered=False)
+    await collection.create_index([("created_at", 1)])
+
+
+async def timed(runs: int, query) -> dict:
+    samples = []
+    result = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = await query()
+        samples.append(round((time.perf_counter() - start) * 1000, 2))
+    return {"median_ms": round(statistics.median(samples), 2), "min_ms": min(samples), "result": result}
+
+
+async def measure(db, collection, runs: int, as_string: bool) -> dict:
+    week = {"created_at": {"$gte": bound(day(100), as_string), "$lt": bound(day(107), as_string)}}
+    one_day = {"created_at": {"$gte": bound(day(200), as_string), "$lt": bound(day(201), as_string)}}
+    month = {"created_at": {"$gte": bound(day(300), as_string), "$lt": bound(day(330), as_string)}}
+    per_day = ({"$substr": ["$created_at", 0, 10]} if as_string
+               else {"$dateToString": {"format": "%Y-%m-%d", "date": "$created_at"}})
+
+    async def newest_of_day():
+        docs = await collection.find(one_day, {"_id": 0, "id": 1}).sort("created_at", -1).limit(100).to_list(100)
+        return len(docs)
+
+    async def daily_counts():
+        rows = await collection.aggregate([
+            {"$match": month},
+            {"$group": {"_id": per_day, "messages": {"$sum": 1}}},
+        ]).to_list(None)
+        return len(rows)
+
+    report = {
+        "week_count": await timed(runs, lambda: collection.count_documents(week)),
+        "day_newest_100": await timed(runs, newest_of_day),
+        "daily_counts_30_days": await timed(runs, daily_counts),
+    }
+    try:
+        stats = await db.command("collStats", collection.name)
+        report["size_bytes"] = stats["size"]
+        report["avg_doc_bytes"] = stats.get("avgObjSize")
+        report["index_bytes"] = stats["indexSizes"].get("created_at_1")
+    except Exception:
+        # mongomock has no collStats
+        pass
+    return report
+
+
+def print_comparison(before: dict, after: dict):
+    print(f"\n{'':<24}{'ISO strings':>16}{'BSON dates':>16}")
+    for name in ("week_count", "day_newest_100", "daily_counts_30_days"):
+        print(f"{name:<24}{before[name]['median_ms']:>13.2f} ms{after[name]['median_ms']:>13.2f} ms")
+    for name in ("avg_doc_bytes", "size_bytes", "index_bytes"):
+        if before.get(name) is not None and after.get(name) is not None:
+            print(f"{name:<24}{before[name]:>16}{after[name]:>16}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Compare date-range queries on ISO strings and BSON dates")
+    parser.add_argument("--mongo", default=os.environ.get("MONGO_URL", "mongodb://localhost:27017"),
+                        help="'mock' for mongomock-motor or a mongodb:// URL")
+    parser.add_argument("--docs", type=int, default=200000)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch database")
+    parser.add_argument("--json", help="Write the report to this file")
+    args = parser.parse_args()
+
+    if args.mongo == "mock":
+        from mongomock_motor import AsyncMongoMockClient
+        client = AsyncMongoMockClient(tz_aware=True)
+    else:
+        client = AsyncIOMotorClient(args.mongo, tz_aware=True)
+    db_name = f"pocketbuddy_bench_dates_{uuid.uuid4().hex[:8]}"
+    db = client[db_name]
+    collection = db.messages
+    try:
+        print(f"🌱 Seeding {args.docs} messages with ISO string timestamps...")
+        await seed(collection, args.docs)
+        before = await measure(db, collection, args.runs, as_string=True)
+
+        start = time.perf_counter()
+        migrated = await migrate_collection(db, "messages", ("created_at",), batch_size=1000)
+        migration_s = round(time.perf_counter() - start, 2)
+        print(f"🔁 Converted {migrated['converted']} documents in {migration_s} s")
+        # Updates leave padding behind; compact so the sizes compare like for like
+        if args.mongo != "mock":
+            try:
+                await db.command("compact", "messages")
+            except Exception as e:
+                print(f"⚠️  compact failed, sizes include update padding: {e}")
+        after = await measure(db, collection, args.runs, as_string=False)
+
+        for name in ("week_count", "day_newest_100", "daily_counts_30_days"):
+            assert before[name]["result"] == after[name]["result"], f"{name} differs after the migration"
+        print_comparison(before, after)
+
+        if args.json:
+            report = {"docs": args.docs, "runs": args.runs, "migration_s": migration_s,
+                      "iso_strings": before, "bson_dates": after}
+            Path(args.json).write_text(json.dumps(report, indent=2))
+            print(f"\nReport written to {args.json}")
+    finally:
+        if not args.keep:
+            await client.drop_database(db_name)
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Cold-start benchmark for the PocketBuddy API.
+
+Measures, each in a fresh interpreter:
+- import time of server.py (and the slowest modules it pulls in, via -X importtime)
+- time from spawning uvicorn until the first request is answered
+
+    python bench_startup.py --runs 5
+    python bench_startup.py --runs 5 --json startup.json
+
+The first-request probe hits /api/health/live, so it does not need a reachable MongoDB.
+"""
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).parent
+
+IMPORT_SNIPPET = (
+    "import time; t = time.perf_counter(); import server; "
+    "print(round((time.perf_counter() - t) * 1000, 1))"
+)
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def measure_import() -> float:
+    out = subprocess.run(
+        [sys.executable, "-c", IMPORT_SNIPPET],
+        cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+    )
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def slowest_imports(top: int):
+    """Cumulative import time per module, from a single -X importtime run"""
+    out = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import server"],
+        cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+    )
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = [part.strip() for part in line[len("import time:"):].split("|")]
+        # Top-level packages only; submodules are included in their parent's cumulative time
+        if "." not in name and name != "server":
+            rows.append((name, round(int(cumulative_us) / 1000, 1)))
+    return sorted(rows, key=lambda r: r[1], reverse=True)[:top]
+
+
+def measure_first_request(timeout: float) -> float:
+    port = free_port()
+    url = f"http://127.0.0.1:{port}/api/health/live"
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=BACKEND_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            if proc.poll() is not None:
+                raise RuntimeError(f"uvicorn exited early:\n{proc.stderr.read().decode(errors='replace')}")
+            try:
+                with urllib.request.urlopen(url, timeout=1) as response:
+                    if response.status == 200:
+                        return round((time.perf_counter() - start) * 1000, 1)
+            except OSError:
+                time.sleep(0.01)
+        raise TimeoutError(f"No response from {url} within {timeout}s")
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def summarize(samples):
+    return {
+        "min_ms": min(samples),
+        "median_ms": round(statistics.median(samples), 1),
+        "max_ms": max(samples),
+        "samples_ms": samples,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure PocketBuddy API import time and time to first request")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="Slowest top-level imports to list")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Seconds to wait for the first response")
+    parser.add_argument("--skip-server", action="store_true", help="Only measure import time")
+    parser.add_argument("--json", help="Write the report to this file")
+    args = parser.parse_args()
+
+    os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+    os.environ.setdefault("DB_NAME", "pocketbuddy_bench_startup")
+
+    report = {
+        "python": sys.version.split()[0],
+        "import": summarize([measure_import() for _ in range(args.runs)]),
+        "slowest_imports_ms": slowest_imports(args.top),
+    }
+    if not args.skip_server:
+        report["first_request"] = summarize([measure_first_request(args.timeout) for _ in range(args.runs)])
+
+    print(f"\n⏱️  import server       median {report['import']['median_ms']:>8} ms "
+          f"(min {report['import']['min_ms']}, max {report['import']['max_ms']})")
+    if "first_request" in report:
+        fr = report["first_request"]
+        print(f"⏱️  first request      median {fr['median_ms']:>8} ms (min {fr['min_ms']}, max {fr['max_ms']})")
+    print("\nSlowest imports (cumulative):")
+    for name, ms in report["slowest_imports_ms"]:
+        print(f"  {name:<32} {ms:>8.1f} ms")
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2))
+        print(f"\nReport written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
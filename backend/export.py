@@ -0,0 +1,87 @@
+"""
+Streaming encoders for data exports.
+
+Rows come straight from a Mongo cursor and leave as NDJSON or CSV chunks (optionally gzip),
+so an export of any size holds only one cursor batch and one output chunk in memory.
+"""
+
+import csv
+import io
+import json
+import zlib
+from typing import AsyncIterable, AsyncIterator, List
+
+# Bytes collected before a chunk is sent
+CHUNK_BYTES = 64 * 1024
+
+FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv; charset=utf-8", "csv"),
+}
+
+
+# Cells starting with these are formulas in Excel and LibreOffice (CSV injection)
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+def _json_default(value):
+    # datetimes and other BSON values
+    return value.isoformat() if hasattr(value, "isoformat") else str(value)
+
+
+async def ndjson_chunks(rows: AsyncIterable[dict]) -> AsyncIterator[bytes]:
+    buffer = []
+    size = 0
+    async for row in rows:
+        line = json.dumps(row, ensure_ascii=False, default=_json_default) + "\n"
+        buffer.append(line)
+        size += len(line)
+        if size >= CHUNK_BYTES:
+            yield "".join(buffer).encode("utf-8")
+            buffer, size = [], 0
+    if buffer:
+        yield "".join(buffer).encode("utf-8")
+
+
+async def csv_chunks(rows: AsyncIterable[dict], columns: List[str]) -> AsyncIterator[bytes]:
+    out = io.StringIO()
+    # BOM so Excel opens Slovak diacritics correctly
+    out.write("\ufeff")
+    writer = csv.DictWriter(out, fieldnames=columns, extrasaction="ignore")
+    writer.writeheader()
+    async for row in rows:
+        writer.writerow({k: _csv_value(row.get(k)) for k in columns})
+        if out.tell() >= CHUNK_BYTES:
+            yield out.getvalue().encode("utf-8")
+            out.seek(0)
+            out.truncate()
+    if out.tell():
+        yield out.getvalue().encode("utf-8")
+
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, ensure_ascii=False, default=_json_default)
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        # A spreadsheet would evaluate the cell; names and messages are user content
+        return "'" + value
+    return value
+
+
+async def gzip_chunks(chunks: AsyncIterable[bytes]) -> AsyncIterator[bytes]:
+    """Compress on the fly into a single gzip member"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    async for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def encode(rows: AsyncIterable[dict], fmt: str, columns: List[str], gzip: bool) -> AsyncIterator[bytes]:
+    chunks = csv_chunks(rows, columns) if fmt == "csv" else ndjson_chunks(rows)
+    return gzip_chunks(chunks) if gzip else chunks
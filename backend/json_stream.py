@@ -0,0 +1,114 @@
+"""
+Incremental parser for a JSON array of objects embedded in LLM output.
+
+Models wrap the array in prose ("Tu sú kartičky: [...] Veľa šťastia!"), sometimes never close
+it, and sometimes break one element. The parser is fed text as it arrives and returns every
+top-level object as soon as its closing brace is seen. Text before the array and anything after
+its closing bracket is ignored; an element that fails to parse is skipped.
+"""
+
+import json
+from typing import List
+
+# Parser states
+SEEKING = 0     # before the array
+IN_ARRAY = 1    # between elements
+IN_OBJECT = 2   # inside a top-level object
+SKIPPING = 3    # inside a top-level non-object element
+DONE = 4        # after the closing bracket
+
+
+class JsonArrayStream:
+    def __init__(self):
+        self.state = SEEKING
+        self.skipped = 0
+        self._buffer: List[str] = []
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        # '[' seen while seeking; only an array whose first element is an object counts
+        self._candidate = False
+
+    @property
+    def done(self) -> bool:
+        return self.state == DONE
+
+    def feed(self, text: str) -> List[dict]:
+        """Consume the next chunk; returns the objects completed by it"""
+        items = []
+        for ch in text:
+            if self.state == DONE:
+                break
+            if self.state == SEEKING:
+                self._seek(ch)
+            elif self.state == IN_ARRAY:
+                if ch == "{":
+                    self._start_element(IN_OBJECT, ch)
+                elif ch == "]":
+                    self.state = DONE
+                elif not (ch.isspace() or ch == ","):
+                    self._start_element(SKIPPING, ch)
+            else:
+                item = self._element_char(ch)
+                if item is not None:
+                    items.append(item)
+        return items
+
+    def _seek(self, ch: str):
+        if ch == "[":
+            self._candidate = True
+        elif self._candidate and ch == "{":
+            self.state = IN_ARRAY
+            self._start_element(IN_OBJECT, ch)
+        elif self._candidate and not ch.isspace():
+            # "[poznámka]" in the prose, not the array
+            self._candidate = False
+
+    def _start_element(self, state: int, ch: str):
+        self.state = state
+        self._buffer = [ch]
+        self._depth = 1 if ch in "{[" else 0
+        self._in_string = ch == '"'
+        self._escape = False
+
+    def _element_char(self, ch: str):
+        if self._in_string:
+            if self.state == IN_OBJECT:
+                self._buffer.append(ch)
+            if self._escape:
+                self._escape = False
+            elif ch == "\\":
+                self._escape = True
+            elif ch == '"':
+                self._in_string = False
+            return None
+
+        if self.state == SKIPPING and self._depth == 0 and ch in ",]":
+            self.skipped += 1
+            self.state = DONE if ch == "]" else IN_ARRAY
+            return None
+        if self.state == IN_OBJECT:
+            self._buffer.append(ch)
+        if ch == '"':
+            self._in_string = True
+        elif ch in "{[":
+            self._depth += 1
+        elif ch in "}]":
+            self._depth -= 1
+            if self._depth == 0 and self.state == IN_OBJECT:
+                self.state = IN_ARRAY
+                return self._decode("".join(self._buffer))
+        return None
+
+    def _decode(self, raw: str):
+        try:
+            item = json.loads(raw)
+        except ValueError:
+            self.skipped += 1
+            return None
+        return item if isinstance(item, dict) else None
+
+
+def parse_array(text: str) -> List[dict]:
+    """All objects of the first array in a complete response"""
+    return JsonArrayStream().feed(text)
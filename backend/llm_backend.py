@@ -0,0 +1,201 @@
+"""
+Pluggable LLM backends for PocketBuddy.
+
+- live:   calls the provider through emergentintegrations (default)
+- record: calls the provider and stores every (system prompt, user message, model) -> response pair
+- replay: answers from the stored pairs only, without network access or cost
+
+Select with LLM_BACKEND=live|record|replay and LLM_CASSETTE=<path>.
+The provider client and the cassette are loaded on first use, not at import.
+"""
+
+import asyncio
+import gzip
+import hashlib
+import json
+import logging
+import threading
+from pathlib import Path
+from typing import AsyncIterator, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def request_key(provider: str, model: str, system_message: str, text: str) -> str:
+    """Stable key for a fully rendered LLM request"""
+    raw = json.dumps([provider, model, system_message, text], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+
+class LLMReplayMiss(LookupError):
+    """Replay backend has no recorded response for the request"""
+
+
+class LLMBackend:
+    """Interface every backend implements"""
+
+    name = "base"
+
+    async def complete(self, provider: str, model: str, system_message: str, text: str, session_id: str) -> str:
+        raise NotImplementedError
+
+    async def stream(self, provider: str, model: str, system_message: str, text: str,
+                     session_id: str) -> AsyncIterator[str]:
+        """Response text in chunks as it is generated; backends without streaming yield it whole"""
+        yield await self.complete(provider, model, system_message, text, session_id)
+
+
+class EmergentLLMBackend(LLMBackend):
+    """Real provider calls through the Emergent LLM key"""
+
+    name = "live"
+
+    def __init__(self, api_key: Optional[str]):
+        self.api_key = api_key
+
+    async def complete(self, provider, model, system_message, text, session_id):
+        # Pulls in the provider SDKs; deferred so importing the app stays fast
+        from emergentintegrations.llm.chat import LlmChat, UserMessage
+        llm_chat = LlmChat(
+            api_key=self.api_key,
+            session_id=session_id,
+            system_message=system_message
+        ).with_model(provider, model)
+        return await llm_chat.send_message(UserMessage(text=text))
+
+
+class CassetteStore:
+    """
+    Compact response store: gzip-compressed JSON lines keyed by a hash of the request.
+    Appends are written as extra gzip members, which gzip readers concatenate transparently.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._entries: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    def load(self):
+        with self._lock:
+            if self._loaded:
+                return
+            self._loaded = True
+            if self.path.exists():
+                self._read()
+
+    def _read(self):
+        with gzip.open(self.path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self._entries[entry["k"]] = entry["r"]
+        logger.info(f"Loaded {len(self._entries)} recorded LLM responses from {self.path}")
+
+    def get(self, key: str) -> Optional[str]:
+        self.load()
+        return self._entries.get(key)
+
+    def put(self, key: str, model: str, response: str):
+        self.load()
+        with self._lock:
+            if self._entries.get(key) == response:
+                return
+            self._entries[key] = response
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with gzip.open(self.path, "at", encoding="utf-8") as f:
+                f.write(json.dumps({"k": key, "m": model, "r": response}, ensure_ascii=False) + "\n")
+
+    def __len__(self):
+        self.load()
+        return len(self._entries)
+
+
+class RecordingLLMBackend(LLMBackend):
+    """Delegates to another backend and records every successful response"""
+
+    name = "record"
+
+    def __init__(self, inner: LLMBackend, store: CassetteStore):
+        self.inner = inner
+        self.store = store
+
+    async def complete(self, provider, model, system_message, text, session_id):
+        response = await self.inner.complete(provider, model, system_message, text, session_id)
+        if response:
+            self.store.put(request_key(provider, model, system_message, text), f"{provider}/{model}", response)
+        return response
+
+
+class ReplayLLMBackend(LLMBackend):
+    """Serves recorded responses; unknown requests raise LLMReplayMiss"""
+
+    name = "replay"
+    # Recorded responses are streamed back in pieces of this size
+    stream_chunk_chars = 64
+
+    def __init__(self, store: CassetteStore):
+        self.store = store
+
+    async def complete(self, provider, model, system_message, text, session_id):
+        response = self.store.get(request_key(provider, model, system_message, text))
+        if response is None:
+            raise LLMReplayMiss(f"No recorded response for {provider}/{model}")
+        return response
+
+    async def stream(self, provider, model, system_message, text, session_id):
+        response = await self.complete(provider, model, system_message, text, session_id)
+        for i in range(0, len(response), self.stream_chunk_chars):
+            yield response[i:i + self.stream_chunk_chars]
+            await asyncio.sleep(0)
+
+
+class SingleFlight:
+    """
+    Coalesces identical in-flight calls: the first caller for a key starts the work,
+    concurrent callers with the same key await the same result.
+    The shared call runs in its own task, so a disconnecting leader does not cancel it for the others.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable]):
+        task = self._inflight.get(key)
+        if task is None:
+            self.leaders += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _done(self, key: str, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            # Mark the exception as retrieved when every waiter has gone away
+            task.exception()
+
+    def stats(self) -> dict:
+        total = self.leaders + self.coalesced
+        return {
+            "in_flight": len(self._inflight),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "coalesce_ratio": round(self.coalesced / total, 4) if total else 0.0,
+        }
+
+
+def create_llm_backend(mode: str, api_key: Optional[str], cassette_path: Path) -> LLMBackend:
+    mode = (mode or "live").lower()
+    if mode == "live":
+        return EmergentLLMBackend(api_key)
+    if mode == "record":
+        return RecordingLLMBackend(EmergentLLMBackend(api_key), CassetteStore(cassette_path))
+    if mode == "replay":
+        return ReplayLLMBackend(CassetteStore(cassette_path))
+    raise ValueError(f"Unknown LLM_BACKEND '{mode}' (expected live, record or replay)")
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Converts ISO string timestamps (created_at, updated_at, ...) into native BSON dates.
+
+Collections are walked in _id order in batches; each batch is one bulk write, and every update
+only applies while the field still holds the string that was read, so documents rewritten by
+the app meanwhile are left alone. The position is checkpointed in the `migrations` collection
+after every batch: an interrupted run continues where it stopped, a finished collection is
+skipped. Deploy the code that writes dates first, so no new strings appear behind the cursor.
+
+    python migrate_timestamps.py --dry-run
+    python migrate_timestamps.py --batch-size 1000 --pause 0.1
+    python migrate_timestamps.py --collections messages chats --restart
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+
+from timestamps import parse, utcnow
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+TIMESTAMP_FIELDS: Dict[str, Tuple[str, ...]] = {
+    "users": ("created_at", "updated_at"),
+    "registration_requests": ("created_at", "updated_at"),
+    "grades": ("created_at", "updated_at"),
+    "classes": ("created_at", "updated_at"),
+    "subjects": ("created_at", "updated_at"),
+    "teacher_subjects": ("created_at", "updated_at"),
+    "ai_sources": ("created_at", "updated_at"),
+    "chats": ("created_at", "updated_at", "deleted_at", "archived_at"),
+    "messages": ("created_at",),
+    "chat_attachments": ("created_at",),
+    "attachments": ("created_at",),
+    "chat_archives": ("created_at",),
+    "flashcard_decks": ("created_at",),
+    "flashcards": ("created_at", "due_at", "last_reviewed_at"),
+    "llm_usage_daily": ("created_at", "updated_at"),
+    "audit_log": ("created_at",),
+}
+
+CHECKPOINTS = "migrations"
+
+logger = logging.getLogger("migrate_timestamps")
+
+
+def bson_bytes_saved(value: str) -> int:
+    # int32 length + UTF-8 bytes + NUL for a string, 8 bytes for a date
+    return 4 + len(value.encode("utf-8")) + 1 - 8
+
+
+def convert(doc: dict, fields) -> Tuple[dict, dict, list]:
+    """($set, {field: old string} guard, unparseable fields) for one document"""
+    updates, guard, invalid = {}, {}, []
+    for field in fields:
+        value = doc.get(field)
+        if not isinstance(value, str):
+            continue
+        parsed = parse(value)
+        if parsed is None:
+            invalid.append(field)
+            continue
+        updates[field] = parsed
+        guard[field] = value
+    return updates, guard, invalid
+
+
+async def migrate_collection(db, name: str, fields, batch_size: int = 500, dry_run: bool = False,
+                             restart: bool = False, pause: float = 0.0) -> dict:
+    collection = db[name]
+    checkpoints = db[CHECKPOINTS]
+    checkpoint_id = f"timestamps:{name}"
+    totals = {"scanned": 0, "converted": 0, "fields": 0, "invalid": 0, "bytes_saved": 0, "resumed": False}
+
+    checkpoint: Optional[dict] = None if restart else await checkpoints.find_one({"_id": checkpoint_id})
+    if checkpoint and checkpoint.get("done"):
+        totals["skipped"] = True
+        return totals
+    last_id = checkpoint.get("last_id") if checkpoint else None
+    totals["resumed"] = last_id is not None
+
+    projection = {field: 1 for field in fields}
+    while True:
+        query = {"_id": {"$gt": last_id}} if last_id is not None else {}
+        batch = await collection.find(query, projection).sort("_id", 1).limit(batch_size).to_list(batch_size)
+        if not batch:
+            break
+        last_id = batch[-1]["_id"]
+        totals["scanned"] += len(batch)
+
+        ops = []
+        for doc in batch:
+            updates, guard, invalid = convert(doc, fields)
+            for field in invalid:
+                logger.warning(f"{name}/{doc['_id']}: {field}={doc[field]!r} is not an ISO timestamp, left as is")
+            totals["invalid"] += len(invalid)
+            if updates:
+                ops.append(UpdateOne({"_id": doc["_id"], **guard}, {"$set": updates}))
+                totals["fields"] += len(updates)
+                totals["bytes_saved"] += sum(bson_bytes_saved(value) for value in guard.values())
+        converted = len(ops)
+        if ops and not dry_run:
+            converted = (await collection.bulk_write(ops, ordered=False)).modified_count
+        totals["converted"] += converted
+
+        if not dry_run:
+            await checkpoints.update_one(
+                {"_id": checkpoint_id},
+                {"$set": {"last_id": last_id, "done": False, "updated_at": utcnow()},
+                 "$inc": {"converted": converted}},
+                upsert=True
+            )
+        if pause:
+            await asyncio.sleep(pause)
+
+    if not dry_run:
+        await checkpoints.update_one(
+            {"_id": checkpoint_id}, {"$set": {"done": True, "updated_at": utcnow()}}, upsert=True
+        )
+    return totals
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Convert ISO string timestamps into BSON dates")
+    parser.add_argument("--dry-run", action="store_true", help="Only count what would be converted")
+    parser.add_argument("--collections", nargs="+", choices=sorted(TIMESTAMP_FIELDS), help="Default: all")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--pause", type=float, default=0.0, help="Seconds to sleep between batches")
+    parser.add_argument("--restart", action="store_true", help="Ignore checkpoints and scan from the start")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'], tz_aware=True)
+    db = client[os.environ['DB_NAME']]
+    try:
+        for name in args.collections or TIMESTAMP_FIELDS:
+            start = time.perf_counter()
+            totals = await migrate_collection(db, name, TIMESTAMP_FIELDS[name], args.batch_size,
+                                              args.dry_run, args.restart, args.pause)
+            if totals.get("skipped"):
+                logger.info(f"{name}: already migrated (use --restart to scan again)")
+                continue
+            logger.info(
+                f"{name}: {'would convert' if args.dry_run else 'converted'} {totals['fields']} fields "
+                f"in {totals['converted']} of {totals['scanned']} documents"
+                f"{' (resumed)' if totals['resumed'] else ''}, {totals['invalid']} invalid, "
+                f"~{totals['bytes_saved'] / 1024:.0f} KB smaller, {time.perf_counter() - start:.1f} s"
+            )
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Moves uploads from the old flat uploads/ directory into the configured storage backend.
+
+For every ai_sources / chat_attachments / attachments document that still has only a file_path,
+the file is copied to storage under its file name as storage_key, the document is updated
+and the old file is removed. Safe to interrupt and re-run: migrated documents are skipped.
+
+    python migrate_uploads.py --dry-run
+    STORAGE_BACKEND=s3 S3_BUCKET=pocketbuddy S3_ENDPOINT_URL=http://localhost:9000 python migrate_uploads.py
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+from pathlib import Path
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from storage import create_storage
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+COLLECTIONS = ("ai_sources", "chat_attachments", "attachments")
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("migrate_uploads")
+
+
+def locate(file_path: str, upload_dir: Path) -> Path:
+    """The stored absolute path, or the same file name in UPLOAD_DIR if the app was moved"""
+    path = Path(file_path)
+    if path.is_file():
+        return path
+    return upload_dir / path.name
+
+
+async def migrate_document(collection, doc, storage, upload_dir, args, totals):
+    source = locate(doc["file_path"], upload_dir)
+    if not source.is_file():
+        logger.warning(f"{collection.name}/{doc['id']}: file {doc['file_path']} not found, skipped")
+        totals["skipped"] += 1
+        return
+    key = source.name
+    size = source.stat().st_size
+    if args.dry_run:
+        logger.info(f"{collection.name}/{doc['id']}: would move {source} -> {key} ({size} bytes)")
+    else:
+        await storage.put(key, await asyncio.to_thread(source.read_bytes), doc.get("file_type"))
+        await collection.update_one(
+            {"id": doc["id"]}, {"$set": {"storage_key": key}, "$unset": {"file_path": ""}}
+        )
+        if not args.keep_files:
+            source.unlink()
+    totals["moved"] += 1
+    totals["bytes"] += size
+
+
+async def migrate_collection(db, name, storage, upload_dir, args):
+    collection = db[name]
+    totals = {"moved": 0, "skipped": 0, "bytes": 0}
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def run(doc):
+        async with semaphore:
+            try:
+                await migrate_document(collection, doc, storage, upload_dir, args, totals)
+            except Exception as e:
+                logger.error(f"{name}/{doc['id']}: {str(e)}")
+                totals["skipped"] += 1
+
+    last_id = ""
+    while True:
+        # Page by id so documents whose file is missing are not fetched again
+        batch = await collection.find(
+            {"storage_key": {"$exists": False}, "file_path": {"$exists": True}, "id": {"$gt": last_id}},
+            {"_id": 0, "id": 1, "file_path": 1, "file_type": 1}
+        ).sort("id", 1).limit(args.batch_size).to_list(args.batch_size)
+        if not batch:
+            break
+        last_id = batch[-1]["id"]
+        await asyncio.gather(*(run(doc) for doc in batch))
+    return totals
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Move uploaded files into the configured storage backend")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would be moved")
+    parser.add_argument("--keep-files", action="store_true", help="Leave the old files in place")
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    upload_dir = Path(os.environ.get('UPLOAD_DIR', str(ROOT_DIR / "uploads")))
+    storage = create_storage(os.environ.get('STORAGE_BACKEND', 'local'), upload_dir)
+    await storage.init()
+
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = client[os.environ['DB_NAME']]
+    try:
+        for name in COLLECTIONS:
+            totals = await migrate_collection(db, name, storage, upload_dir, args)
+            logger.info(
+                f"{name}: {'would move' if args.dry_run else 'moved'} {totals['moved']} files "
+                f"({totals['bytes'] / 1024 / 1024:.1f} MB) to {storage.name} storage, {totals['skipped']} skipped"
+            )
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,206 @@
+"""
+On-demand profiling of single requests, and tracemalloc snapshots.
+
+An admin marks one request (X-Profile: 1 header or ?_profile=1); the middleware puts a
+RequestProfile into a context variable and starts a process-wide SIGPROF interval timer. The
+signal handler runs on the event loop thread in whatever context is executing at that moment,
+so it only records stacks while code belonging to the marked request runs: concurrent requests
+are not mixed in, and time the request spends awaiting Mongo or the LLM is not sampled (see
+Server-Timing for that). Work pushed to executor threads is not sampled either.
+
+Profiles are written in the collapsed-stack format ("outer;inner;leaf 42") read by
+flamegraph.pl, speedscope and inferno. The timer only runs while a profiled request is in flight.
+"""
+
+import logging
+import os
+import re
+import signal
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+MAX_DEPTH = 128
+PROFILE_NAME = re.compile(r"^[\w.-]+\.folded$")
+
+
+class RequestProfile:
+    def __init__(self, name: str):
+        self.name = name
+        self.samples: Counter = Counter()
+        self.started = time.perf_counter()
+        self.duration_ms = 0.0
+
+    def record(self, frame, labels: Dict):
+        stack = []
+        while frame is not None and len(stack) < MAX_DEPTH:
+            code = frame.f_code
+            label = labels.get(code)
+            if label is None:
+                label = labels[code] = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+            stack.append(label)
+            frame = frame.f_back
+        self.samples[";".join(reversed(stack))] += 1
+
+    @property
+    def sample_count(self) -> int:
+        return sum(self.samples.values())
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+
+current_profile: ContextVar[Optional[RequestProfile]] = ContextVar("current_profile", default=None)
+
+
+class SamplingProfiler:
+    def __init__(self, interval_seconds: float):
+        self.interval_seconds = interval_seconds
+        self._running = set()
+        self._lock = threading.Lock()
+        self._labels: Dict = {}
+        self._previous_handler = None
+        self.profiles = 0
+
+    @property
+    def available(self) -> bool:
+        # Signal handlers can only be installed from, and only run on, the main thread
+        return hasattr(signal, "setitimer") and threading.current_thread() is threading.main_thread()
+
+    def _handle(self, signum, frame):
+        profile = current_profile.get()
+        if profile is not None:
+            profile.record(frame, self._labels)
+
+    @property
+    def active(self) -> int:
+        return len(self._running)
+
+    def start(self, profile: RequestProfile):
+        """Run the timer for `profile`; samples land in it wherever current_profile is set to it"""
+        with self._lock:
+            if not self._running:
+                self._previous_handler = signal.signal(signal.SIGPROF, self._handle)
+                signal.setitimer(signal.ITIMER_PROF, self.interval_seconds, self.interval_seconds)
+            self._running.add(profile)
+            self.profiles += 1
+
+    def stop(self, profile: RequestProfile) -> bool:
+        """False when the profile was already stopped"""
+        with self._lock:
+            if profile not in self._running:
+                return False
+            self._running.discard(profile)
+            if not self._running:
+                signal.setitimer(signal.ITIMER_PROF, 0, 0)
+                signal.signal(signal.SIGPROF, self._previous_handler or signal.SIG_DFL)
+                # Labels pin code objects; drop them once nothing is being profiled
+                self._labels = {}
+        profile.duration_ms = round((time.perf_counter() - profile.started) * 1000, 1)
+        return True
+
+
+class ProfileStore:
+    """Collapsed-stack files in a directory, newest `keep` kept"""
+
+    def __init__(self, directory: Path, keep: int):
+        self.directory = directory
+        self.keep = keep
+
+    def save(self, profile: RequestProfile) -> Path:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / profile.name
+        path.write_text(profile.collapsed(), encoding="utf-8")
+        for old in self.list()[self.keep:]:
+            (self.directory / old["name"]).unlink(missing_ok=True)
+        return path
+
+    def list(self) -> List[dict]:
+        if not self.directory.is_dir():
+            return []
+        files = [p for p in self.directory.iterdir() if PROFILE_NAME.match(p.name)]
+        files.sort(key=lambda p: p.stat().st_mtime, reverse=True)
+        return [{"name": p.name, "size": p.stat().st_size, "modified": p.stat().st_mtime} for p in files]
+
+    def path(self, name: str) -> Optional[Path]:
+        if not PROFILE_NAME.match(name):
+            return None
+        path = self.directory / name
+        return path if path.is_file() else None
+
+
+def _file_part(value: str) -> str:
+    return re.sub(r"[^\w-]+", "_", value)
+
+
+def profile_name(method: str, path: str, request_id: str) -> str:
+    # The request id comes from the client's X-Request-ID header
+    slug = _file_part(path.strip("/"))[:60] or "root"
+    return (f"{time.strftime('%Y%m%d-%H%M%S')}-{_file_part(method.lower())}-{slug}-"
+            f"{_file_part(request_id)[:8] or 'request'}.folded")
+
+
+# ---------- tracemalloc ----------
+
+_baseline: Optional[tracemalloc.Snapshot] = None
+
+_SNAPSHOT_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+]
+
+
+def start_tracing(frames: int) -> dict:
+    """Start tracing allocations (if needed) and take the baseline later snapshots are compared to"""
+    global _baseline
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+    _baseline = tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS)
+    return tracing_status()
+
+
+def stop_tracing() -> dict:
+    global _baseline
+    _baseline = None
+    tracemalloc.stop()
+    return tracing_status()
+
+
+def tracing_status() -> dict:
+    current, peak = tracemalloc.get_traced_memory()
+    return {
+        "tracing": tracemalloc.is_tracing(),
+        "frames": tracemalloc.get_traceback_limit(),
+        "traced_bytes": current,
+        "peak_bytes": peak,
+        "overhead_bytes": tracemalloc.get_tracemalloc_memory(),
+        "has_baseline": _baseline is not None,
+    }
+
+
+def snapshot(group_by: str, limit: int) -> dict:
+    """Largest allocation sites now, and the biggest growth since the baseline"""
+    current = tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS)
+
+    def site(stat) -> List[str]:
+        return [f"{frame.filename}:{frame.lineno}" for frame in stat.traceback]
+
+    report = {
+        **tracing_status(),
+        "group_by": group_by,
+        "top": [{"site": site(stat), "size_bytes": stat.size, "count": stat.count}
+                for stat in current.statistics(group_by)[:limit]],
+    }
+    if _baseline is not None:
+        report["growth"] = [{"site": site(diff), "size_diff_bytes": diff.size_diff, "size_bytes": diff.size,
+                             "count_diff": diff.count_diff}
+                            for diff in current.compare_to(_baseline, group_by)[:limit] if diff.size_diff]
+    return report
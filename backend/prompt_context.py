@@ -0,0 +1,53 @@
+"""
+Per-worker cache of rendered source-context snippets for LLM prompts.
+
+Keys are role/grade/subject scopes. Every ai_sources write bumps the version and clears the
+cache; the TTL is the safety net for other workers, which do not see this worker's
+invalidations. Keys partly come from clients (a subject id), so the cache is an LRU bounded to
+`max_entries`, and expired entries are dropped when they are looked up.
+"""
+
+import time
+from collections import OrderedDict
+
+
+class PromptContextCache:
+    """Rendered source-context snippets keyed by role/grade/subject, invalidated on any ai_sources change"""
+
+    def __init__(self, ttl_seconds: float, max_entries: int = 1000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: OrderedDict = OrderedDict()
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] == self.version and time.monotonic() - entry[1] < self.ttl_seconds:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[2]
+            del self._entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, key, value: str, version: int):
+        # Drop results computed before an invalidation
+        if version != self.version or self.max_entries <= 0:
+            return
+        self._entries[key] = (version, time.monotonic(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self):
+        self.version += 1
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        return {"version": self.version, "entries": len(self._entries), "max_entries": self.max_entries,
+                "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
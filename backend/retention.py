@@ -0,0 +1,289 @@
+"""
+Retention for chats.
+
+- soft-deleted chats are hard-deleted (chat, messages, archive) after a number of days;
+  their attachments are unlinked and left to the attachment sweeper
+- chats untouched for a number of days are compacted: their messages move out of the hot
+  `messages` collection into one gzip-compressed document in `chat_archives`
+
+Archived chats still open through the normal endpoints, from the archive instead of `messages`.
+Writing to an archived chat restores it first.
+
+Restoring and archiving can interleave. restore_chat claims the chat (clears the flag) before
+it copies the archive back, and the archiver re-checks the flag after deleting the hot
+messages and puts them back itself when a restore got in between. Messages are copied back
+with upserts by id, so it does not matter which of the two does it, or if both do.
+
+Every worker runs the sweep, so archivers take a lease on the chat first (archive_lease on the
+chat document): only the holder writes the archive, and its rollback only deletes the archive
+it wrote. A lease left by a crashed worker expires after ARCHIVE_LEASE_SECONDS.
+"""
+
+import asyncio
+import gzip
+import logging
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Callable, List, Optional
+
+import bson
+from bson.codec_options import CodecOptions
+from pymongo import UpdateOne
+
+from attachment_gc import ATTACHMENT_COLLECTIONS
+from timestamps import parse as parse_timestamp, utcnow
+
+logger = logging.getLogger(__name__)
+
+# Stay well under MongoDB's 16 MB document limit
+MAX_ARCHIVE_BYTES = 12 * 1024 * 1024
+# Decoded like the Motor client's documents, so archived and hot messages compare
+ARCHIVE_CODEC_OPTIONS = CodecOptions(tz_aware=True)
+EPOCH = datetime.fromtimestamp(0, timezone.utc)
+ARCHIVE_LEASE_SECONDS = 600
+
+
+def compress_messages(messages: List[dict]) -> bytes:
+    # BSON keeps field types exactly as they were in the messages collection
+    return gzip.compress(bson.encode({"messages": messages}), compresslevel=6)
+
+
+def decompress_messages(data: bytes) -> List[dict]:
+    return bson.decode(gzip.decompress(data), codec_options=ARCHIVE_CODEC_OPTIONS)["messages"]
+
+
+async def load_archived_messages(db, chat_id: str) -> List[dict]:
+    archive = await db.chat_archives.find_one({"chat_id": chat_id}, {"_id": 0, "data": 1})
+    return decompress_messages(archive["data"]) if archive else []
+
+
+def merge_messages(*groups: List[dict]) -> List[dict]:
+    """Union by message id, oldest first"""
+    by_id = {}
+    for messages in groups:
+        for msg in messages:
+            by_id[msg["id"]] = msg
+    # Archives written before the timestamp migration hold ISO strings
+    return sorted(by_id.values(), key=lambda m: parse_timestamp(m["created_at"]) or EPOCH)
+
+
+async def upsert_messages(db, messages: List[dict]):
+    """Insert the messages that are not in the hot collection yet"""
+    if messages:
+        await db.messages.bulk_write([
+            UpdateOne({"chat_id": msg["chat_id"], "id": msg["id"]}, {"$setOnInsert": msg}, upsert=True)
+            for msg in messages
+        ], ordered=False)
+
+
+async def restore_chat(db, chat_id: str):
+    """Move an archived chat's messages back into the hot collection"""
+    # Claim first: an archiver still deleting hot messages sees the flag gone and puts them back
+    claimed = await db.chats.update_one(
+        {"id": chat_id, "archived": True}, {"$set": {"archived": False}, "$unset": {"archived_at": ""}}
+    )
+    if claimed.modified_count == 0:
+        # Restored by a concurrent request
+        return
+    await upsert_messages(db, await load_archived_messages(db, chat_id))
+    await db.chat_archives.delete_one({"chat_id": chat_id})
+
+
+class ChatRetention:
+    def __init__(self, get_db: Callable, deleted_days: float, inactive_days: float,
+                 batch_size: int = 50, pause_seconds: float = 0.5):
+        self.get_db = get_db
+        self.deleted_days = deleted_days
+        self.inactive_days = inactive_days
+        self.batch_size = batch_size
+        self.pause_seconds = pause_seconds
+        self._lock = asyncio.Lock()
+        self.last_report: Optional[dict] = None
+
+    async def sweep(self, dry_run: bool = False) -> dict:
+        """One full pass; returns what was (or, with dry_run, would be) purged and archived"""
+        async with self._lock:
+            start = time.perf_counter()
+            report = {
+                "dry_run": dry_run,
+                "started_at": datetime.now(timezone.utc).isoformat(),
+                "chats_purged": 0,
+                "messages_purged": 0,
+                "chats_archived": 0,
+                "messages_archived": 0,
+                "archive_raw_bytes": 0,
+                "archive_compressed_bytes": 0,
+                "errors": 0,
+            }
+            if self.deleted_days > 0:
+                await self._purge_deleted(report, dry_run)
+            if self.inactive_days > 0:
+                await self._archive_inactive(report, dry_run)
+            report["duration_ms"] = round((time.perf_counter() - start) * 1000, 1)
+            if not dry_run:
+                self.last_report = report
+            return report
+
+    @staticmethod
+    def _cutoff(days: float) -> datetime:
+        return utcnow() - timedelta(days=days)
+
+    # ---------- hard delete ----------
+
+    async def _purge_deleted(self, report, dry_run):
+        db = self.get_db()
+        cutoff = self._cutoff(self.deleted_days)
+        # Chats deleted before deleted_at existed carry the deletion time in updated_at
+        query = {"is_deleted": True, "$or": [
+            {"deleted_at": {"$lt": cutoff}},
+            {"deleted_at": {"$exists": False}, "updated_at": {"$lt": cutoff}},
+        ]}
+        last_id = ""
+        while True:
+            chats = await db.chats.find(
+                {**query, "id": {"$gt": last_id}}, {"_id": 0, "id": 1, "archived": 1}
+            ).sort("id", 1).limit(self.batch_size).to_list(self.batch_size)
+            if not chats:
+                break
+            last_id = chats[-1]["id"]
+            chat_ids = [chat["id"] for chat in chats]
+
+            message_ids = await db.messages.distinct("id", {"chat_id": {"$in": chat_ids}})
+            for chat in chats:
+                if chat.get("archived"):
+                    message_ids += [msg["id"] for msg in await load_archived_messages(db, chat["id"])]
+            report["chats_purged"] += len(chats)
+            report["messages_purged"] += len(message_ids)
+            if dry_run:
+                continue
+
+            try:
+                # Unlinked attachments are reclaimed by the attachment sweeper
+                await asyncio.gather(*(
+                    db[name].update_many({"message_id": {"$in": message_ids}}, {"$set": {"message_id": None}})
+                    for name in ATTACHMENT_COLLECTIONS
+                ))
+                await db.messages.delete_many({"chat_id": {"$in": chat_ids}})
+                await db.chat_archives.delete_many({"chat_id": {"$in": chat_ids}})
+                await db.chats.delete_many({"id": {"$in": chat_ids}, "is_deleted": True})
+            except Exception as e:
+                logger.error(f"Chat retention could not purge {len(chat_ids)} chats: {str(e)}")
+                report["errors"] += 1
+            await asyncio.sleep(self.pause_seconds)
+
+    # ---------- compaction of inactive chats ----------
+
+    async def _archive_inactive(self, report, dry_run):
+        db = self.get_db()
+        cutoff = self._cutoff(self.inactive_days)
+        query = {"is_deleted": False, "archived": {"$ne": True}, "updated_at": {"$lt": cutoff}}
+        last_id = ""
+        while True:
+            chats = await db.chats.find(
+                {**query, "id": {"$gt": last_id}}, {"_id": 0, "id": 1, "user_id": 1}
+            ).sort("id", 1).limit(self.batch_size).to_list(self.batch_size)
+            if not chats:
+                break
+            last_id = chats[-1]["id"]
+            for chat in chats:
+                try:
+                    await self._archive_chat(db, chat, query, report, dry_run)
+                except Exception as e:
+                    logger.error(f"Chat retention could not archive chat {chat['id']}: {str(e)}")
+                    report["errors"] += 1
+            await asyncio.sleep(self.pause_seconds)
+
+    async def _archive_chat(self, db, chat, inactive_query, report, dry_run):
+        token = None
+        if not dry_run:
+            token = str(uuid.uuid4())
+            now = utcnow()
+            leased = await db.chats.update_one(
+                {**inactive_query, "id": chat["id"], "$or": [
+                    {"archive_lease_until": {"$exists": False}}, {"archive_lease_until": {"$lt": now}}
+                ]},
+                {"$set": {"archive_lease": token,
+                          "archive_lease_until": now + timedelta(seconds=ARCHIVE_LEASE_SECONDS)}}
+            )
+            if leased.modified_count == 0:
+                # Another worker is archiving it, or it became active
+                return
+        try:
+            archived = await self._archive_leased_chat(db, chat, inactive_query, report, token)
+        finally:
+            if token is not None:
+                await db.chats.update_one(
+                    {"id": chat["id"], "archive_lease": token},
+                    {"$unset": {"archive_lease": "", "archive_lease_until": ""}}
+                )
+        return archived
+
+    async def _archive_leased_chat(self, db, chat, inactive_query, report, token) -> bool:
+        messages = await db.messages.find({"chat_id": chat["id"]}, {"_id": 0}).sort("created_at", 1).to_list(None)
+        # A restore interrupted after its claim leaves the archive behind; keep what it holds
+        messages = merge_messages(await load_archived_messages(db, chat["id"]), messages)
+        raw_bytes = len(bson.encode({"messages": messages}))
+        data = compress_messages(messages)
+        if len(data) > MAX_ARCHIVE_BYTES:
+            logger.warning(f"Chat {chat['id']} is too large to archive ({len(data)} bytes compressed)")
+            return False
+        if token is not None and not await self._move_to_archive(db, chat, inactive_query, messages,
+                                                                raw_bytes, data, token):
+            return False
+        report["chats_archived"] += 1
+        report["messages_archived"] += len(messages)
+        report["archive_raw_bytes"] += raw_bytes
+        report["archive_compressed_bytes"] += len(data)
+        return True
+
+    async def _move_to_archive(self, db, chat, inactive_query, messages, raw_bytes, data, token) -> bool:
+        now = utcnow()
+        # Archive first, flag second, delete last: an interrupted run leaves the messages
+        # in both places, and readers merge the two by message id
+        await db.chat_archives.replace_one({"chat_id": chat["id"]}, {
+            "chat_id": chat["id"],
+            "user_id": chat["user_id"],
+            "message_count": len(messages),
+            "raw_bytes": raw_bytes,
+            "compressed_bytes": len(data),
+            "data": data,
+            "archive_token": token,
+            "created_at": now
+        }, upsert=True)
+        flagged = await db.chats.update_one(
+            {**inactive_query, "id": chat["id"], "archive_lease": token},
+            {"$set": {"archived": True, "archived_at": now}, "$unset": {"archive_lease": "", "archive_lease_until": ""}}
+        )
+        if flagged.modified_count == 0:
+            # Someone wrote to the chat meanwhile (it is active again), or the lease expired and
+            # another worker took over; only ever remove the archive this run wrote
+            await db.chat_archives.delete_one({"chat_id": chat["id"], "archive_token": token})
+            return False
+        if messages:
+            # Only what went into the archive: a message sent meanwhile stays in the hot collection
+            await db.messages.delete_many({"chat_id": chat["id"], "id": {"$in": [m["id"] for m in messages]}})
+            current = await db.chats.find_one({"id": chat["id"]}, {"_id": 0, "archived": 1})
+            if current is not None and not current.get("archived"):
+                # restore_chat claimed the chat between the flag and the delete, possibly while
+                # these messages were still hot; put them back
+                await upsert_messages(db, messages)
+                return False
+        return True
+
+    async def run(self, interval_seconds: float):
+        """Background retention loop"""
+        while True:
+            await asyncio.sleep(interval_seconds)
+            try:
+                report = await self.sweep()
+            except Exception as e:
+                logger.error(f"Chat retention failed: {str(e)}")
+                continue
+            if report["chats_purged"] or report["chats_archived"]:
+                logger.info(
+                    f"Chat retention purged {report['chats_purged']} chats ({report['messages_purged']} messages), "
+                    f"archived {report['chats_archived']} chats ({report['messages_archived']} messages, "
+                    f"{report['archive_raw_bytes']} -> {report['archive_compressed_bytes']} bytes) "
+                    f"in {report['duration_ms']} ms"
+                )
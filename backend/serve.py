@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Production launcher - runs the PocketBuddy API with N uvicorn worker processes.
+
+    python serve.py --workers 4 --port 8001
+
+Each worker imports server.py on its own and opens its own MongoDB client in the
+lifespan handler, so no connections are shared across the fork boundary.
+In-process state is per worker: the LLM admission cap (LLM_MAX_CONCURRENCY),
+request coalescing and the prompt context cache all multiply with --workers,
+and MONGO_MAX_POOL_SIZE applies to each worker's own pool.
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+from pathlib import Path
+
+import uvicorn
+
+
+def default_workers() -> int:
+    return int(os.environ.get("WEB_CONCURRENCY", min(4, multiprocessing.cpu_count())))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the PocketBuddy API with multiple workers")
+    parser.add_argument("--host", default=os.environ.get("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", "8001")))
+    parser.add_argument("--workers", type=int, default=default_workers(),
+                        help="Worker processes (default: $WEB_CONCURRENCY or min(4, CPUs))")
+    parser.add_argument("--timeout-keep-alive", type=int, default=5)
+    parser.add_argument("--log-level", default=os.environ.get("LOG_LEVEL", "info"))
+    args = parser.parse_args()
+
+    # Workers import "server:app" from this directory
+    backend_dir = str(Path(__file__).parent)
+    os.chdir(backend_dir)
+    sys.path.insert(0, backend_dir)
+
+    print(f"🚀 Starting PocketBuddy API with {args.workers} workers on {args.host}:{args.port}")
+    uvicorn.run(
+        "server:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        proxy_headers=True,
+        forwarded_allow_ips="*",
+        timeout_keep_alive=args.timeout_keep_alive,
+        log_level=args.log_level,
+    )
+
+
+if __name__ == "__main__":
+    main()
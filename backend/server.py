@@ -1,28 +1,211 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, UploadFile, File, Form, status
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, UploadFile, File, Form, Query, Request, Response, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+from contextlib import asynccontextmanager
+from pymongo import monitoring
 import os
+import asyncio
+import csv
+import hashlib
+import json
 import logging
+import threading
+import time
+import contextvars
+import unicodedata
 from pathlib import Path
 from pydantic import BaseModel, Field, ConfigDict, EmailStr
-from typing import List, Optional
+from typing import AsyncIterator, Awaitable, Callable, List, Optional
 import uuid
-from datetime import datetime, timezone, timedelta
-import bcrypt
+from datetime import date, datetime, timezone, timedelta
 import jwt
-import aiofiles
-from emergentintegrations.llm.chat import LlmChat, UserMessage
+from llm_backend import SingleFlight, create_llm_backend, request_key
+from admission import AdmissionController, AdmissionRejected
+from usage import UsageRecorder
+from storage import create_storage
+from attachment_gc import ATTACHMENT_COLLECTIONS, AttachmentSweeper
+from retention import ChatRetention, load_archived_messages, merge_messages, restore_chat
+import export
+import user_import
+import spaced_repetition
+from json_stream import JsonArrayStream, parse_array
+from answer_cache import AnswerCache
+from topic_catalog import TopicCatalog
+from prompt_context import PromptContextCache
+import audit
+from timestamps import IsoTimestamp, parse as parse_timestamp, utcnow
+from admin_events import AdminEvents
+import profiling
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, OperationFailure
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
+# ==================== DB MONITORING ====================
+
+# Commands slower than this are written to the slow-query log
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', '100'))
+# Adds Server-Timing / X-DB-Query-Count headers to every response
+SERVER_TIMING_ENABLED = os.environ.get('SERVER_TIMING', 'false').lower() in ('1', 'true', 'yes')
+
+# Driver housekeeping commands that are not issued by our handlers
+IGNORED_COMMANDS = {"hello", "ismaster", "isMaster", "ping", "saslStart", "saslContinue", "endSessions", "killCursors"}
+
+slow_query_logger = logging.getLogger("pocketbuddy.slow_queries")
+
+class RequestDbStats:
+    """DB commands issued while serving a single HTTP request"""
+
+    def __init__(self, request_id: str):
+        self.request_id = request_id
+        self.query_count = 0
+        self.db_time_ms = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, duration_ms: float):
+        # Motor runs commands on executor threads
+        with self._lock:
+            self.query_count += 1
+            self.db_time_ms += duration_ms
+
+current_db_stats: contextvars.ContextVar[Optional[RequestDbStats]] = contextvars.ContextVar("current_db_stats", default=None)
+
+def query_shape(value):
+    """Replace literal values in a filter with placeholders, keeping keys and operators"""
+    if isinstance(value, dict):
+        return {k: query_shape(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [query_shape(v) for v in value[:3]]
+    return "?"
+
+def command_filter(command_name: str, command: dict):
+    if command_name in ("find", "count", "distinct"):
+        return command.get("filter", command.get("query"))
+    if command_name == "findAndModify":
+        return command.get("query")
+    if command_name == "update" and command.get("updates"):
+        return command["updates"][0].get("q")
+    if command_name == "delete" and command.get("deletes"):
+        return command["deletes"][0].get("q")
+    if command_name == "aggregate":
+        for stage in command.get("pipeline", []):
+            if "$match" in stage:
+                return stage["$match"]
+    return None
+
+class QueryMonitor(monitoring.CommandListener):
+    """Attributes every Mongo command to the current request and logs slow ones"""
+
+    def __init__(self):
+        self._pending = {}
+
+    def started(self, event):
+        if event.command_name in IGNORED_COMMANDS:
+            return
+        self._pending[(event.connection_id, event.request_id)] = (
+            event.command_name,
+            event.command.get(event.command_name),
+            command_filter(event.command_name, event.command)
+        )
+
+    def succeeded(self, event):
+        self._finish(event)
+
+    def failed(self, event):
+        self._finish(event)
+
+    def _finish(self, event):
+        pending = self._pending.pop((event.connection_id, event.request_id), None)
+        if pending is None:
+            return
+        command_name, collection, query_filter = pending
+        duration_ms = event.duration_micros / 1000
+        stats = current_db_stats.get()
+        if stats:
+            stats.record(duration_ms)
+        if duration_ms >= SLOW_QUERY_MS:
+            slow_query_logger.warning(
+                f"Slow query {duration_ms:.1f}ms request_id={stats.request_id if stats else '-'} "
+                f"{command_name} {collection} filter={query_shape(query_filter) if query_filter else {}}"
+            )
+
+query_monitor = QueryMonitor()
+
+class PoolMonitor(monitoring.ConnectionPoolListener):
+    """Connection pool state of this worker, reported by the readiness probe"""
+    
+    def __init__(self):
+        self.open = 0
+        self.checked_out = 0
+        self.checkout_failures = 0
+        self._lock = threading.Lock()
+    
+    def _add(self, field: str, delta: int):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + delta)
+    
+    def connection_created(self, event):
+        self._add("open", 1)
+    
+    def connection_closed(self, event):
+        self._add("open", -1)
+    
+    def connection_checked_out(self, event):
+        self._add("checked_out", 1)
+    
+    def connection_checked_in(self, event):
+        self._add("checked_out", -1)
+    
+    def connection_check_out_failed(self, event):
+        self._add("checkout_failures", 1)
+    
+    def pool_created(self, event):
+        pass
+    
+    def pool_ready(self, event):
+        pass
+    
+    def pool_cleared(self, event):
+        pass
+    
+    def pool_closed(self, event):
+        pass
+    
+    def connection_ready(self, event):
+        pass
+    
+    def connection_check_out_started(self, event):
+        pass
+
+pool_monitor = PoolMonitor()
+
+# MongoDB connection - one client per worker process, created in the lifespan handler
 mongo_url = os.environ.get('MONGO_URL')
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ.get('DB_NAME')]
+DB_NAME = os.environ.get('DB_NAME')
+MONGO_MAX_POOL_SIZE = int(os.environ.get('MONGO_MAX_POOL_SIZE', '100'))
+MONGO_MIN_POOL_SIZE = int(os.environ.get('MONGO_MIN_POOL_SIZE', '0'))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', '5000'))
+MONGO_CONNECT_TIMEOUT_MS = int(os.environ.get('MONGO_CONNECT_TIMEOUT_MS', '5000'))
+MONGO_SOCKET_TIMEOUT_MS = int(os.environ.get('MONGO_SOCKET_TIMEOUT_MS', '30000'))
+client: Optional[AsyncIOMotorClient] = None
+db = None
+
+def create_mongo_client() -> AsyncIOMotorClient:
+    return AsyncIOMotorClient(
+        mongo_url,
+        maxPoolSize=MONGO_MAX_POOL_SIZE,
+        minPoolSize=MONGO_MIN_POOL_SIZE,
+        serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+        socketTimeoutMS=MONGO_SOCKET_TIMEOUT_MS,
+        # Stored dates come back as aware UTC datetimes, which encode with an explicit offset
+        tz_aware=True,
+        event_listeners=[query_monitor, pool_monitor]
+    )
 
 # JWT settings
 JWT_SECRET = os.environ.get('JWT_SECRET', 'pocketbuddy-secret-key-2024')
@@ -31,13 +214,89 @@ JWT_EXPIRATION_HOURS = 24
 
 # LLM settings
 EMERGENT_LLM_KEY = os.environ.get('EMERGENT_LLM_KEY')
+# live | record | replay - record/replay use the cassette file for offline, deterministic runs
+LLM_BACKEND = os.environ.get('LLM_BACKEND', 'live')
+LLM_CASSETTE = Path(os.environ.get('LLM_CASSETTE', str(ROOT_DIR / 'llm_cassette.jsonl.gz')))
+llm_backend = create_llm_backend(LLM_BACKEND, EMERGENT_LLM_KEY, LLM_CASSETTE)
+# Identical concurrent generations (same rendered prompt and model) share one provider call
+LLM_COALESCE = os.environ.get('LLM_COALESCE', 'true').lower() in ('1', 'true', 'yes')
+llm_singleflight = SingleFlight()
+# Admission control in front of every provider call
+llm_admission = AdmissionController(
+    max_concurrent=int(os.environ.get('LLM_MAX_CONCURRENCY', '8')),
+    user_rate_per_minute=float(os.environ.get('LLM_USER_RATE_PER_MINUTE', '10')),
+    user_burst=int(os.environ.get('LLM_USER_BURST', '5')),
+    queue_timeout=float(os.environ.get('LLM_QUEUE_TIMEOUT', '10'))
+)
+# Per-user, per-day usage rollups, flushed in the background
+USAGE_FLUSH_SECONDS = float(os.environ.get('USAGE_FLUSH_SECONDS', '30'))
+usage_recorder = UsageRecorder()
+# Administrative changes, written in batches by a background task
+audit_log = audit.AuditLog(
+    lambda: db.audit_log,
+    max_queue=int(os.environ.get('AUDIT_QUEUE_SIZE', '10000')),
+    batch_size=int(os.environ.get('AUDIT_BATCH_SIZE', '500'))
+)
+# Audit events older than this are expired by a TTL index on created_at; 0 keeps them forever
+AUDIT_RETENTION_DAYS = float(os.environ.get('AUDIT_RETENTION_DAYS', '0'))
+# Live deltas for the admin UI, shared between workers through a capped collection
+admin_events = AdminEvents(
+    lambda: db,
+    size_bytes=int(os.environ.get('ADMIN_EVENTS_CAPPED_BYTES', str(1 << 20))),
+    max_events=int(os.environ.get('ADMIN_EVENTS_CAPPED_MAX', '1000')),
+    heartbeat_seconds=float(os.environ.get('ADMIN_EVENTS_HEARTBEAT_SECONDS', '15'))
+)
+# Admins can profile a single request with X-Profile: 1 (or ?_profile=1); files land in PROFILE_DIR
+PROFILE_REQUESTS_ENABLED = os.environ.get('PROFILE_REQUESTS_ENABLED', 'true').lower() == 'true'
+PROFILE_MAX_SECONDS = float(os.environ.get('PROFILE_MAX_SECONDS', '60'))
+request_profiler = profiling.SamplingProfiler(float(os.environ.get('PROFILE_INTERVAL_MS', '2')) / 1000)
+profile_store = profiling.ProfileStore(
+    Path(os.environ.get('PROFILE_DIR', str(ROOT_DIR / "profiles"))),
+    keep=int(os.environ.get('PROFILE_KEEP', '50'))
+)
 
-# File upload directory
-UPLOAD_DIR = ROOT_DIR / "uploads"
-UPLOAD_DIR.mkdir(exist_ok=True)
+# Using cheapest models first to conserve budget
+LLM_MODELS = [
+    ("openai", "gpt-4o-mini"),
+    ("openai", "gpt-4o"),
+    ("gemini", "gemini-2.5-flash"),
+]
+
+# Uploaded files; with the local backend they live in sharded subdirectories of UPLOAD_DIR
+UPLOAD_DIR = Path(os.environ.get('UPLOAD_DIR', str(ROOT_DIR / "uploads")))
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'local')
+storage = create_storage(STORAGE_BACKEND, UPLOAD_DIR)
+
+# Unlinked attachments and unreferenced files older than the grace period are deleted; 0 disables the sweeper
+ATTACHMENT_GC_INTERVAL_SECONDS = float(os.environ.get('ATTACHMENT_GC_INTERVAL_SECONDS', '3600'))
+attachment_sweeper = AttachmentSweeper(
+    lambda: db,
+    storage,
+    grace_seconds=float(os.environ.get('ATTACHMENT_GC_GRACE_HOURS', '24')) * 3600,
+    batch_size=int(os.environ.get('ATTACHMENT_GC_BATCH_SIZE', '100')),
+    pause_seconds=float(os.environ.get('ATTACHMENT_GC_PAUSE_SECONDS', '0.5'))
+)
+
+# Soft-deleted chats are purged after N days, chats inactive for M months are archived; 0 disables a rule
+CHAT_RETENTION_INTERVAL_SECONDS = float(os.environ.get('CHAT_RETENTION_INTERVAL_SECONDS', '21600'))
+chat_retention = ChatRetention(
+    lambda: db,
+    deleted_days=float(os.environ.get('CHAT_PURGE_DELETED_DAYS', '30')),
+    inactive_days=float(os.environ.get('CHAT_ARCHIVE_INACTIVE_MONTHS', '6')) * 30,
+    batch_size=int(os.environ.get('CHAT_RETENTION_BATCH_SIZE', '50'))
+)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Runs in every worker process after it has been forked/spawned
+    await init_resources()
+    try:
+        yield
+    finally:
+        await close_resources()
 
 # Create the main app
-app = FastAPI(title="PocketBuddy API")
+app = FastAPI(title="PocketBuddy API", lifespan=lifespan)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -85,7 +344,7 @@ class UserResponse(BaseModel):
     is_active: bool
     grade_id: Optional[str] = None
     class_id: Optional[str] = None
-    created_at: str
+    created_at: IsoTimestamp
 
 class UserUpdate(BaseModel):
     first_name: Optional[str] = None
@@ -99,12 +358,16 @@ class GradeCreate(BaseModel):
     name: str
     order: int = 1
 
+class GradeUpdate(BaseModel):
+    name: Optional[str] = None
+    order: Optional[int] = None
+
 class GradeResponse(BaseModel):
     model_config = ConfigDict(extra="ignore")
     id: str
     name: str
     order: int
-    created_at: str
+    created_at: IsoTimestamp
 
 # Class Models
 class ClassCreate(BaseModel):
@@ -116,19 +379,23 @@ class ClassResponse(BaseModel):
     id: str
     name: str
     grade_id: str
-    created_at: str
+    created_at: IsoTimestamp
 
 # Subject Models
 class SubjectCreate(BaseModel):
     name: str
     description: Optional[str] = None
 
+class SubjectUpdate(BaseModel):
+    name: Optional[str] = None
+    description: Optional[str] = None
+
 class SubjectResponse(BaseModel):
     model_config = ConfigDict(extra="ignore")
     id: str
     name: str
     description: Optional[str] = None
-    created_at: str
+    created_at: IsoTimestamp
 
 # Teacher Subject Assignment
 class TeacherSubjectCreate(BaseModel):
@@ -146,10 +413,12 @@ class AISourceResponse(BaseModel):
     grade_id: Optional[str] = None
     grade_name: Optional[str] = None
     file_name: str
-    file_path: str
+    storage_key: Optional[str] = None
+    # Only on documents not yet moved by migrate_uploads.py
+    file_path: Optional[str] = None
     description: Optional[str] = None
     is_active: bool
-    created_at: str
+    created_at: IsoTimestamp
 
 class AISourceUpdate(BaseModel):
     description: Optional[str] = None
@@ -166,9 +435,10 @@ class ChatResponse(BaseModel):
     id: str
     user_id: str
     title: str
-    created_at: str
-    updated_at: str
+    created_at: IsoTimestamp
+    updated_at: IsoTimestamp
     is_deleted: bool
+    archived: bool = False
 
 class MessageCreate(BaseModel):
     content: str
@@ -180,15 +450,27 @@ class MessageResponse(BaseModel):
     chat_id: str
     sender_type: str
     content: str
-    created_at: str
+    created_at: IsoTimestamp
     attachments: Optional[List[dict]] = None
 
+class ChatSearchHit(BaseModel):
+    chat_id: str
+    chat_title: Optional[str] = None
+    message_id: str
+    sender_type: str
+    created_at: IsoTimestamp
+    snippet: str
+    # [start, end) character ranges inside snippet that matched the query
+    highlights: List[List[int]]
+    score: float
+
 # Chat File Upload Model
 class ChatAttachmentResponse(BaseModel):
     id: str
     file_name: str
     file_type: str
-    file_path: str
+    storage_key: Optional[str] = None
+    file_path: Optional[str] = None
 
 # Registration Request Models
 class RegistrationRequestResponse(BaseModel):
@@ -201,7 +483,7 @@ class RegistrationRequestResponse(BaseModel):
     grade_id: Optional[str] = None
     grade_name: Optional[str] = None
     status: str
-    created_at: str
+    created_at: IsoTimestamp
 
 # Flashcard and Quiz Models
 class FlashcardCreate(BaseModel):
@@ -209,6 +491,14 @@ class FlashcardCreate(BaseModel):
     subject_id: Optional[str] = None
     count: int = 10
 
+class FlashcardReview(BaseModel):
+    card_id: str
+    quality: int = Field(ge=0, le=5)
+    reviewed_at: Optional[str] = None
+
+class FlashcardReviewBatch(BaseModel):
+    reviews: List[FlashcardReview] = Field(min_length=1, max_length=200)
+
 class QuizCreate(BaseModel):
     topic: str
     subject_id: Optional[str] = None
@@ -216,12 +506,37 @@ class QuizCreate(BaseModel):
 
 # ==================== HELPER FUNCTIONS ====================
 
+PASSWORD_BCRYPT_ROUNDS = 12
+
 def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    import bcrypt
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(PASSWORD_BCRYPT_ROUNDS)).decode('utf-8')
 
 def verify_password(password: str, hashed: str) -> bool:
+    import bcrypt
     return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
 
+async def save_upload(file: UploadFile, storage_key: str) -> int:
+    """Store the upload; returns its size in bytes"""
+    content = await file.read()
+    await storage.put(storage_key, content, file.content_type)
+    return len(content)
+
+async def delete_stored_file(doc: dict):
+    """Remove the file behind a document; documents from before the storage backend only have file_path"""
+    if doc.get("storage_key"):
+        await storage.delete(doc["storage_key"])
+    elif doc.get("file_path"):
+        try:
+            os.remove(doc["file_path"])
+        except FileNotFoundError:
+            pass
+
+async def stored_file_response(doc: dict, content_type: Optional[str] = None):
+    if doc.get("storage_key"):
+        return await storage.download_response(doc["storage_key"], doc["file_name"], content_type)
+    return FileResponse(doc["file_path"], filename=doc["file_name"])
+
 def create_token(user_id: str, email: str, role: str) -> str:
     payload = {
         "user_id": user_id,
@@ -231,17 +546,22 @@ def create_token(user_id: str, email: str, role: str) -> str:
     }
     return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
 
-def decode_token(token: str) -> dict:
+def decode_token(token: str, audience: Optional[str] = None) -> dict:
+    # Single-purpose tokens carry an audience, which makes them invalid everywhere else
     try:
-        return jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+        return jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM], audience=audience)
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token vypršal")
     except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Neplatný token")
 
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    token = credentials.credentials
-    payload = decode_token(token)
+    return await user_from_token(credentials.credentials)
+
+async def user_from_token(token: str) -> dict:
+    return await user_from_claims(decode_token(token))
+
+async def user_from_claims(payload: dict) -> dict:
     user = await db.users.find_one({"id": payload["user_id"]}, {"_id": 0})
     if not user:
         raise HTTPException(status_code=401, detail="Používateľ nebol nájdený")
@@ -259,6 +579,120 @@ async def require_teacher(user: dict = Depends(get_current_user)):
         raise HTTPException(status_code=403, detail="Prístup povolený len pre učiteľov")
     return user
 
+async def complete_llm(provider: str, model: str, system_message: str, text: str, session_id: str, user: dict) -> str:
+    async def admitted_call():
+        # Teachers and admins are served ahead of queued student requests
+        async with llm_admission.slot(user["id"], priority=user["role"] != UserRole.STUDENT):
+            return await llm_backend.complete(provider, model, system_message, text, session_id)
+    
+    if not LLM_COALESCE:
+        return await admitted_call()
+    return await llm_singleflight.do(request_key(provider, model, system_message, text), admitted_call)
+
+async def generate_ai_response(system_message: str, text: str, session_id: str, min_length: int, endpoint: str, user: dict):
+    """Try each model in LLM_MODELS until one returns a long enough answer"""
+    llm_admission.check_rate(user["id"])
+    
+    start = time.perf_counter()
+    response = None
+    used_provider, used_model, depth = None, None, 0
+    for depth, (provider, model) in enumerate(LLM_MODELS):
+        try:
+            response = await complete_llm(provider, model, system_message, text, session_id, user)
+            
+            if response and len(response) > min_length:
+                logger.info(f"{endpoint} generated with {provider}/{model}")
+                used_provider, used_model = provider, model
+                break
+        except AdmissionRejected:
+            raise
+        except Exception as e:
+            logger.warning(f"{endpoint} {provider}/{model} failed: {str(e)}")
+            continue
+    
+    usage_recorder.record(
+        user_id=user["id"],
+        endpoint=endpoint,
+        provider=used_provider,
+        model=used_model,
+        prompt_chars=len(system_message) + len(text),
+        response_chars=len(response) if response else 0,
+        latency_ms=(time.perf_counter() - start) * 1000,
+        fallback_depth=depth,
+        success=used_model is not None
+    )
+    return response
+
+async def stream_ai_items(system_message: str, text: str, session_id: str, endpoint: str, user: dict,
+                          validate: Callable[[dict], Optional[dict]]) -> AsyncIterator[dict]:
+    """
+    Streaming counterpart of generate_ai_response for JSON-array answers: yields each valid element
+    as soon as the model closes it. The next model in LLM_MODELS is tried only while nothing has
+    been yielded; a model failing mid-answer ends the stream with what was already sent.
+    """
+    llm_admission.check_rate(user["id"])
+    
+    start = time.perf_counter()
+    used_provider, used_model, depth = None, None, 0
+    response_chars = emitted = 0
+    try:
+        for depth, (provider, model) in enumerate(LLM_MODELS):
+            parser = JsonArrayStream()
+            try:
+                async with llm_admission.slot(user["id"], priority=user["role"] != UserRole.STUDENT):
+                    async for chunk in llm_backend.stream(provider, model, system_message, text, session_id):
+                        response_chars += len(chunk)
+                        for item in parser.feed(chunk):
+                            item = validate(item)
+                            if item is not None:
+                                emitted += 1
+                                yield item
+                        if parser.done:
+                            break
+            except AdmissionRejected:
+                raise
+            except Exception as e:
+                logger.warning(f"{endpoint} stream {provider}/{model} failed: {str(e)}")
+            if emitted:
+                logger.info(f"{endpoint} streamed {emitted} items with {provider}/{model}")
+                used_provider, used_model = provider, model
+                break
+        if not emitted:
+            logger.error(f"All AI models failed for {endpoint} stream, using fallback")
+    finally:
+        usage_recorder.record(
+            user_id=user["id"],
+            endpoint=endpoint,
+            provider=used_provider,
+            model=used_model,
+            prompt_chars=len(system_message) + len(text),
+            response_chars=response_chars,
+            latency_ms=(time.perf_counter() - start) * 1000,
+            fallback_depth=depth,
+            success=used_model is not None
+        )
+
+async def ndjson_response(items: AsyncIterator[dict], fallback: List[dict],
+                          summary: Callable[[], Awaitable[dict]]) -> StreamingResponse:
+    """One JSON object per line, then a closing {"done": true, ...} line"""
+    # Wait for the first item here, so admission rejections still become HTTP errors
+    try:
+        first = await items.__anext__()
+    except StopAsyncIteration:
+        first = None
+    
+    async def lines():
+        if first is None:
+            for item in fallback:
+                yield json.dumps(item, ensure_ascii=False) + "\n"
+        else:
+            yield json.dumps(first, ensure_ascii=False) + "\n"
+            async for item in items:
+                yield json.dumps(item, ensure_ascii=False) + "\n"
+        yield json.dumps({"done": True, **await summary()}, ensure_ascii=False) + "\n"
+    
+    return StreamingResponse(lines(), media_type="application/x-ndjson", headers={"X-Accel-Buffering": "no"})
+
 # ==================== AUTH ENDPOINTS ====================
 
 @api_router.post("/auth/register")
@@ -271,7 +705,7 @@ async def register(user_data: UserCreate):
     # Create registration request
     request_id = str(uuid.uuid4())
     user_id = str(uuid.uuid4())
-    now = datetime.now(timezone.utc).isoformat()
+    now = utcnow()
     
     # Create user with pending approval
     user_doc = {
@@ -306,6 +740,12 @@ async def register(user_data: UserCreate):
     await db.users.insert_one(user_doc)
     await db.registration_requests.insert_one(registration_doc)
     
+    grade_names = await registration_grade_names([registration_doc])
+    await admin_events.publish("registration.created", RegistrationRequestResponse(
+        **registration_doc,
+        grade_name=grade_names.get(registration_doc["grade_id"])
+    ).model_dump(mode="json"))
+    
     return {"message": "Registrácia bola odoslaná. Čakáte na schválenie administrátorom."}
 
 @api_router.post("/auth/login")
@@ -314,7 +754,8 @@ async def login(credentials: UserLogin):
     if not user:
         raise HTTPException(status_code=401, detail="Nesprávne prihlasovacie údaje")
     
-    if not verify_password(credentials.password, user["password_hash"]):
+    # bcrypt is CPU-bound; off the event loop so a login burst does not stall other requests
+    if not await asyncio.to_thread(verify_password, credentials.password, user["password_hash"]):
         raise HTTPException(status_code=401, detail="Nesprávne prihlasovacie údaje")
     
     if not user.get("is_approved"):
@@ -323,6 +764,11 @@ async def login(credentials: UserLogin):
     if not user.get("is_active"):
         raise HTTPException(status_code=403, detail="Váš účet bol deaktivovaný")
     
+    if user_import.bcrypt_rounds(user["password_hash"]) < PASSWORD_BCRYPT_ROUNDS:
+        # Bulk-imported accounts start with a cheaper hash; upgrade it now that we know the password
+        password_hash = await asyncio.to_thread(hash_password, credentials.password)
+        await db.users.update_one({"id": user["id"]}, {"$set": {"password_hash": password_hash}})
+    
     token = create_token(user["id"], user["email"], user["role"])
     
     return {
@@ -351,23 +797,127 @@ async def get_all_users(admin: dict = Depends(require_admin)):
     users = await db.users.find({}, {"_id": 0, "password_hash": 0}).to_list(1000)
     return [UserResponse(**u) for u in users]
 
+# Imported passwords use a cheaper bcrypt cost so thousands hash in seconds; login upgrades them
+IMPORT_BCRYPT_ROUNDS = int(os.environ.get('IMPORT_BCRYPT_ROUNDS', '10'))
+IMPORT_HASH_WORKERS = int(os.environ.get('IMPORT_HASH_WORKERS', str(os.cpu_count() or 4)))
+IMPORT_MAX_BYTES = 10 * 1024 * 1024
+IMPORT_INSERT_BATCH = 1000
+
+@api_router.post("/admin/users/import")
+async def import_users(file: UploadFile = File(...), dry_run: bool = False, admin: dict = Depends(require_admin)):
+    """
+    Create approved students and teachers from a CSV
+    (email, first_name, last_name, role, grade, class, password - or meno, priezvisko, rola, ročník, trieda, heslo).
+    Rows without a password get a generated one, returned once in the report.
+    """
+    content = await file.read()
+    if len(content) > IMPORT_MAX_BYTES:
+        raise HTTPException(status_code=400, detail="Súbor je príliš veľký (max 10 MB)")
+    try:
+        header, rows = user_import.read_csv(content)
+    except (UnicodeDecodeError, csv.Error):
+        raise HTTPException(status_code=400, detail="Súbor musí byť CSV v kódovaní UTF-8")
+    if len(rows) > user_import.MAX_ROWS:
+        raise HTTPException(status_code=400, detail=f"Súbor môže mať najviac {user_import.MAX_ROWS} riadkov")
+    
+    grades, classes = await asyncio.gather(
+        db.grades.find({}, {"_id": 0, "id": 1, "name": 1}).to_list(None),
+        db.classes.find({}, {"_id": 0, "id": 1, "name": 1, "grade_id": 1}).to_list(None)
+    )
+    valid, errors = await asyncio.to_thread(user_import.validate_rows, header, rows, grades, classes)
+    
+    # Existing accounts are looked up first: the unique email index that would also reject them
+    # is built in the background and may be missing, and they need no password hash
+    emails = [row.email for row in valid]
+    existing = set()
+    for offset in range(0, len(emails), IMPORT_INSERT_BATCH):
+        existing.update(await db.users.distinct("email", {"email": {"$in": emails[offset:offset + IMPORT_INSERT_BATCH]}}))
+    if existing:
+        errors.extend({"row": row.row, "email": row.email, "error": "Používateľ s touto emailovou adresou už existuje"}
+                      for row in valid if row.email in existing)
+        valid = [row for row in valid if row.email not in existing]
+    
+    generated = {}
+    for row in valid:
+        if not row.password:
+            row.password = generated[row.row] = user_import.generate_password()
+    
+    if dry_run:
+        return {"dry_run": True, "total_rows": len(valid) + len(errors), "valid": len(valid),
+                "failed": len(errors), "errors": sorted(errors, key=lambda e: e["row"])}
+    
+    start = time.perf_counter()
+    hashes = await user_import.hash_passwords([row.password for row in valid], IMPORT_BCRYPT_ROUNDS, IMPORT_HASH_WORKERS)
+    hash_ms = round((time.perf_counter() - start) * 1000)
+    
+    now = utcnow()
+    import_id = str(uuid.uuid4())
+    imported = []
+    for offset in range(0, len(valid), IMPORT_INSERT_BATCH):
+        batch = valid[offset:offset + IMPORT_INSERT_BATCH]
+        docs = [{
+            "id": str(uuid.uuid4()),
+            "email": row.email,
+            "password_hash": password_hash,
+            "first_name": row.first_name,
+            "last_name": row.last_name,
+            "role": row.role,
+            "is_approved": True,
+            "is_active": True,
+            "grade_id": row.grade_id,
+            "class_id": row.class_id,
+            "import_id": import_id,
+            "created_at": now,
+            "updated_at": now
+        } for row, password_hash in zip(batch, hashes[offset:offset + IMPORT_INSERT_BATCH])]
+        failed_indexes = set()
+        try:
+            # The unique email index rejects accounts created since the lookup; ordered=False keeps inserting past them
+            await db.users.insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            for write_error in e.details.get("writeErrors", []):
+                row = batch[write_error["index"]]
+                failed_indexes.add(write_error["index"])
+                errors.append({
+                    "row": row.row,
+                    "email": row.email,
+                    "error": "Používateľ s touto emailovou adresou už existuje"
+                    if write_error.get("code") == 11000 else write_error.get("errmsg", "Chyba zápisu")
+                })
+        imported.extend(row for index, row in enumerate(batch) if index not in failed_indexes)
+    
+    logger.info(f"User import {import_id}: {len(imported)} imported, {len(errors)} failed, hashing took {hash_ms} ms")
+    await audit_log.record(admin, "user.import", "import", import_id, {
+        "imported": len(imported), "failed": len(errors), "file_name": file.filename
+    })
+    return {
+        "import_id": import_id,
+        "total_rows": len(imported) + len(errors),
+        "imported": len(imported),
+        "failed": len(errors),
+        "errors": sorted(errors, key=lambda e: e["row"]),
+        "generated_passwords": [
+            {"row": row.row, "email": row.email, "password": generated[row.row]}
+            for row in imported if row.row in generated
+        ]
+    }
+
+async def registration_grade_names(requests: List[dict]) -> dict:
+    grade_ids = list({r["grade_id"] for r in requests if r.get("grade_id")})
+    if not grade_ids:
+        return {}
+    grades = await db.grades.find({"id": {"$in": grade_ids}}, {"_id": 0, "id": 1, "name": 1}).to_list(None)
+    return {g["id"]: g["name"] for g in grades}
+
 @api_router.get("/admin/registration-requests")
 async def get_registration_requests(admin: dict = Depends(require_admin)):
     requests = await db.registration_requests.find({"status": RegistrationStatus.PENDING}, {"_id": 0}).to_list(1000)
+    grade_names = await registration_grade_names(requests)
     
-    result = []
-    for req in requests:
-        grade_name = None
-        if req.get("grade_id"):
-            grade = await db.grades.find_one({"id": req["grade_id"]}, {"_id": 0})
-            grade_name = grade["name"] if grade else None
-        
-        result.append(RegistrationRequestResponse(
-            **req,
-            grade_name=grade_name
-        ))
-    
-    return result
+    return [
+        RegistrationRequestResponse(**req, grade_name=grade_names.get(req.get("grade_id")))
+        for req in requests
+    ]
 
 @api_router.post("/admin/approve/{request_id}")
 async def approve_registration(request_id: str, admin: dict = Depends(require_admin)):
@@ -375,7 +925,7 @@ async def approve_registration(request_id: str, admin: dict = Depends(require_ad
     if not request:
         raise HTTPException(status_code=404, detail="Žiadosť nebola nájdená")
     
-    now = datetime.now(timezone.utc).isoformat()
+    now = utcnow()
     
     # Update user
     await db.users.update_one(
@@ -388,6 +938,9 @@ async def approve_registration(request_id: str, admin: dict = Depends(require_ad
         {"id": request_id},
         {"$set": {"status": RegistrationStatus.APPROVED, "processed_by_admin_id": admin["id"], "updated_at": now}}
     )
+    await audit_log.record(admin, "registration.approve", "user", request["user_id"],
+                           {"role": request["role_requested"]}, target_name=request["email"])
+    await admin_events.publish("registration.approved", {"id": request_id, "user_id": request["user_id"]})
     
     return {"message": "Registrácia bola schválená"}
 
@@ -397,7 +950,7 @@ async def reject_registration(request_id: str, admin: dict = Depends(require_adm
     if not request:
         raise HTTPException(status_code=404, detail="Žiadosť nebola nájdená")
     
-    now = datetime.now(timezone.utc).isoformat()
+    now = utcnow()
     
     # Delete user
     await db.users.delete_one({"id": request["user_id"]})
@@ -407,6 +960,9 @@ async def reject_registration(request_id: str, admin: dict = Depends(require_adm
         {"id": request_id},
         {"$set": {"status": RegistrationStatus.REJECTED, "processed_by_admin_id": admin["id"], "updated_at": now}}
     )
+    await audit_log.record(admin, "registration.reject", "user", request["user_id"],
+                           {"role": request["role_requested"]}, target_name=request["email"])
+    await admin_events.publish("registration.rejected", {"id": request_id, "user_id": request["user_id"]})
     
     return {"message": "Registrácia bola zamietnutá"}
 
@@ -417,9 +973,14 @@ async def update_user(user_id: str, update: UserUpdate, admin: dict = Depends(re
         raise HTTPException(status_code=404, detail="Používateľ nebol nájdený")
     
     update_data = {k: v for k, v in update.model_dump().items() if v is not None}
-    update_data["updated_at"] = datetime.now(timezone.utc).isoformat()
+    update_data["updated_at"] = utcnow()
     
     await db.users.update_one({"id": user_id}, {"$set": update_data})
+    if "first_name" in update_data or "last_name" in update_data:
+        await refresh_source_names("uploaded_by_user_id", user_id, "uploaded_by_name",
+                                   user_display_name({**user, **update_data}))
+    await audit_log.record(admin, "user.update", "user", user_id, audit.changes(user, update_data),
+                           target_name=user["email"])
     return {"message": "Používateľ bol aktualizovaný"}
 
 @api_router.delete("/admin/users/{user_id}")
@@ -427,13 +988,18 @@ async def delete_user(user_id: str, admin: dict = Depends(require_admin)):
     if user_id == admin["id"]:
         raise HTTPException(status_code=400, detail="Nemôžete zmazať svoj vlastný účet")
     
-    result = await db.users.delete_one({"id": user_id})
-    if result.deleted_count == 0:
+    deleted = await db.users.find_one_and_delete({"id": user_id}, projection={"_id": 0, "email": 1, "role": 1})
+    if not deleted:
         raise HTTPException(status_code=404, detail="Používateľ nebol nájdený")
     
     # Delete related data
     await db.chats.delete_many({"user_id": user_id})
     await db.messages.delete_many({"sender_user_id": user_id})
+    await refresh_source_names("uploaded_by_user_id", user_id, "uploaded_by_name", None)
+    await db.flashcards.delete_many({"user_id": user_id})
+    await db.flashcard_decks.delete_many({"user_id": user_id})
+    await audit_log.record(admin, "user.delete", "user", user_id, {"role": deleted["role"]},
+                           target_name=deleted["email"])
     
     return {"message": "Používateľ bol zmazaný"}
 
@@ -441,16 +1007,18 @@ async def delete_user(user_id: str, admin: dict = Depends(require_admin)):
 async def deactivate_user(user_id: str, admin: dict = Depends(require_admin)):
     await db.users.update_one(
         {"id": user_id},
-        {"$set": {"is_active": False, "updated_at": datetime.now(timezone.utc).isoformat()}}
+        {"$set": {"is_active": False, "updated_at": utcnow()}}
     )
+    await audit_log.record(admin, "user.deactivate", "user", user_id)
     return {"message": "Účet bol deaktivovaný"}
 
 @api_router.post("/admin/users/{user_id}/activate")
 async def activate_user(user_id: str, admin: dict = Depends(require_admin)):
     await db.users.update_one(
         {"id": user_id},
-        {"$set": {"is_active": True, "updated_at": datetime.now(timezone.utc).isoformat()}}
+        {"$set": {"is_active": True, "updated_at": utcnow()}}
     )
+    await audit_log.record(admin, "user.activate", "user", user_id)
     return {"message": "Účet bol aktivovaný"}
 
 @api_router.post("/admin/users/{user_id}/promote-grade")
@@ -476,8 +1044,10 @@ async def promote_student_grade(user_id: str, admin: dict = Depends(require_admi
     
     await db.users.update_one(
         {"id": user_id},
-        {"$set": {"grade_id": next_grade["id"], "updated_at": datetime.now(timezone.utc).isoformat()}}
+        {"$set": {"grade_id": next_grade["id"], "updated_at": utcnow()}}
     )
+    await audit_log.record(admin, "user.promote_grade", "user", user_id,
+                           {"grade_id": [current_grade_id, next_grade["id"]]}, target_name=user["email"])
     
     return {"message": f"Študent bol preradený do ročníka: {next_grade['name']}"}
 
@@ -491,7 +1061,7 @@ async def get_grades(user: dict = Depends(get_current_user)):
 @api_router.post("/grades", response_model=GradeResponse)
 async def create_grade(grade: GradeCreate, admin: dict = Depends(require_admin)):
     grade_id = str(uuid.uuid4())
-    now = datetime.now(timezone.utc).isoformat()
+    now = utcnow()
     
     grade_doc = {
         "id": grade_id,
@@ -502,13 +1072,32 @@ async def create_grade(grade: GradeCreate, admin: dict = Depends(require_admin))
     }
     
     await db.grades.insert_one(grade_doc)
+    await audit_log.record(admin, "grade.create", "grade", grade_id, target_name=grade.name)
     return GradeResponse(**grade_doc)
 
+@api_router.put("/grades/{grade_id}", response_model=GradeResponse)
+async def update_grade(grade_id: str, update: GradeUpdate, admin: dict = Depends(require_admin)):
+    update_data = {k: v for k, v in update.model_dump().items() if v is not None}
+    update_data["updated_at"] = utcnow()
+    
+    grade = await db.grades.find_one_and_update(
+        {"id": grade_id}, {"$set": update_data}, projection={"_id": 0}, return_document=ReturnDocument.AFTER
+    )
+    if not grade:
+        raise HTTPException(status_code=404, detail="Ročník nebol nájdený")
+    if "name" in update_data:
+        await refresh_source_names("grade_id", grade_id, "grade_name", grade["name"])
+    await audit_log.record(admin, "grade.update", "grade", grade_id,
+                           {k: v for k, v in update_data.items() if k != "updated_at"}, target_name=grade["name"])
+    return GradeResponse(**grade)
+
 @api_router.delete("/grades/{grade_id}")
 async def delete_grade(grade_id: str, admin: dict = Depends(require_admin)):
     result = await db.grades.delete_one({"id": grade_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Ročník nebol nájdený")
+    await refresh_source_names("grade_id", grade_id, "grade_name", None)
+    await audit_log.record(admin, "grade.delete", "grade", grade_id)
     return {"message": "Ročník bol zmazaný"}
 
 # ==================== CLASSES ENDPOINTS ====================
@@ -521,7 +1110,7 @@ async def get_classes(user: dict = Depends(get_current_user)):
 @api_router.post("/classes", response_model=ClassResponse)
 async def create_class(class_data: ClassCreate, admin: dict = Depends(require_admin)):
     class_id = str(uuid.uuid4())
-    now = datetime.now(timezone.utc).isoformat()
+    now = utcnow()
     
     class_doc = {
         "id": class_id,
@@ -532,6 +1121,7 @@ async def create_class(class_data: ClassCreate, admin: dict = Depends(require_ad
     }
     
     await db.classes.insert_one(class_doc)
+    await audit_log.record(admin, "class.create", "class", class_id, target_name=class_data.name)
     return ClassResponse(**class_doc)
 
 @api_router.delete("/classes/{class_id}")
@@ -539,6 +1129,7 @@ async def delete_class(class_id: str, admin: dict = Depends(require_admin)):
     result = await db.classes.delete_one({"id": class_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Trieda nebola nájdená")
+    await audit_log.record(admin, "class.delete", "class", class_id)
     return {"message": "Trieda bola zmazaná"}
 
 # ==================== SUBJECTS ENDPOINTS ====================
@@ -551,7 +1142,7 @@ async def get_subjects(user: dict = Depends(get_current_user)):
 @api_router.post("/subjects", response_model=SubjectResponse)
 async def create_subject(subject: SubjectCreate, admin: dict = Depends(require_admin)):
     subject_id = str(uuid.uuid4())
-    now = datetime.now(timezone.utc).isoformat()
+    now = utcnow()
     
     subject_doc = {
         "id": subject_id,
@@ -562,13 +1153,35 @@ async def create_subject(subject: SubjectCreate, admin: dict = Depends(require_a
     }
     
     await db.subjects.insert_one(subject_doc)
+    topic_catalog.invalidate()
+    await audit_log.record(admin, "subject.create", "subject", subject_id, target_name=subject.name)
     return SubjectResponse(**subject_doc)
 
+@api_router.put("/subjects/{subject_id}", response_model=SubjectResponse)
+async def update_subject(subject_id: str, update: SubjectUpdate, admin: dict = Depends(require_admin)):
+    update_data = {k: v for k, v in update.model_dump().items() if v is not None}
+    update_data["updated_at"] = utcnow()
+    
+    subject = await db.subjects.find_one_and_update(
+        {"id": subject_id}, {"$set": update_data}, projection={"_id": 0}, return_document=ReturnDocument.AFTER
+    )
+    if not subject:
+        raise HTTPException(status_code=404, detail="Predmet nebol nájdený")
+    if "name" in update_data:
+        await refresh_source_names("subject_id", subject_id, "subject_name", subject["name"])
+    topic_catalog.invalidate()
+    await audit_log.record(admin, "subject.update", "subject", subject_id,
+                           {k: v for k, v in update_data.items() if k != "updated_at"}, target_name=subject["name"])
+    return SubjectResponse(**subject)
+
 @api_router.delete("/subjects/{subject_id}")
 async def delete_subject(subject_id: str, admin: dict = Depends(require_admin)):
     result = await db.subjects.delete_one({"id": subject_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Predmet nebol nájdený")
+    await refresh_source_names("subject_id", subject_id, "subject_name", None)
+    topic_catalog.invalidate()
+    await audit_log.record(admin, "subject.delete", "subject", subject_id)
     return {"message": "Predmet bol zmazaný"}
 
 # ==================== TEACHER SUBJECTS ENDPOINTS ====================
@@ -594,7 +1207,7 @@ async def get_teacher_subjects(teacher: dict = Depends(require_teacher)):
 @api_router.post("/teacher/my-subjects")
 async def assign_teacher_subject(assignment: TeacherSubjectCreate, teacher: dict = Depends(require_teacher)):
     assignment_id = str(uuid.uuid4())
-    now = datetime.now(timezone.utc).isoformat()
+    now = utcnow()
     
     assignment_doc = {
         "id": assignment_id,
@@ -617,6 +1230,35 @@ async def remove_teacher_subject(assignment_id: str, teacher: dict = Depends(req
 
 # ==================== AI SOURCES ENDPOINTS ====================
 
+# Uploader, subject and grade names are stored on the source when it is written and kept
+# current by refresh_source_names, so listing sources is a single query without joins.
+SOURCE_NAME_FANOUT_BATCH = 500
+
+def user_display_name(user: dict) -> str:
+    return f"{user['first_name']} {user['last_name']}"
+
+async def lookup_name(collection: str, item_id: Optional[str]) -> Optional[str]:
+    if not item_id:
+        return None
+    doc = await db[collection].find_one({"id": item_id}, {"_id": 0, "name": 1})
+    return doc["name"] if doc else None
+
+async def refresh_source_names(id_field: str, item_id: str, name_field: str, name: Optional[str]) -> int:
+    """Rewrite one stored name on every source referencing item_id, a bounded batch at a time"""
+    stale = {id_field: item_id, name_field: {"$ne": name}}
+    total = 0
+    while True:
+        batch = await db.ai_sources.find(stale, {"_id": 0, "id": 1}).limit(
+            SOURCE_NAME_FANOUT_BATCH).to_list(SOURCE_NAME_FANOUT_BATCH)
+        if not batch:
+            break
+        result = await db.ai_sources.update_many(
+            {**stale, "id": {"$in": [s["id"] for s in batch]}}, {"$set": {name_field: name}}
+        )
+        total += result.modified_count
+        await asyncio.sleep(0)
+    return total
+
 @api_router.get("/ai-sources", response_model=List[AISourceResponse])
 async def get_ai_sources(user: dict = Depends(get_current_user)):
     query = {}
@@ -624,21 +1266,7 @@ async def get_ai_sources(user: dict = Depends(get_current_user)):
         query["uploaded_by_user_id"] = user["id"]
     
     sources = await db.ai_sources.find(query, {"_id": 0}).to_list(1000)
-    
-    result = []
-    for source in sources:
-        uploader = await db.users.find_one({"id": source["uploaded_by_user_id"]}, {"_id": 0})
-        subject = await db.subjects.find_one({"id": source.get("subject_id")}, {"_id": 0}) if source.get("subject_id") else None
-        grade = await db.grades.find_one({"id": source.get("grade_id")}, {"_id": 0}) if source.get("grade_id") else None
-        
-        result.append(AISourceResponse(
-            **source,
-            uploaded_by_name=f"{uploader['first_name']} {uploader['last_name']}" if uploader else None,
-            subject_name=subject["name"] if subject else None,
-            grade_name=grade["name"] if grade else None
-        ))
-    
-    return result
+    return [AISourceResponse(**source) for source in sources]
 
 @api_router.post("/ai-sources/upload")
 async def upload_ai_source(
@@ -649,27 +1277,35 @@ async def upload_ai_source(
     user: dict = Depends(require_teacher)
 ):
     source_id = str(uuid.uuid4())
-    now = datetime.now(timezone.utc).isoformat()
+    now = utcnow()
     
     # Save file
     file_ext = Path(file.filename).suffix if file.filename else ''
-    file_path = UPLOAD_DIR / f"{source_id}{file_ext}"
+    storage_key = f"{source_id}{file_ext}"
     
     try:
-        async with aiofiles.open(file_path, 'wb') as f:
-            content = await file.read()
-            await f.write(content)
+        file_size = await save_upload(file, storage_key)
     except Exception as e:
         logger.error(f"File upload error: {str(e)}")
         raise HTTPException(status_code=500, detail="Chyba pri nahrávaní súboru")
     
+    subject_id = subject_id or None
+    grade_id = grade_id or None
+    subject_name, grade_name = await asyncio.gather(
+        lookup_name("subjects", subject_id), lookup_name("grades", grade_id)
+    )
+    
     source_doc = {
         "id": source_id,
         "uploaded_by_user_id": user["id"],
-        "subject_id": subject_id if subject_id and subject_id != '' else None,
-        "grade_id": grade_id if grade_id and grade_id != '' else None,
+        "uploaded_by_name": user_display_name(user),
+        "subject_id": subject_id,
+        "subject_name": subject_name,
+        "grade_id": grade_id,
+        "grade_name": grade_name,
         "file_name": file.filename,
-        "file_path": str(file_path),
+        "storage_key": storage_key,
+        "file_size": file_size,
         "description": description if description else None,
         "is_active": True,
         "created_at": now,
@@ -677,6 +1313,9 @@ async def upload_ai_source(
     }
     
     await db.ai_sources.insert_one(source_doc)
+    invalidate_source_caches()
+    await audit_log.record(user, "ai_source.upload", "ai_source", source_id,
+                           {"subject_id": subject_id, "grade_id": grade_id}, target_name=file.filename)
     
     return {"message": "Súbor bol nahraný", "id": source_id, "file_name": file.filename}
 
@@ -691,9 +1330,16 @@ async def update_ai_source(source_id: str, update: AISourceUpdate, user: dict =
         raise HTTPException(status_code=404, detail="Zdroj nebol nájdený")
     
     update_data = {k: v for k, v in update.model_dump().items() if v is not None}
-    update_data["updated_at"] = datetime.now(timezone.utc).isoformat()
+    update_data["updated_at"] = utcnow()
+    if "subject_id" in update_data:
+        update_data["subject_name"] = await lookup_name("subjects", update_data["subject_id"])
+    if "grade_id" in update_data:
+        update_data["grade_name"] = await lookup_name("grades", update_data["grade_id"])
     
     await db.ai_sources.update_one({"id": source_id}, {"$set": update_data})
+    invalidate_source_caches()
+    await audit_log.record(user, "ai_source.update", "ai_source", source_id, audit.changes(source, update_data),
+                           target_name=source["file_name"])
     return {"message": "Zdroj bol aktualizovaný"}
 
 @api_router.delete("/ai-sources/{source_id}")
@@ -708,34 +1354,117 @@ async def delete_ai_source(source_id: str, user: dict = Depends(require_teacher)
     
     # Delete file
     try:
-        os.remove(source["file_path"])
-    except:
-        pass
+        await delete_stored_file(source)
+    except Exception as e:
+        logger.error(f"Failed to delete file of AI source {source_id}: {str(e)}")
     
     await db.ai_sources.delete_one({"id": source_id})
+    invalidate_source_caches()
+    await audit_log.record(user, "ai_source.delete", "ai_source", source_id, target_name=source["file_name"])
     return {"message": "Zdroj bol zmazaný"}
 
+# ==================== PROMPT CONTEXT CACHE ====================
+
+CHAT_SYSTEM_PROMPT = """Si PocketBuddy, priateľský AI asistent pre slovenské stredné školy. 😊
+Komunikuješ po slovensky, si trpezlivý a povzbudzujúci 💪
+Vysvetľuješ veci jednoducho a zrozumiteľne.
+Pri matematike vysvetľuješ krok po kroku.
+Používaš emotikony 🎓📚✨"""
+
+# Safety net for other workers, which do not see this worker's invalidations
+PROMPT_CONTEXT_TTL_SECONDS = float(os.environ.get('PROMPT_CONTEXT_TTL_SECONDS', '60'))
+
+# Bounded, since study keys carry a client-supplied subject id
+PROMPT_CONTEXT_MAX_ENTRIES = int(os.environ.get('PROMPT_CONTEXT_MAX_ENTRIES', '1000'))
+
+prompt_context_cache = PromptContextCache(PROMPT_CONTEXT_TTL_SECONDS, PROMPT_CONTEXT_MAX_ENTRIES)
+
+# First-turn chat answers reused for near-identical questions; ANSWER_CACHE_MAX_ENTRIES=0 disables
+answer_cache = AnswerCache(
+    threshold=float(os.environ.get('ANSWER_CACHE_THRESHOLD', '0.8')),
+    max_entries=int(os.environ.get('ANSWER_CACHE_MAX_ENTRIES', '5000')),
+    ttl_seconds=float(os.environ.get('ANSWER_CACHE_TTL_SECONDS', '86400'))
+)
+
+def answer_cache_scope(user: dict, system_message: str) -> str:
+    """Grade plus a fingerprint of the rendered prompt, which changes with the active source set"""
+    grade_scope = user.get("grade_id") if user["role"] == UserRole.STUDENT else None
+    fingerprint = hashlib.sha1(system_message.encode("utf-8")).hexdigest()[:16]
+    return f"{grade_scope or '*'}:{fingerprint}"
+
+topic_catalog = TopicCatalog(lambda: db, PROMPT_CONTEXT_TTL_SECONDS)
+
+def invalidate_source_caches():
+    """Called after every ai_sources write"""
+    prompt_context_cache.invalidate()
+    topic_catalog.invalidate()
+
+async def cached_sources_context(key, sources_query: dict, limit: int, header: str) -> str:
+    context = prompt_context_cache.get(key)
+    if context is not None:
+        return context
+    
+    version = prompt_context_cache.version
+    # Only the documents and fields the prompt actually uses
+    ai_sources = await db.ai_sources.find(
+        sources_query, {"_id": 0, "file_name": 1, "description": 1}
+    ).limit(limit).to_list(limit)
+    
+    lines = []
+    for source in ai_sources:
+        line = f"- {source['file_name']}"
+        if source.get('description'):
+            line += f": {source['description']}"
+        lines.append(line + "\n")
+    context = header + "".join(lines) if lines else ""
+    
+    prompt_context_cache.put(key, context, version)
+    return context
+
+async def chat_sources_context(user: dict) -> str:
+    sources_query = {"is_active": True}
+    grade_scope = "*"
+    if user["role"] == UserRole.STUDENT:
+        if user.get("grade_id"):
+            grade_scope = user["grade_id"]
+            sources_query["$or"] = [
+                {"grade_id": user["grade_id"]},
+                {"grade_id": None}
+            ]
+    return await cached_sources_context(
+        ("chat", grade_scope), sources_query, 10,
+        "\nMáš prístup k nasledujúcim študijným materiálom:\n"
+    )
+
+async def study_sources_context(subject_id: Optional[str]) -> str:
+    """Context for flashcards and quizzes"""
+    sources_query = {"is_active": True}
+    if subject_id:
+        sources_query["subject_id"] = subject_id
+    return await cached_sources_context(
+        ("study", subject_id), sources_query, 5,
+        "\n\nMáš prístup k týmto študijným materiálom:\n"
+    )
+
 # ==================== FLASHCARDS & QUIZ ====================
 
+def fallback_flashcards(topic: str) -> List[dict]:
+    return [
+        {"otazka": f"Čo je {topic}? 🤔", "odpoved": f"Téma {topic} je dôležitá oblasť štúdia. Skús vyhľadať viac informácií v učebnici! 📚"},
+        {"otazka": f"Prečo je {topic} dôležitá? 💡", "odpoved": "Táto téma ti pomôže pochopiť základy a súvislosti v predmete."},
+        {"otazka": "Tip na učenie 📝", "odpoved": "Skús si vytvoriť vlastné poznámky a opakovať ich každý deň! 💪"}
+    ]
+
 @api_router.post("/flashcards/generate")
-async def generate_flashcards(data: FlashcardCreate, user: dict = Depends(get_current_user)):
+async def generate_flashcards(
+    data: FlashcardCreate,
+    stream: bool = Query(False, description="NDJSON: one card per line as soon as it is generated"),
+    user: dict = Depends(get_current_user)
+):
     """Generate flashcards from a topic using AI"""
     
     # Get AI sources for context
-    sources_query = {"is_active": True}
-    if data.subject_id:
-        sources_query["subject_id"] = data.subject_id
-    
-    ai_sources = await db.ai_sources.find(sources_query, {"_id": 0}).to_list(50)
-    
-    context = ""
-    if ai_sources:
-        context = "\n\nMáš prístup k týmto študijným materiálom:\n"
-        for source in ai_sources[:5]:
-            context += f"- {source['file_name']}"
-            if source.get('description'):
-                context += f": {source['description']}"
-            context += "\n"
+    context = await study_sources_context(data.subject_id)
     
     system_prompt = f"""Si PocketBuddy, AI asistent pre slovenské stredné školy. 
 Vytvor {data.count} učebných kartičiek (flashcards) na tému: {data.topic}
@@ -751,73 +1480,70 @@ Používaj emotikony na oživenie. 😊📚
 {context}
 """
     
-    models_to_try = [
-        ("openai", "gpt-4o-mini"),
-        ("openai", "gpt-4o"),
-        ("gemini", "gemini-2.5-flash"),
-    ]
+    user_message = f"Vytvor {data.count} kartičiek na tému: {data.topic}"
+    session_id = f"flashcards-{uuid.uuid4()}"
     
-    response = None
-    for provider, model in models_to_try:
-        try:
-            llm_chat = LlmChat(
-                api_key=EMERGENT_LLM_KEY,
-                session_id=f"flashcards-{uuid.uuid4()}",
-                system_message=system_prompt
-            ).with_model(provider, model)
-            
-            response = await llm_chat.send_message(UserMessage(text=f"Vytvor {data.count} kartičiek na tému: {data.topic}"))
-            
-            if response and len(response) > 20:
-                logger.info(f"Flashcards generated with {provider}/{model}")
-                break
-        except Exception as e:
-            logger.warning(f"Flashcard {provider}/{model} failed: {str(e)}")
-            continue
+    if stream:
+        cards = []
+        
+        async def streamed_cards():
+            async for card in stream_ai_items(system_prompt, user_message, session_id, "flashcards", user,
+                                              spaced_repetition.valid_card):
+                card["id"] = str(uuid.uuid4())
+                cards.append(card)
+                yield card
+        
+        async def summary():
+            deck_id = await save_flashcard_deck(user, data.topic, data.subject_id, cards) if cards else None
+            return {"topic": data.topic, "count": len(cards), "deck_id": deck_id}
+        
+        return await ndjson_response(streamed_cards(), fallback_flashcards(data.topic), summary)
+    
+    response = await generate_ai_response(
+        system_prompt,
+        user_message,
+        session_id=session_id,
+        min_length=20,
+        endpoint="flashcards",
+        user=user
+    )
     
     if not response:
         # Fallback - create simple flashcards
         logger.error("All AI models failed for flashcards, using fallback")
-        flashcards = [
-            {"otazka": f"Čo je {data.topic}? 🤔", "odpoved": f"Téma {data.topic} je dôležitá oblasť štúdia. Skús vyhľadať viac informácií v učebnici! 📚"},
-            {"otazka": f"Prečo je {data.topic} dôležitá? 💡", "odpoved": "Táto téma ti pomôže pochopiť základy a súvislosti v predmete."},
-            {"otazka": "Tip na učenie 📝", "odpoved": "Skús si vytvoriť vlastné poznámky a opakovať ich každý deň! 💪"}
-        ]
-        return {"flashcards": flashcards, "topic": data.topic}
-    
-    # Try to parse JSON from response
-    import json
-    try:
-        start = response.find('[')
-        end = response.rfind(']') + 1
-        if start != -1 and end > start:
-            flashcards = json.loads(response[start:end])
-        else:
-            flashcards = [{"otazka": "Chyba", "odpoved": response}]
-    except:
-        flashcards = [{"otazka": "Odpoveď", "odpoved": response}]
-    
-    return {"flashcards": flashcards, "topic": data.topic}
+        return {"flashcards": fallback_flashcards(data.topic), "topic": data.topic}
+    
+    cards = spaced_repetition.valid_cards(parse_array(response))
+    if not cards:
+        return {"flashcards": [{"otazka": "Odpoveď", "odpoved": response}], "topic": data.topic}
+    deck_id = await save_flashcard_deck(user, data.topic, data.subject_id, cards)
+    return {"flashcards": cards, "topic": data.topic, "deck_id": deck_id}
+
+def valid_question(item: dict) -> Optional[dict]:
+    if not isinstance(item.get("otazka"), str) or not isinstance(item.get("moznosti"), list):
+        return None
+    return item
+
+def fallback_quiz(topic: str) -> List[dict]:
+    return [
+        {
+            "otazka": f"Čo je hlavná podstata témy '{topic}'? 🤔",
+            "moznosti": ["A) Je to dôležitá téma", "B) Nie je dôležitá", "C) Neviem", "D) Všetky odpovede"],
+            "spravna": "A",
+            "vysvetlenie": f"Téma {topic} je dôležitá súčasť učiva! 📚"
+        }
+    ]
 
 @api_router.post("/quiz/generate")
-async def generate_quiz(data: QuizCreate, user: dict = Depends(get_current_user)):
+async def generate_quiz(
+    data: QuizCreate,
+    stream: bool = Query(False, description="NDJSON: one question per line as soon as it is generated"),
+    user: dict = Depends(get_current_user)
+):
     """Generate a quiz from a topic using AI"""
     
     # Get AI sources for context
-    sources_query = {"is_active": True}
-    if data.subject_id:
-        sources_query["subject_id"] = data.subject_id
-    
-    ai_sources = await db.ai_sources.find(sources_query, {"_id": 0}).to_list(50)
-    
-    context = ""
-    if ai_sources:
-        context = "\n\nMáš prístup k týmto študijným materiálom:\n"
-        for source in ai_sources[:5]:
-            context += f"- {source['file_name']}"
-            if source.get('description'):
-                context += f": {source['description']}"
-            context += "\n"
+    context = await study_sources_context(data.subject_id)
     
     system_prompt = f"""Si PocketBuddy, AI asistent pre slovenské stredné školy.
 Vytvor kvíz s {data.question_count} otázkami na tému: {data.topic}
@@ -837,86 +1563,158 @@ Používaj emotikony. 😊📚✨
 {context}
 """
     
-    models_to_try = [
-        ("openai", "gpt-4o-mini"),
-        ("openai", "gpt-4o"),
-        ("gemini", "gemini-2.5-flash"),
-    ]
+    user_message = f"Vytvor kvíz s {data.question_count} otázkami na tému: {data.topic}"
+    session_id = f"quiz-{uuid.uuid4()}"
     
-    response = None
-    for provider, model in models_to_try:
-        try:
-            llm_chat = LlmChat(
-                api_key=EMERGENT_LLM_KEY,
-                session_id=f"quiz-{uuid.uuid4()}",
-                system_message=system_prompt
-            ).with_model(provider, model)
-            
-            response = await llm_chat.send_message(UserMessage(text=f"Vytvor kvíz s {data.question_count} otázkami na tému: {data.topic}"))
-            
-            if response and len(response) > 20:
-                logger.info(f"Quiz generated with {provider}/{model}")
-                break
-        except Exception as e:
-            logger.warning(f"Quiz {provider}/{model} failed: {str(e)}")
-            continue
+    if stream:
+        count = 0
+        
+        async def streamed_questions():
+            nonlocal count
+            async for question in stream_ai_items(system_prompt, user_message, session_id, "quiz", user,
+                                                  valid_question):
+                count += 1
+                yield question
+        
+        async def summary():
+            return {"topic": data.topic, "count": count}
+        
+        return await ndjson_response(streamed_questions(), fallback_quiz(data.topic), summary)
+    
+    response = await generate_ai_response(
+        system_prompt,
+        user_message,
+        session_id=session_id,
+        min_length=20,
+        endpoint="quiz",
+        user=user
+    )
     
     if not response:
         # Fallback - create simple quiz
         logger.error("All AI models failed for quiz, using fallback")
-        questions = [
-            {
-                "otazka": f"Čo je hlavná podstata témy '{data.topic}'? 🤔",
-                "moznosti": ["A) Je to dôležitá téma", "B) Nie je dôležitá", "C) Neviem", "D) Všetky odpovede"],
-                "spravna": "A",
-                "vysvetlenie": f"Téma {data.topic} je dôležitá súčasť učiva! 📚"
-            }
-        ]
-        return {"questions": questions, "topic": data.topic}
+        return {"questions": fallback_quiz(data.topic), "topic": data.topic}
     
-    # Try to parse JSON from response
-    import json
-    try:
-        start = response.find('[')
-        end = response.rfind(']') + 1
-        if start != -1 and end > start:
-            questions = json.loads(response[start:end])
-        else:
-            questions = [{"otazka": "Chyba", "moznosti": [], "spravna": "", "vysvetlenie": response}]
-    except:
+    questions = [q for q in parse_array(response) if valid_question(q)]
+    if not questions:
         questions = [{"otazka": "Odpoveď", "moznosti": [], "spravna": "", "vysvetlenie": response}]
     
     return {"questions": questions, "topic": data.topic}
 
 @api_router.get("/topics")
-async def get_available_topics(user: dict = Depends(get_current_user)):
-    """Get available topics from AI sources"""
-    sources_query = {"is_active": True}
+async def get_available_topics(request: Request, user: dict = Depends(get_current_user)):
+    """Get available topics from AI sources, from the materialized catalog"""
+    # Students see their grade's sources plus the general ones
+    grade_id = user.get("grade_id") if user["role"] == UserRole.STUDENT else None
+    etag, body = await topic_catalog.get(grade_id)
     
-    # Filter by user's grade if student
-    if user["role"] == UserRole.STUDENT and user.get("grade_id"):
-        sources_query["$or"] = [
-            {"grade_id": user["grade_id"]},
-            {"grade_id": None}
-        ]
-    
-    ai_sources = await db.ai_sources.find(sources_query, {"_id": 0}).to_list(100)
-    subjects = await db.subjects.find({}, {"_id": 0}).to_list(100)
-    
-    topics = []
-    subject_map = {s["id"]: s["name"] for s in subjects}
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache", "Vary": "Authorization"}
+    if etag in request.headers.get("if-none-match", ""):
+        topic_catalog.not_modified += 1
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+# ==================== FLASHCARD REVIEWS ====================
+
+# Generated cards are kept per user with SM-2 review state, so studying them again costs no LLM call.
+# The due queue is served by the (user_id, due_at) index.
+FLASHCARDS_DUE_LIMIT = 50
+
+def flashcard_response(card: dict) -> dict:
+    return {
+        "id": card["id"],
+        "deck_id": card["deck_id"],
+        "otazka": card["question"],
+        "odpoved": card["answer"],
+        "due_at": card["due_at"],
+        "interval_days": card["interval_days"],
+        "repetitions": card["repetitions"],
+    }
+
+async def save_flashcard_deck(user: dict, topic: str, subject_id: Optional[str], cards: List[dict]) -> str:
+    deck_id = str(uuid.uuid4())
+    now = utcnow()
+    await db.flashcard_decks.insert_one({
+        "id": deck_id,
+        "user_id": user["id"],
+        "topic": topic,
+        "subject_id": subject_id or None,
+        "card_count": len(cards),
+        "created_at": now
+    })
+    state = spaced_repetition.initial_state(now)
+    docs = [{
+        "id": str(uuid.uuid4()),
+        "deck_id": deck_id,
+        "user_id": user["id"],
+        "question": card["otazka"],
+        "answer": card["odpoved"],
+        **state,
+        "created_at": now
+    } for card in cards]
+    await db.flashcards.insert_many(docs)
+    for card, doc in zip(cards, docs):
+        card["id"] = doc["id"]
+    return deck_id
+
+@api_router.get("/flashcards/decks")
+async def get_flashcard_decks(user: dict = Depends(get_current_user)):
+    decks = await db.flashcard_decks.find({"user_id": user["id"]}, {"_id": 0}).sort("created_at", -1).to_list(100)
+    return {"decks": decks}
+
+@api_router.delete("/flashcards/decks/{deck_id}")
+async def delete_flashcard_deck(deck_id: str, user: dict = Depends(get_current_user)):
+    result = await db.flashcard_decks.delete_one({"id": deck_id, "user_id": user["id"]})
+    if result.deleted_count == 0:
+        raise HTTPException(status_code=404, detail="Balíček nebol nájdený")
+    await db.flashcards.delete_many({"deck_id": deck_id, "user_id": user["id"]})
+    return {"message": "Balíček bol zmazaný"}
+
+@api_router.get("/flashcards/due")
+async def get_due_flashcards(
+    limit: int = Query(20, ge=1, le=FLASHCARDS_DUE_LIMIT),
+    user: dict = Depends(get_current_user)
+):
+    """Cards due for review, most overdue first"""
+    now = utcnow()
+    cards = await db.flashcards.find(
+        {"user_id": user["id"], "due_at": {"$lte": now}}, {"_id": 0}
+    ).sort("due_at", 1).limit(limit).to_list(limit)
+    return {"cards": [flashcard_response(card) for card in cards], "now": now}
+
+@api_router.post("/flashcards/review")
+async def review_flashcards(batch: FlashcardReviewBatch, user: dict = Depends(get_current_user)):
+    """Apply a batch of reviews: one read and one bulk write, however many cards"""
+    now = utcnow()
+    card_ids = list({review.card_id for review in batch.reviews})
+    cards = await db.flashcards.find(
+        {"id": {"$in": card_ids}, "user_id": user["id"]},
+        {"_id": 0, "id": 1, "ease_factor": 1, "interval_days": 1, "repetitions": 1}
+    ).to_list(len(card_ids))
+    by_id = {card["id"]: card for card in cards}
+    
+    updates = {}
+    # Reviews of the same card are applied in the order they happened
+    for review in sorted(batch.reviews, key=lambda r: spaced_repetition.parse_time(r.reviewed_at, now)):
+        card = by_id.get(review.card_id)
+        if card is None:
+            continue
+        reviewed_at = spaced_repetition.parse_time(review.reviewed_at, now)
+        card.update(spaced_repetition.schedule(card, review.quality, reviewed_at))
+        updates[card["id"]] = card
     
-    for source in ai_sources:
-        topic = {
-            "id": source["id"],
-            "name": source["file_name"],
-            "description": source.get("description", ""),
-            "subject_id": source.get("subject_id"),
-            "subject_name": subject_map.get(source.get("subject_id"), "Všeobecné")
-        }
-        topics.append(topic)
+    if updates:
+        await db.flashcards.bulk_write([
+            UpdateOne({"id": card_id, "user_id": user["id"]}, {"$set": {k: v for k, v in card.items() if k != "id"}})
+            for card_id, card in updates.items()
+        ], ordered=False)
     
-    return {"topics": topics, "subjects": subjects}
+    return {
+        "updated": len(updates),
+        "not_found": [card_id for card_id in card_ids if card_id not in by_id],
+        "cards": [{"id": card_id, "due_at": card["due_at"], "interval_days": card["interval_days"]}
+                  for card_id, card in updates.items()]
+    }
 
 # ==================== CHAT ENDPOINTS ====================
 
@@ -931,7 +1729,7 @@ async def get_chats(user: dict = Depends(get_current_user)):
 @api_router.post("/chats", response_model=ChatResponse)
 async def create_chat(chat_data: ChatCreate, user: dict = Depends(get_current_user)):
     chat_id = str(uuid.uuid4())
-    now = datetime.now(timezone.utc).isoformat()
+    now = utcnow()
     
     chat_doc = {
         "id": chat_id,
@@ -939,7 +1737,8 @@ async def create_chat(chat_data: ChatCreate, user: dict = Depends(get_current_us
         "title": chat_data.title,
         "created_at": now,
         "updated_at": now,
-        "is_deleted": False
+        "is_deleted": False,
+        "messages_owner_backfilled": True
     }
     
     await db.chats.insert_one(chat_doc)
@@ -947,14 +1746,83 @@ async def create_chat(chat_data: ChatCreate, user: dict = Depends(get_current_us
 
 @api_router.delete("/chats/{chat_id}")
 async def delete_chat(chat_id: str, user: dict = Depends(get_current_user)):
+    now = utcnow()
     result = await db.chats.update_one(
         {"id": chat_id, "user_id": user["id"]},
-        {"$set": {"is_deleted": True, "updated_at": datetime.now(timezone.utc).isoformat()}}
+        {"$set": {"is_deleted": True, "deleted_at": now, "updated_at": now}}
     )
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="Konverzácia nebola nájdená")
     return {"message": "Konverzácia bola zmazaná"}
 
+SEARCH_SNIPPET_RADIUS = 80
+
+def fold_diacritics(text: str) -> str:
+    """Lowercase and strip diacritics one character at a time, so offsets match the original text"""
+    return "".join(unicodedata.normalize("NFD", ch.lower())[0] for ch in text)
+
+def highlight_snippet(content: str, query: str):
+    """Cut a snippet around the first matching term and return it with highlight ranges"""
+    terms = [t for t in fold_diacritics(query.replace('"', " ")).split() if t and not t.startswith("-")]
+    folded = fold_diacritics(content)
+    
+    matches = []
+    for term in terms:
+        start = folded.find(term)
+        while start != -1:
+            matches.append((start, start + len(term)))
+            start = folded.find(term, start + len(term))
+    matches.sort()
+    
+    first = matches[0][0] if matches else 0
+    begin = max(0, first - SEARCH_SNIPPET_RADIUS)
+    end = min(len(content), first + SEARCH_SNIPPET_RADIUS * 2)
+    prefix = "…" if begin > 0 else ""
+    suffix = "…" if end < len(content) else ""
+    
+    highlights = [
+        [m_start - begin + len(prefix), m_end - begin + len(prefix)]
+        for m_start, m_end in matches if m_start >= begin and m_end <= end
+    ]
+    return prefix + content[begin:end] + suffix, highlights
+
+@api_router.get("/chats/search", response_model=List[ChatSearchHit])
+async def search_chats(
+    q: str = Query(..., min_length=2, max_length=200),
+    limit: int = Query(20, ge=1, le=50),
+    user: dict = Depends(get_current_user)
+):
+    """Full-text search over the caller's own chat messages (diacritic-insensitive)"""
+    deleted_chat_ids = await db.chats.distinct("id", {"user_id": user["id"], "is_deleted": True})
+    
+    query = {"user_id": user["id"], "$text": {"$search": q}}
+    if deleted_chat_ids:
+        query["chat_id"] = {"$nin": deleted_chat_ids}
+    
+    messages = await db.messages.find(
+        query,
+        {"_id": 0, "id": 1, "chat_id": 1, "sender_type": 1, "content": 1, "created_at": 1, "score": {"$meta": "textScore"}}
+    ).sort([("score", {"$meta": "textScore"})]).limit(limit).to_list(limit)
+    
+    chat_ids = list({m["chat_id"] for m in messages})
+    chats = await db.chats.find({"id": {"$in": chat_ids}}, {"_id": 0, "id": 1, "title": 1}).to_list(len(chat_ids)) if chat_ids else []
+    titles = {c["id"]: c["title"] for c in chats}
+    
+    result = []
+    for msg in messages:
+        snippet, highlights = highlight_snippet(msg["content"], q)
+        result.append(ChatSearchHit(
+            chat_id=msg["chat_id"],
+            chat_title=titles.get(msg["chat_id"]),
+            message_id=msg["id"],
+            sender_type=msg["sender_type"],
+            created_at=msg["created_at"],
+            snippet=snippet,
+            highlights=highlights,
+            score=msg.get("score", 0.0)
+        ))
+    return result
+
 @api_router.get("/chats/{chat_id}/messages", response_model=List[MessageResponse])
 async def get_chat_messages(chat_id: str, user: dict = Depends(get_current_user)):
     chat = await db.chats.find_one({"id": chat_id, "user_id": user["id"]}, {"_id": 0})
@@ -962,89 +1830,86 @@ async def get_chat_messages(chat_id: str, user: dict = Depends(get_current_user)
         raise HTTPException(status_code=404, detail="Konverzácia nebola nájdená")
     
     messages = await db.messages.find({"chat_id": chat_id}, {"_id": 0}).sort("created_at", 1).to_list(1000)
-    
-    result = []
-    for msg in messages:
-        attachments = await db.attachments.find({"message_id": msg["id"]}, {"_id": 0}).to_list(10)
-        result.append(MessageResponse(**msg, attachments=attachments))
-    
-    return result
+    if chat.get("archived"):
+        # Compacted by retention; normally empty in messages, but merge in case a write raced the archiving
+        messages = merge_messages(await load_archived_messages(db, chat_id), messages)
+    attachments = await attachments_by_message([msg["id"] for msg in messages])
+    
+    return [MessageResponse(**msg, attachments=attachments.get(msg["id"], [])) for msg in messages]
+
+async def attachments_by_message(message_ids: List[str]) -> dict:
+    """message id -> attachments, one query per attachment collection"""
+    if not message_ids:
+        return {}
+    found = await asyncio.gather(*(
+        db[name].find({"message_id": {"$in": message_ids}}, {"_id": 0}).to_list(None)
+        for name in ATTACHMENT_COLLECTIONS
+    ))
+    grouped = {}
+    for docs in found:
+        for doc in docs:
+            grouped.setdefault(doc["message_id"], []).append(doc)
+    return grouped
+
+async def link_attachments(attachment_ids: List[str], message_id: str, user_id: str):
+    """Attach the user's own uploads to a message; attachments claimed by the GC sweeper are skipped"""
+    query = {
+        "id": {"$in": attachment_ids},
+        "uploaded_by_user_id": user_id,
+        "message_id": None,
+        "gc_claim": {"$exists": False}
+    }
+    await asyncio.gather(*(
+        db[name].update_many(query, {"$set": {"message_id": message_id}}) for name in ATTACHMENT_COLLECTIONS
+    ))
 
 @api_router.post("/chats/{chat_id}/messages")
 async def send_message(chat_id: str, message: MessageCreate, user: dict = Depends(get_current_user)):
-    chat = await db.chats.find_one({"id": chat_id, "user_id": user["id"]}, {"_id": 0})
+    # Independent reads run concurrently
+    chat, sources_context = await asyncio.gather(
+        db.chats.find_one({"id": chat_id, "user_id": user["id"]}, {"_id": 0}),
+        chat_sources_context(user)
+    )
     if not chat:
         raise HTTPException(status_code=404, detail="Konverzácia nebola nájdená")
+    if chat.get("archived"):
+        await restore_chat(db, chat_id)
     
-    now = datetime.now(timezone.utc).isoformat()
+    now = utcnow()
     user_msg_id = str(uuid.uuid4())
     
-    # Save user message
     user_msg_doc = {
         "id": user_msg_id,
         "chat_id": chat_id,
         "sender_type": "user",
         "sender_user_id": user["id"],
+        "user_id": user["id"],
         "content": message.content,
         "created_at": now
     }
-    await db.messages.insert_one(user_msg_doc)
-    
-    # Get conversation history
-    history = await db.messages.find({"chat_id": chat_id}, {"_id": 0}).sort("created_at", 1).to_list(50)
-    
-    # Get active AI sources for context
-    sources_query = {"is_active": True}
-    if user["role"] == UserRole.STUDENT:
-        if user.get("grade_id"):
-            sources_query["$or"] = [
-                {"grade_id": user["grade_id"]},
-                {"grade_id": None}
-            ]
-    
-    ai_sources = await db.ai_sources.find(sources_query, {"_id": 0}).to_list(100)
     
     # Build system message with context
-    system_message = """Si PocketBuddy, priateľský AI asistent pre slovenské stredné školy. 😊
-Komunikuješ po slovensky, si trpezlivý a povzbudzujúci 💪
-Vysvetľuješ veci jednoducho a zrozumiteľne.
-Pri matematike vysvetľuješ krok po kroku.
-Používaš emotikony 🎓📚✨"""
+    system_message = CHAT_SYSTEM_PROMPT + sources_context
     
-    if ai_sources:
-        system_message += "\nMáš prístup k nasledujúcim študijným materiálom:\n"
-        for source in ai_sources[:10]:
-            system_message += f"- {source['file_name']}"
-            if source.get('description'):
-                system_message += f": {source['description']}"
-            system_message += "\n"
-    
-    # Call AI with retry and fallback logic
+    # The opening question of a chat can reuse the answer to a near-identical one
+    cache_scope = None
     ai_response = None
-    # Using cheapest models first to conserve budget
-    models_to_try = [
-        ("openai", "gpt-4o-mini"),
-        ("openai", "gpt-4o"),
-        ("gemini", "gemini-2.5-flash"),
-    ]
-    
-    for provider, model in models_to_try:
-        try:
-            llm_chat = LlmChat(
-                api_key=EMERGENT_LLM_KEY,
-                session_id=f"{chat_id}-{now}",
-                system_message=system_message
-            ).with_model(provider, model)
-            
-            ai_response = await llm_chat.send_message(UserMessage(text=message.content))
-            
-            if ai_response and len(ai_response) > 10:
-                logger.info(f"AI response from {provider}/{model}")
-                break
-                
-        except Exception as e:
-            logger.warning(f"AI {provider}/{model} failed: {str(e)}")
-            continue
+    if not chat.get("message_count") and not message.attachment_ids:
+        cache_scope = answer_cache_scope(user, system_message)
+        ai_response = answer_cache.get(cache_scope, message.content)
+    
+    if ai_response is None:
+        # Call AI with retry and fallback logic
+        ai_response = await generate_ai_response(
+            system_message,
+            message.content,
+            session_id=f"{chat_id}-{now}",
+            min_length=10,
+            endpoint="chat",
+            user=user
+        )
+        if cache_scope and ai_response and len(ai_response) >= 10:
+            answer_cache.put(cache_scope, message.content, ai_response)
     
     # If all AI models failed, provide helpful fallback response
     if not ai_response or len(ai_response) < 10:
@@ -1060,25 +1925,33 @@ Kým sa to vyrieši, môžeš:
 
 Ospravedlňujem sa za komplikácie! 🙏"""
     
-    # Save AI response
+    # Save both messages and bump the chat in one round trip
     ai_msg_id = str(uuid.uuid4())
-    ai_now = datetime.now(timezone.utc).isoformat()
+    ai_now = utcnow()
     
     ai_msg_doc = {
         "id": ai_msg_id,
         "chat_id": chat_id,
         "sender_type": "ai",
         "sender_user_id": None,
+        "user_id": user["id"],
         "content": ai_response,
         "created_at": ai_now
     }
-    await db.messages.insert_one(ai_msg_doc)
+    writes = [
+        db.messages.insert_many([user_msg_doc, ai_msg_doc]),
+        db.chats.update_one({"id": chat_id}, {"$set": {"updated_at": ai_now}, "$inc": {"message_count": 2}})
+    ]
+    if message.attachment_ids:
+        writes.append(link_attachments(message.attachment_ids, user_msg_id, user["id"]))
+    await asyncio.gather(*writes)
     
-    # Update chat timestamp
-    await db.chats.update_one({"id": chat_id}, {"$set": {"updated_at": ai_now}})
+    user_attachments = []
+    if message.attachment_ids:
+        user_attachments = (await attachments_by_message([user_msg_id])).get(user_msg_id, [])
     
     return {
-        "user_message": MessageResponse(**user_msg_doc, attachments=[]),
+        "user_message": MessageResponse(**user_msg_doc, attachments=user_attachments),
         "ai_message": MessageResponse(**ai_msg_doc, attachments=[])
     }
 
@@ -1090,16 +1963,14 @@ async def upload_chat_attachment(
     user: dict = Depends(get_current_user)
 ):
     attachment_id = str(uuid.uuid4())
-    now = datetime.now(timezone.utc).isoformat()
+    now = utcnow()
     
     # Save file
     file_ext = Path(file.filename).suffix if file.filename else ''
-    file_path = UPLOAD_DIR / f"chat_{attachment_id}{file_ext}"
+    storage_key = f"chat_{attachment_id}{file_ext}"
     
     try:
-        async with aiofiles.open(file_path, 'wb') as f:
-            content = await file.read()
-            await f.write(content)
+        file_size = await save_upload(file, storage_key)
     except Exception as e:
         logger.error(f"Chat attachment upload error: {str(e)}")
         raise HTTPException(status_code=500, detail="Chyba pri nahrávaní súboru")
@@ -1109,7 +1980,8 @@ async def upload_chat_attachment(
         "message_id": None,
         "uploaded_by_user_id": user["id"],
         "file_name": file.filename,
-        "file_path": str(file_path),
+        "storage_key": storage_key,
+        "file_size": file_size,
         "file_type": file.content_type or "application/octet-stream",
         "created_at": now
     }
@@ -1124,22 +1996,21 @@ async def upload_attachment(
     user: dict = Depends(get_current_user)
 ):
     attachment_id = str(uuid.uuid4())
-    now = datetime.now(timezone.utc).isoformat()
+    now = utcnow()
     
     # Save file
     file_ext = Path(file.filename).suffix
-    file_path = UPLOAD_DIR / f"attachment_{attachment_id}{file_ext}"
+    storage_key = f"attachment_{attachment_id}{file_ext}"
     
-    async with aiofiles.open(file_path, 'wb') as f:
-        content = await file.read()
-        await f.write(content)
+    file_size = await save_upload(file, storage_key)
     
     attachment_doc = {
         "id": attachment_id,
         "message_id": None,
         "uploaded_by_user_id": user["id"],
         "file_name": file.filename,
-        "file_path": str(file_path),
+        "storage_key": storage_key,
+        "file_size": file_size,
         "file_type": file.content_type,
         "created_at": now
     }
@@ -1154,7 +2025,7 @@ async def download_attachment(attachment_id: str, user: dict = Depends(get_curre
     if not attachment:
         raise HTTPException(status_code=404, detail="Príloha nebola nájdená")
     
-    return FileResponse(attachment["file_path"], filename=attachment["file_name"])
+    return await stored_file_response(attachment, attachment.get("file_type"))
 
 # ==================== STATISTICS ====================
 
@@ -1176,6 +2047,449 @@ async def get_statistics(admin: dict = Depends(require_admin)):
         "total_chats": total_chats
     }
 
+@api_router.get("/admin/llm/stats")
+async def get_llm_stats(admin: dict = Depends(require_admin)):
+    return {
+        "backend": llm_backend.name,
+        "coalescing": {"enabled": LLM_COALESCE, **llm_singleflight.stats()},
+        "admission": llm_admission.stats(),
+        "prompt_context_cache": prompt_context_cache.stats(),
+        "answer_cache": answer_cache.stats(),
+        "topic_catalog": topic_catalog.stats()
+    }
+
+@api_router.get("/admin/llm/usage")
+async def get_llm_usage(
+    user_id: Optional[str] = None,
+    endpoint: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(500, ge=1, le=5000),
+    admin: dict = Depends(require_admin)
+):
+    """Daily LLM usage rollups, newest day first; days are YYYY-MM-DD (UTC). Totals cover every matching rollup."""
+    # Make the numbers include everything recorded so far
+    await usage_recorder.flush(db.llm_usage_daily)
+    
+    query = {}
+    if user_id:
+        query["user_id"] = user_id
+    if endpoint:
+        query["endpoint"] = endpoint
+    if date_from or date_to:
+        query["day"] = {}
+        if date_from:
+            query["day"]["$gte"] = date_from
+        if date_to:
+            query["day"]["$lte"] = date_to
+    
+    total_fields = ("calls", "failures", "est_prompt_tokens", "est_response_tokens")
+    # Stable order, so offset pages neither skip nor repeat rollups
+    sort = [("day", -1), ("user_id", 1), ("endpoint", 1), ("provider", 1), ("model", 1)]
+    rows, grouped = await asyncio.gather(
+        db.llm_usage_daily.find(query, {"_id": 0}).sort(sort).skip(offset).limit(limit + 1).to_list(limit + 1),
+        db.llm_usage_daily.aggregate([
+            {"$match": query},
+            {"$group": {"_id": None, "rollups": {"$sum": 1}, **{key: {"$sum": f"${key}"} for key in total_fields}}}
+        ]).to_list(1)
+    )
+    truncated = len(rows) > limit
+    rows = rows[:limit]
+    for row in rows:
+        row["avg_latency_ms"] = round(row["latency_ms_total"] / row["calls"], 1) if row.get("calls") else 0.0
+        row["avg_fallback_depth"] = round(row["fallback_depth_total"] / row["calls"], 2) if row.get("calls") else 0.0
+    
+    group = grouped[0] if grouped else {}
+    totals = {key: int(group.get(key, 0)) for key in total_fields}
+    return {
+        "rows": rows,
+        "totals": totals,
+        "total_rows": group.get("rollups", 0),
+        "offset": offset,
+        "truncated": truncated
+    }
+
+@api_router.get("/admin/storage/gc")
+async def get_storage_gc(admin: dict = Depends(require_admin)):
+    """Settings and the last report of this worker's attachment sweeper"""
+    return {
+        "storage_backend": storage.name,
+        "interval_seconds": ATTACHMENT_GC_INTERVAL_SECONDS,
+        "grace_hours": attachment_sweeper.grace_seconds / 3600,
+        "last_report": attachment_sweeper.last_report
+    }
+
+@api_router.post("/admin/storage/gc")
+async def run_storage_gc(dry_run: bool = True, admin: dict = Depends(require_admin)):
+    """Run a sweep now; by default only reports what would be reclaimed"""
+    return await attachment_sweeper.sweep(dry_run=dry_run)
+
+@api_router.get("/admin/retention")
+async def get_chat_retention(admin: dict = Depends(require_admin)):
+    """Retention settings and the last report of this worker"""
+    archives = await db.chat_archives.count_documents({})
+    return {
+        "purge_deleted_after_days": chat_retention.deleted_days,
+        "archive_inactive_after_days": chat_retention.inactive_days,
+        "interval_seconds": CHAT_RETENTION_INTERVAL_SECONDS,
+        "archived_chats": archives,
+        "last_report": chat_retention.last_report
+    }
+
+@api_router.post("/admin/retention")
+async def run_chat_retention(dry_run: bool = True, admin: dict = Depends(require_admin)):
+    """Apply the retention policy now; by default only reports what would change"""
+    return await chat_retention.sweep(dry_run=dry_run)
+
+# ==================== DATA EXPORT ====================
+
+EXPORT_BATCH_SIZE = 500
+EXPORT_CHAT_BATCH = 100
+EXPORT_USER_BATCH = 1000
+
+EXPORT_USER_COLUMNS = [
+    "id", "email", "first_name", "last_name", "role", "grade_id", "grade_name",
+    "class_id", "class_name", "is_approved", "is_active", "created_at"
+]
+EXPORT_REGISTRATION_COLUMNS = [
+    "id", "user_id", "email", "first_name", "last_name", "role_requested", "grade_id", "grade_name",
+    "status", "processed_by_admin_id", "created_at", "updated_at"
+]
+EXPORT_MESSAGE_COLUMNS = [
+    "chat_id", "chat_title", "user_id", "user_email", "message_id", "sender_type", "content", "created_at"
+]
+
+def created_at_range(date_from: Optional[str], date_to: Optional[str]) -> Optional[dict]:
+    """Inclusive YYYY-MM-DD bounds (UTC days) as a filter on created_at dates"""
+    try:
+        start = date.fromisoformat(date_from) if date_from else None
+        end = date.fromisoformat(date_to) if date_to else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Neplatný dátum, použite formát RRRR-MM-DD")
+    bounds = {}
+    if start:
+        bounds["$gte"] = datetime.combine(start, datetime.min.time(), timezone.utc)
+    if end:
+        bounds["$lt"] = datetime.combine(end + timedelta(days=1), datetime.min.time(), timezone.utc)
+    return bounds or None
+
+def in_range(value, bounds: Optional[dict]) -> bool:
+    """Apply a created_at_range() filter in Python (archived messages may still hold ISO strings)"""
+    if not bounds:
+        return True
+    value = parse_timestamp(value)
+    if value is None:
+        return False
+    return value >= bounds.get("$gte", value) and ("$lt" not in bounds or value < bounds["$lt"])
+
+def export_user_query(role: Optional[str], grade_id: Optional[str]) -> dict:
+    query = {}
+    if role:
+        query["role"] = role
+    if grade_id:
+        query["grade_id"] = grade_id
+    return query
+
+async def name_lookup(collection) -> dict:
+    return {doc["id"]: doc["name"] for doc in await collection.find({}, {"_id": 0, "id": 1, "name": 1}).to_list(None)}
+
+def export_response(rows, fmt: str, columns: List[str], gzip: bool, name: str) -> StreamingResponse:
+    media_type, extension = export.FORMATS[fmt]
+    filename = f"pocketbuddy-{name}-{date.today().isoformat()}.{extension}"
+    if gzip:
+        media_type = "application/gzip"
+        filename += ".gz"
+    return StreamingResponse(
+        export.encode(rows, fmt, columns, gzip),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+async def export_user_rows(query: dict):
+    grades, classes = await asyncio.gather(name_lookup(db.grades), name_lookup(db.classes))
+    cursor = db.users.find(query, {"_id": 0, "password_hash": 0}).sort("created_at", 1).batch_size(EXPORT_BATCH_SIZE)
+    async for user in cursor:
+        user["grade_name"] = grades.get(user.get("grade_id"))
+        user["class_name"] = classes.get(user.get("class_id"))
+        yield user
+
+async def export_registration_rows(query: dict):
+    grades = await name_lookup(db.grades)
+    cursor = db.registration_requests.find(query, {"_id": 0}).sort("created_at", 1).batch_size(EXPORT_BATCH_SIZE)
+    async for registration in cursor:
+        registration["grade_name"] = grades.get(registration.get("grade_id"))
+        yield registration
+
+async def export_chat_batch_rows(chats: List[dict], created_at: Optional[dict]):
+    chat_ids = [chat["id"] for chat in chats]
+    owners = await db.users.find(
+        {"id": {"$in": list({chat["user_id"] for chat in chats})}}, {"_id": 0, "id": 1, "email": 1}
+    ).to_list(None)
+    emails = {owner["id"]: owner["email"] for owner in owners}
+    chats_by_id = {chat["id"]: chat for chat in chats}
+
+    def row(msg):
+        chat = chats_by_id[msg["chat_id"]]
+        return {
+            "chat_id": chat["id"],
+            "chat_title": chat.get("title"),
+            "user_id": chat["user_id"],
+            "user_email": emails.get(chat["user_id"]),
+            "message_id": msg["id"],
+            "sender_type": msg["sender_type"],
+            "content": msg["content"],
+            "created_at": msg["created_at"]
+        }
+
+    query = {"chat_id": {"$in": chat_ids}}
+    if created_at:
+        query["created_at"] = created_at
+    cursor = db.messages.find(query, {"_id": 0}).sort([("chat_id", 1), ("created_at", 1)]).batch_size(EXPORT_BATCH_SIZE)
+    async for msg in cursor:
+        yield row(msg)
+    for chat in chats:
+        if chat.get("archived"):
+            for msg in await load_archived_messages(db, chat["id"]):
+                if in_range(msg["created_at"], created_at):
+                    yield row(msg)
+
+async def export_message_rows(user_query: dict, created_at: Optional[dict], include_deleted: bool):
+    chat_query = {} if include_deleted else {"is_deleted": False}
+    if not user_query:
+        async for row in export_chats_rows(chat_query, created_at):
+            yield row
+        return
+    # Matching users are read a page at a time and their chats exported per page, so a broad
+    # filter never holds every user id in memory or in one query document
+    last_id = ""
+    while True:
+        users = await db.users.find(
+            {**user_query, "id": {"$gt": last_id}}, {"_id": 0, "id": 1}
+        ).sort("id", 1).limit(EXPORT_USER_BATCH).to_list(EXPORT_USER_BATCH)
+        if not users:
+            break
+        last_id = users[-1]["id"]
+        async for row in export_chats_rows({**chat_query, "user_id": {"$in": [u["id"] for u in users]}}, created_at):
+            yield row
+
+async def export_chats_rows(chat_query: dict, created_at: Optional[dict]):
+    cursor = db.chats.find(
+        chat_query, {"_id": 0, "id": 1, "user_id": 1, "title": 1, "archived": 1}
+    ).sort("id", 1).batch_size(EXPORT_CHAT_BATCH)
+    batch = []
+    async for chat in cursor:
+        batch.append(chat)
+        if len(batch) >= EXPORT_CHAT_BATCH:
+            async for row in export_chat_batch_rows(batch, created_at):
+                yield row
+            batch = []
+    if batch:
+        async for row in export_chat_batch_rows(batch, created_at):
+            yield row
+
+EXPORT_FORMAT = Query("ndjson", alias="format", pattern="^(ndjson|csv)$")
+
+@api_router.get("/admin/export/users")
+async def export_users(
+    fmt: str = EXPORT_FORMAT,
+    role: Optional[str] = None,
+    grade_id: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    gzip: bool = False,
+    admin: dict = Depends(require_admin)
+):
+    """Stream users (without password hashes); dates filter created_at, YYYY-MM-DD inclusive"""
+    query = export_user_query(role, grade_id)
+    created_at = created_at_range(date_from, date_to)
+    if created_at:
+        query["created_at"] = created_at
+    return export_response(export_user_rows(query), fmt, EXPORT_USER_COLUMNS, gzip, "users")
+
+@api_router.get("/admin/export/registrations")
+async def export_registrations(
+    fmt: str = EXPORT_FORMAT,
+    role: Optional[str] = None,
+    grade_id: Optional[str] = None,
+    status: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    gzip: bool = False,
+    admin: dict = Depends(require_admin)
+):
+    """Stream registration requests"""
+    query = {}
+    if role:
+        query["role_requested"] = role
+    if grade_id:
+        query["grade_id"] = grade_id
+    if status:
+        query["status"] = status
+    created_at = created_at_range(date_from, date_to)
+    if created_at:
+        query["created_at"] = created_at
+    return export_response(export_registration_rows(query), fmt, EXPORT_REGISTRATION_COLUMNS, gzip, "registrations")
+
+@api_router.get("/admin/export/chats")
+async def export_chats(
+    fmt: str = EXPORT_FORMAT,
+    role: Optional[str] = None,
+    grade_id: Optional[str] = None,
+    user_id: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    include_deleted: bool = False,
+    gzip: bool = False,
+    admin: dict = Depends(require_admin)
+):
+    """Stream chat messages, one row per message; role/grade/user filter the chat owners, dates the messages"""
+    user_query = export_user_query(role, grade_id)
+    if user_id:
+        user_query["id"] = user_id
+    rows = export_message_rows(user_query, created_at_range(date_from, date_to), include_deleted)
+    return export_response(rows, fmt, EXPORT_MESSAGE_COLUMNS, gzip, "chats")
+
+# ==================== AUDIT LOG ====================
+
+@api_router.get("/admin/audit")
+async def get_audit_log(
+    actor_id: Optional[str] = None,
+    target_id: Optional[str] = None,
+    target_type: Optional[str] = None,
+    action: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    before: Optional[str] = Query(None, description="created_at of the last event on the previous page"),
+    limit: int = Query(50, ge=1, le=500),
+    admin: dict = Depends(require_admin)
+):
+    """Audit events, newest first; dates filter created_at, YYYY-MM-DD inclusive"""
+    query = {}
+    for field, value in (("actor_id", actor_id), ("target_id", target_id),
+                         ("target_type", target_type), ("action", action)):
+        if value:
+            query[field] = value
+    created_at = created_at_range(date_from, date_to) or {}
+    if before:
+        # An unencoded "+00:00" offset arrives as " 00:00"
+        before_at = parse_timestamp(before.replace(" ", "+"))
+        if before_at is None:
+            raise HTTPException(status_code=400, detail="Neplatný parameter before")
+        created_at["$lt"] = min(before_at, created_at.get("$lt", before_at))
+    if created_at:
+        query["created_at"] = created_at
+    
+    events = await db.audit_log.find(query, {"_id": 0}).sort("created_at", -1).limit(limit).to_list(limit)
+    return {
+        "events": events,
+        "next_before": events[-1]["created_at"] if len(events) == limit else None
+    }
+
+@api_router.get("/admin/audit/stats")
+async def get_audit_stats(admin: dict = Depends(require_admin)):
+    return audit_log.stats()
+
+# ==================== ADMIN EVENTS ====================
+
+ADMIN_EVENTS_RETRY_MS = int(os.environ.get('ADMIN_EVENTS_RETRY_MS', '3000'))
+# EventSource cannot send headers, so the stream URL carries a ticket instead of the login JWT:
+# it only opens the stream and expires quickly, which keeps what access logs record useless
+ADMIN_EVENTS_TICKET_SECONDS = int(os.environ.get('ADMIN_EVENTS_TICKET_SECONDS', '60'))
+ADMIN_EVENTS_AUDIENCE = "admin_events"
+
+def sse_message(event: Optional[dict]) -> bytes:
+    if event is None:
+        return b": keepalive\n\n"
+    lines = [f"id: {event['id']}"] if event.get("id") else []
+    lines.append(f"event: {event['type']}")
+    lines.append("data: " + json.dumps(event.get("data", {}), ensure_ascii=False))
+    return ("\n".join(lines) + "\n\n").encode("utf-8")
+
+@api_router.post("/admin/events/ticket")
+async def create_admin_events_ticket(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    admin: dict = Depends(require_admin)
+):
+    ticket = jwt.encode({
+        "user_id": admin["id"],
+        "aud": ADMIN_EVENTS_AUDIENCE,
+        "exp": datetime.now(timezone.utc) + timedelta(seconds=ADMIN_EVENTS_TICKET_SECONDS),
+        # The stream ends when the login it was issued for expires
+        "session_exp": decode_token(credentials.credentials)["exp"]
+    }, JWT_SECRET, algorithm=JWT_ALGORITHM)
+    return {"ticket": ticket, "expires_in": ADMIN_EVENTS_TICKET_SECONDS}
+
+@api_router.get("/admin/events")
+async def stream_admin_events(request: Request, ticket: str = Query(...), last_event_id: Optional[str] = None):
+    claims = decode_token(ticket, audience=ADMIN_EVENTS_AUDIENCE)
+    admin = await user_from_claims(claims)
+    if admin["role"] != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Prístup povolený len pre administrátorov")
+    expires_at = claims["session_exp"]
+    # The header on automatic reconnects, the parameter when the client opens a new stream
+    last_event_id = request.headers.get("last-event-id") or last_event_id
+
+    async def messages():
+        yield f"retry: {ADMIN_EVENTS_RETRY_MS}\n\n".encode("utf-8")
+        async for event in admin_events.events(last_event_id):
+            # The browser reconnects with the same ticket; once it has expired that gets a 401
+            # and the client asks for a new one
+            if time.time() >= expires_at:
+                return
+            yield sse_message(event)
+
+    return StreamingResponse(messages(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@api_router.get("/admin/events/stats")
+async def get_admin_events_stats(admin: dict = Depends(require_admin)):
+    return admin_events.stats()
+
+# ==================== PROFILING ====================
+
+@api_router.get("/admin/profiles")
+async def list_request_profiles(admin: dict = Depends(require_admin)):
+    return {
+        "enabled": PROFILE_REQUESTS_ENABLED,
+        "available": request_profiler.available,
+        "interval_ms": request_profiler.interval_seconds * 1000,
+        "active": request_profiler.active,
+        "pid": os.getpid(),
+        "profiles": await asyncio.to_thread(profile_store.list)
+    }
+
+@api_router.get("/admin/profiles/{name}")
+async def download_request_profile(name: str, admin: dict = Depends(require_admin)):
+    path = profile_store.path(name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profil nebol nájdený")
+    return FileResponse(path, media_type="text/plain", filename=name)
+
+@api_router.post("/admin/profiling/tracemalloc/start")
+async def start_tracemalloc(frames: int = Query(10, ge=1, le=50), admin: dict = Depends(require_admin)):
+    # Tracing slows every allocation down; it is per worker and stays on until stopped
+    tracing = await asyncio.to_thread(profiling.start_tracing, frames)
+    logger.warning(f"tracemalloc started by {admin['email']} in worker {os.getpid()} ({frames} frames)")
+    return {**tracing, "pid": os.getpid()}
+
+@api_router.get("/admin/profiling/tracemalloc")
+async def get_tracemalloc_snapshot(
+    group_by: str = Query("lineno", pattern="^(lineno|filename|traceback)$"),
+    limit: int = Query(25, ge=1, le=200),
+    admin: dict = Depends(require_admin)
+):
+    if not profiling.tracing_status()["tracing"]:
+        raise HTTPException(status_code=409, detail="Sledovanie pamäte nie je spustené")
+    report = await asyncio.to_thread(profiling.snapshot, group_by, limit)
+    return {**report, "pid": os.getpid()}
+
+@api_router.post("/admin/profiling/tracemalloc/stop")
+async def stop_tracemalloc(admin: dict = Depends(require_admin)):
+    tracing = await asyncio.to_thread(profiling.stop_tracing)
+    logger.info(f"tracemalloc stopped by {admin['email']} in worker {os.getpid()}")
+    return {**tracing, "pid": os.getpid()}
+
 # ==================== SEED DATA ====================
 
 @api_router.post("/seed")
@@ -1186,7 +2500,7 @@ async def seed_data():
     if admin:
         return {"message": "Dáta už existujú"}
     
-    now = datetime.now(timezone.utc).isoformat()
+    now = utcnow()
     admin_id = str(uuid.uuid4())
     
     # Create admin user
@@ -1243,6 +2557,7 @@ async def seed_data():
         {"id": str(uuid.uuid4()), "name": "Administratíva a korešpondencia", "description": "Písomná komunikácia, kancelárska práca", "created_at": now, "updated_at": now},
     ]
     await db.subjects.insert_many(subjects)
+    topic_catalog.invalidate()
     
     # Create sample classes
     classes = [
@@ -1259,6 +2574,33 @@ async def seed_data():
         "admin_password": "admin123"
     }
 
+# ==================== HEALTH ====================
+
+@api_router.get("/health/live")
+async def liveness():
+    """The worker process and its event loop are running"""
+    return {"status": "ok", "pid": os.getpid(), "uptime_seconds": round(time.time() - STARTED_AT, 1)}
+
+@api_router.get("/health/ready")
+async def readiness():
+    """The worker can reach MongoDB; reports this worker's connection pool"""
+    pool = {
+        "max_pool_size": MONGO_MAX_POOL_SIZE,
+        "open": pool_monitor.open,
+        "checked_out": pool_monitor.checked_out,
+        "checkout_failures": pool_monitor.checkout_failures
+    }
+    try:
+        start = time.perf_counter()
+        await asyncio.wait_for(db.command("ping"), timeout=2)
+        ping_ms = round((time.perf_counter() - start) * 1000, 1)
+    except Exception as e:
+        return JSONResponse(
+            status_code=503,
+            content={"status": "unavailable", "pid": os.getpid(), "error": str(e), "pool": pool}
+        )
+    return {"status": "ready", "pid": os.getpid(), "mongo_ping_ms": ping_ms, "pool": pool}
+
 # Root endpoint
 @api_router.get("/")
 async def root():
@@ -1267,6 +2609,94 @@ async def root():
 # Include the router in the main app
 app.include_router(api_router)
 
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected_handler(request, exc: AdmissionRejected):
+    logger.warning(f"LLM admission rejected ({exc.reason}) for {request.url.path}, retry after {exc.retry_after}s")
+    return JSONResponse(
+        status_code=429,
+        content={"detail": "Príliš veľa požiadaviek na AI asistenta. Skúste to znova o chvíľu. ⏳"},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
+async def profile_requested(request) -> bool:
+    if not PROFILE_REQUESTS_ENABLED:
+        return False
+    if request.headers.get("X-Profile") != "1" and request.query_params.get("_profile") != "1":
+        return False
+    auth = request.headers.get("Authorization", "")
+    if not auth.startswith("Bearer "):
+        return False
+    try:
+        user = await user_from_token(auth[len("Bearer "):])
+    except HTTPException:
+        # The endpoint itself reports the bad token; the flag is just ignored
+        return False
+    return user["role"] == UserRole.ADMIN
+
+async def finish_request_profile(profile: profiling.RequestProfile):
+    if not request_profiler.stop(profile):
+        return
+    try:
+        await asyncio.to_thread(profile_store.save, profile)
+    except OSError as e:
+        logger.error(f"Request profile {profile.name} not saved: {str(e)}")
+        return
+    logger.info(f"Request profile {profile.name}: {profile.sample_count} samples in {profile.duration_ms} ms")
+
+async def profiled_body(body: AsyncIterator[bytes], profile: profiling.RequestProfile) -> AsyncIterator[bytes]:
+    # Streaming responses do most of their work while the body is sent
+    try:
+        async for chunk in body:
+            yield chunk
+    finally:
+        await finish_request_profile(profile)
+
+@app.middleware("http")
+async def db_monitoring_middleware(request, call_next):
+    request_id = request.headers.get("X-Request-ID") or str(uuid.uuid4())
+    profile = None
+    if await profile_requested(request):
+        if request_profiler.available:
+            profile = profiling.RequestProfile(profiling.profile_name(request.method, request.url.path, request_id))
+        else:
+            logger.warning("Request profiling needs SIGPROF on the main thread; X-Profile ignored")
+    stats = RequestDbStats(request_id)
+    token = current_db_stats.set(stats)
+    profile_token = None
+    if profile is not None:
+        profile_token = profiling.current_profile.set(profile)
+        request_profiler.start(profile)
+        # A body that is never sent (client gone) must not leave the timer running
+        loop = asyncio.get_running_loop()
+        loop.call_later(PROFILE_MAX_SECONDS, lambda: asyncio.ensure_future(finish_request_profile(profile)))
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+    except BaseException:
+        if profile is not None:
+            await finish_request_profile(profile)
+        raise
+    finally:
+        current_db_stats.reset(token)
+        if profile_token is not None:
+            profiling.current_profile.reset(profile_token)
+    total_ms = (time.perf_counter() - start) * 1000
+    
+    response.headers["X-Request-ID"] = request_id
+    if profile is not None:
+        response.headers["X-Profile-File"] = profile.name
+        response.body_iterator = profiled_body(response.body_iterator, profile)
+    if SERVER_TIMING_ENABLED:
+        response.headers["Server-Timing"] = (
+            f'db;dur={stats.db_time_ms:.1f};desc="{stats.query_count} queries", app;dur={total_ms:.1f}'
+        )
+        response.headers["X-DB-Query-Count"] = str(stats.query_count)
+    logger.debug(
+        f"{request.method} {request.url.path} request_id={request_id} "
+        f"queries={stats.query_count} db={stats.db_time_ms:.1f}ms total={total_ms:.1f}ms"
+    )
+    return response
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -1275,6 +2705,189 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-@app.on_event("shutdown")
-async def shutdown_db_client():
+async def ensure_indexes():
+    await db.llm_usage_daily.create_index(
+        [("user_id", 1), ("day", 1), ("endpoint", 1), ("provider", 1), ("model", 1)], unique=True
+    )
+    await db.llm_usage_daily.create_index([("day", -1)])
+    # Chat search: equality prefix on the owner keeps text lookups within one user's messages.
+    # Text index v3 ignores diacritics; "none" disables English stemming for Slovak text.
+    await db.messages.create_index(
+        [("user_id", 1), ("content", "text")],
+        name="messages_user_content_text",
+        default_language="none"
+    )
+    await db.messages.create_index([("chat_id", 1), ("created_at", 1)])
+    # Attachment lookups by message, the GC orphan scan, and the GC reference check
+    for name in ATTACHMENT_COLLECTIONS:
+        await db[name].create_index([("message_id", 1), ("created_at", 1)])
+    for name in ("ai_sources",) + ATTACHMENT_COLLECTIONS:
+        await db[name].create_index("storage_key", sparse=True)
+    # Retention scans
+    await db.chats.create_index([("is_deleted", 1), ("updated_at", 1)])
+    await db.chat_archives.create_index("chat_id", unique=True)
+    # Source listing per teacher and the name fan-out on rename/delete
+    for field in ("uploaded_by_user_id", "subject_id", "grade_id"):
+        await db.ai_sources.create_index(field)
+    # Due queue: equality on the owner, range and sort on due_at
+    await db.flashcards.create_index([("user_id", 1), ("due_at", 1)])
+    await db.flashcards.create_index("deck_id")
+    await db.flashcard_decks.create_index([("user_id", 1), ("created_at", -1)])
+    # Audit queries: by actor, by target, or by time alone
+    await db.audit_log.create_index([("actor_id", 1), ("created_at", -1)])
+    await db.audit_log.create_index([("target_id", 1), ("created_at", -1)])
+    await ensure_ttl_index(db.audit_log, "created_at", int(AUDIT_RETENTION_DAYS * 86400))
+    # Last: it fails on a database that already holds duplicate emails, which must not cost
+    # the indexes above
+    try:
+        await db.users.create_index("email", unique=True)
+    except OperationFailure as e:
+        logger.error(f"Unique index on users.email not created, remove the duplicate emails first: {str(e)}")
+
+async def ensure_ttl_index(collection, field: str, seconds: int):
+    """Descending index on a date field that also expires documents after `seconds` (0 keeps them)"""
+    try:
+        await collection.create_index([(field, -1)], **({"expireAfterSeconds": seconds} if seconds > 0 else {}))
+    except OperationFailure as e:
+        if e.code != 85:
+            raise
+        if seconds <= 0:
+            logger.warning(f"{collection.name}.{field} still expires documents; drop the index to keep them")
+            return
+        # The index exists with another expiry (or none): change it in place instead of rebuilding
+        await db.command("collMod", collection.name,
+                         index={"keyPattern": {field: -1}, "expireAfterSeconds": seconds})
+
+async def ensure_indexes_in_background():
+    start = time.perf_counter()
+    try:
+        await ensure_indexes()
+    except Exception as e:
+        logger.error(f"Index creation failed: {str(e)}")
+        return
+    logger.info(f"Indexes ensured in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+MESSAGE_OWNER_BACKFILL_BATCH = 200
+
+async def backfill_message_owners():
+    """Copy the chat owner onto messages written before search existed; resumable and idempotent"""
+    try:
+        total = await _backfill_message_owners()
+    except Exception as e:
+        logger.error(f"Message owner backfill failed: {str(e)}")
+        return
+    if total:
+        logger.info(f"Backfilled owner on {total} messages")
+
+async def _backfill_message_owners() -> int:
+    total = 0
+    while True:
+        chats = await db.chats.find(
+            {"messages_owner_backfilled": {"$ne": True}}, {"_id": 0, "id": 1, "user_id": 1}
+        ).limit(MESSAGE_OWNER_BACKFILL_BATCH).to_list(MESSAGE_OWNER_BACKFILL_BATCH)
+        if not chats:
+            break
+        for chat in chats:
+            result = await db.messages.update_many(
+                {"chat_id": chat["id"], "user_id": {"$exists": False}},
+                {"$set": {"user_id": chat["user_id"]}}
+            )
+            total += result.modified_count
+        await db.chats.update_many(
+            {"id": {"$in": [c["id"] for c in chats]}},
+            {"$set": {"messages_owner_backfilled": True}}
+        )
+        await asyncio.sleep(0)
+    return total
+
+SOURCE_NAME_BACKFILL_BATCH = 200
+
+async def backfill_source_names():
+    """Store display names on sources uploaded before they were denormalized; resumable"""
+    try:
+        total = await _backfill_source_names()
+    except Exception as e:
+        logger.error(f"Source name backfill failed: {str(e)}")
+        return
+    if total:
+        logger.info(f"Backfilled display names on {total} AI sources")
+
+async def _backfill_source_names() -> int:
+    total = 0
+    while True:
+        sources = await db.ai_sources.find(
+            {"uploaded_by_name": {"$exists": False}},
+            {"_id": 0, "id": 1, "uploaded_by_user_id": 1, "subject_id": 1, "grade_id": 1}
+        ).limit(SOURCE_NAME_BACKFILL_BATCH).to_list(SOURCE_NAME_BACKFILL_BATCH)
+        if not sources:
+            break
+        
+        def ids(field):
+            return list({s[field] for s in sources if s.get(field)})
+        
+        users, subjects, grades = await asyncio.gather(
+            db.users.find({"id": {"$in": ids("uploaded_by_user_id")}},
+                          {"_id": 0, "id": 1, "first_name": 1, "last_name": 1}).to_list(None),
+            db.subjects.find({"id": {"$in": ids("subject_id")}}, {"_id": 0, "id": 1, "name": 1}).to_list(None),
+            db.grades.find({"id": {"$in": ids("grade_id")}}, {"_id": 0, "id": 1, "name": 1}).to_list(None),
+        )
+        user_names = {u["id"]: user_display_name(u) for u in users}
+        subject_names = {s["id"]: s["name"] for s in subjects}
+        grade_names = {g["id"]: g["name"] for g in grades}
+        
+        await db.ai_sources.bulk_write([
+            UpdateOne({"id": s["id"]}, {"$set": {
+                "uploaded_by_name": user_names.get(s["uploaded_by_user_id"]),
+                "subject_name": subject_names.get(s.get("subject_id")),
+                "grade_name": grade_names.get(s.get("grade_id")),
+            }})
+            for s in sources
+        ], ordered=False)
+        total += len(sources)
+        await asyncio.sleep(0)
+    return total
+
+background_tasks = []
+STARTED_AT = time.time()
+
+async def init_resources():
+    """
+    Per-worker startup: Mongo client, file storage, indexes and background tasks.
+    Importing this module does no I/O; everything that touches the network or disk happens here.
+    """
+    global client, db
+    await storage.init()
+    if client is None:
+        client = create_mongo_client()
+        db = client[DB_NAME]
+    logger.info(f"Worker {os.getpid()} connected to MongoDB (maxPoolSize={MONGO_MAX_POOL_SIZE})")
+    
+    # Index builds are idempotent round trips; run them off the startup path so the worker serves at once
+    background_tasks.append(asyncio.create_task(ensure_indexes_in_background()))
+    background_tasks.append(asyncio.create_task(
+        usage_recorder.run(lambda: db.llm_usage_daily, USAGE_FLUSH_SECONDS)
+    ))
+    background_tasks.append(asyncio.create_task(backfill_message_owners()))
+    background_tasks.append(asyncio.create_task(backfill_source_names()))
+    background_tasks.append(asyncio.create_task(audit_log.run()))
+    background_tasks.append(asyncio.create_task(admin_events.run()))
+    if ATTACHMENT_GC_INTERVAL_SECONDS > 0:
+        background_tasks.append(asyncio.create_task(attachment_sweeper.run(ATTACHMENT_GC_INTERVAL_SECONDS)))
+    if CHAT_RETENTION_INTERVAL_SECONDS > 0:
+        background_tasks.append(asyncio.create_task(chat_retention.run(CHAT_RETENTION_INTERVAL_SECONDS)))
+
+async def close_resources():
+    global client, db
+    for task in background_tasks:
+        task.cancel()
+    background_tasks.clear()
+    try:
+        await usage_recorder.flush(db.llm_usage_daily)
+    except Exception as e:
+        logger.error(f"Final usage flush failed: {str(e)}")
+    try:
+        await audit_log.flush()
+    except Exception as e:
+        logger.error(f"Final audit flush failed: {str(e)}")
     client.close()
+    client, db = None, None
@@ -0,0 +1,85 @@
+"""
+SM-2 scheduling for persisted flashcards.
+
+Each card carries its own review state (ease factor, interval, repetitions) and the time it is
+next due. A review grades recall from 0 (blackout) to 5 (perfect); grades below 3 start the
+card over, higher grades stretch the interval by the ease factor.
+"""
+
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+
+DEFAULT_EASE = 2.5
+MIN_EASE = 1.3
+PASSING_QUALITY = 3
+
+
+def initial_state(now: datetime) -> dict:
+    """Review fields for a new card; it is due immediately"""
+    return {
+        "ease_factor": DEFAULT_EASE,
+        "interval_days": 0,
+        "repetitions": 0,
+        "due_at": now,
+        "last_reviewed_at": None,
+    }
+
+
+def next_ease(ease: float, quality: int) -> float:
+    miss = 5 - quality
+    return max(MIN_EASE, round(ease + 0.1 - miss * (0.08 + miss * 0.02), 4))
+
+
+def schedule(card: dict, quality: int, reviewed_at: datetime) -> dict:
+    """Fields to $set on the card after a review with the given quality (0-5)"""
+    ease = card.get("ease_factor", DEFAULT_EASE)
+    repetitions = card.get("repetitions", 0)
+    interval = card.get("interval_days", 0)
+
+    if quality < PASSING_QUALITY:
+        repetitions, interval = 0, 1
+    else:
+        if repetitions == 0:
+            interval = 1
+        elif repetitions == 1:
+            interval = 6
+        else:
+            interval = max(1, round(interval * ease))
+        repetitions += 1
+
+    return {
+        "ease_factor": next_ease(ease, quality),
+        "interval_days": interval,
+        "repetitions": repetitions,
+        "due_at": reviewed_at + timedelta(days=interval),
+        "last_reviewed_at": reviewed_at,
+    }
+
+
+def valid_card(item) -> Optional[dict]:
+    """Question/answer pair from LLM output, or None when malformed"""
+    if not isinstance(item, dict):
+        return None
+    question, answer = item.get("otazka"), item.get("odpoved")
+    if isinstance(question, str) and isinstance(answer, str) and question.strip() and answer.strip():
+        return {"otazka": question.strip(), "odpoved": answer.strip()}
+    return None
+
+
+def valid_cards(items) -> List[dict]:
+    """Question/answer pairs from LLM output; anything malformed is dropped"""
+    cards = [valid_card(item) for item in (items if isinstance(items, list) else [])]
+    return [card for card in cards if card]
+
+
+def parse_time(value: Optional[str], default: datetime) -> datetime:
+    """Client-supplied review time, never later than the server clock"""
+    if not value:
+        return default
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return default
+    if parsed.tzinfo is None:
+        return default
+    return min(parsed.astimezone(timezone.utc), default)
@@ -0,0 +1,291 @@
+"""
+Blob storage for uploaded files.
+
+- local: files under UPLOAD_DIR, sharded into hash-prefix subdirectories (ab/cd/<key>)
+  so no directory grows past a few thousand entries
+- s3:    any S3-compatible object store (AWS S3, MinIO) via boto3
+
+Documents store the logical `storage_key`; the backend decides where the bytes live.
+Select with STORAGE_BACKEND=local|s3.
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import uuid
+from pathlib import Path
+from typing import AsyncIterator, List, NamedTuple, Optional
+from urllib.parse import quote
+
+from fastapi.responses import FileResponse, RedirectResponse, Response, StreamingResponse
+
+logger = logging.getLogger(__name__)
+
+
+def shard_path(key: str) -> str:
+    """Spread keys over 256 * 256 prefixes: 'chat_x.pdf' -> '3f/a2/chat_x.pdf'"""
+    digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+    return f"{digest[:2]}/{digest[2:4]}/{key}"
+
+
+def key_from_shard_path(path: str) -> Optional[str]:
+    """The key stored at `path`, or None when `path` is not where shard_path() puts that key"""
+    key = path.rsplit("/", 1)[-1]
+    return key if key and shard_path(key) == path else None
+
+
+def content_disposition(file_name: str) -> str:
+    return f"attachment; filename*=UTF-8''{quote(file_name)}"
+
+
+class BlobInfo(NamedTuple):
+    key: str
+    size: int
+    # Unix timestamp of the last write
+    modified: float
+
+
+class BlobStorage:
+    """Interface every storage backend implements"""
+
+    name = "base"
+
+    async def init(self):
+        pass
+
+    async def put(self, key: str, data: bytes, content_type: Optional[str] = None):
+        raise NotImplementedError
+
+    async def get(self, key: str) -> bytes:
+        raise NotImplementedError
+
+    async def delete(self, key: str):
+        """Remove a blob; missing blobs are not an error"""
+        raise NotImplementedError
+
+    async def exists(self, key: str) -> bool:
+        raise NotImplementedError
+
+    async def size(self, key: str) -> Optional[int]:
+        """Size in bytes, None for missing blobs"""
+        raise NotImplementedError
+
+    def list_blobs(self, batch_size: int = 500) -> AsyncIterator[List[BlobInfo]]:
+        """Every stored blob, in batches"""
+        raise NotImplementedError
+
+    async def download_response(self, key: str, file_name: str, content_type: Optional[str] = None) -> Response:
+        raise NotImplementedError
+
+
+class LocalStorage(BlobStorage):
+    name = "local"
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+
+    def path_for(self, key: str) -> Path:
+        return self.root / shard_path(key)
+
+    async def init(self):
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    async def put(self, key, data, content_type=None):
+        import aiofiles
+        path = self.path_for(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write then rename, so readers never see a half-written file
+        tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+        async with aiofiles.open(tmp_path, 'wb') as f:
+            await f.write(data)
+        os.replace(tmp_path, path)
+
+    async def get(self, key):
+        import aiofiles
+        async with aiofiles.open(self.path_for(key), 'rb') as f:
+            return await f.read()
+
+    async def delete(self, key):
+        try:
+            os.remove(self.path_for(key))
+        except FileNotFoundError:
+            pass
+
+    async def exists(self, key):
+        return self.path_for(key).is_file()
+
+    async def size(self, key):
+        try:
+            return self.path_for(key).stat().st_size
+        except FileNotFoundError:
+            return None
+
+    def _scan_shard(self, shard: Path) -> List[BlobInfo]:
+        blobs = []
+        for sub in os.scandir(shard):
+            if not sub.is_dir():
+                continue
+            for entry in os.scandir(sub.path):
+                # Skip in-progress writes (.name.tmp)
+                if entry.is_file() and not entry.name.startswith("."):
+                    # Files outside the layout were not stored by us; the sweeper leaves them alone
+                    if key_from_shard_path(f"{shard.name}/{sub.name}/{entry.name}") is None:
+                        continue
+                    stat = entry.stat()
+                    blobs.append(BlobInfo(entry.name, stat.st_size, stat.st_mtime))
+        return blobs
+
+    async def list_blobs(self, batch_size=500):
+        if not self.root.is_dir():
+            return
+        shards = [e.path for e in os.scandir(self.root) if e.is_dir() and len(e.name) == 2]
+        batch = []
+        for shard in sorted(shards):
+            batch.extend(await asyncio.to_thread(self._scan_shard, Path(shard)))
+            while len(batch) >= batch_size:
+                yield batch[:batch_size]
+                batch = batch[batch_size:]
+        if batch:
+            yield batch
+
+    async def download_response(self, key, file_name, content_type=None):
+        return FileResponse(self.path_for(key), filename=file_name, media_type=content_type)
+
+
+class S3Storage(BlobStorage):
+    """
+    S3-compatible object store. Objects use the same sharded key layout as the local backend,
+    which spreads request load over key prefixes, under an optional `prefix` (S3_PREFIX) so the
+    bucket can be shared. Only objects under the prefix and in the layout are listed.
+    Downloads redirect to a short-lived presigned URL unless S3_PRESIGNED_DOWNLOADS=false,
+    in which case the API streams the object itself.
+    """
+
+    name = "s3"
+
+    def __init__(self, bucket: str, endpoint_url: Optional[str] = None, region: Optional[str] = None,
+                 presigned_downloads: bool = True, presign_seconds: int = 300, prefix: str = ""):
+        self.bucket = bucket
+        self.prefix = prefix.strip("/") + "/" if prefix.strip("/") else ""
+        self.endpoint_url = endpoint_url
+        self.region = region
+        self.presigned_downloads = presigned_downloads
+        self.presign_seconds = presign_seconds
+        self._client = None
+
+    def object_key(self, key: str) -> str:
+        return self.prefix + shard_path(key)
+
+    @property
+    def client(self):
+        if self._client is None:
+            # Imported on first use: boto3 adds noticeable startup time
+            import boto3
+            self._client = boto3.client("s3", endpoint_url=self.endpoint_url, region_name=self.region)
+        return self._client
+
+    async def init(self):
+        try:
+            await asyncio.to_thread(self.client.head_bucket, Bucket=self.bucket)
+        except Exception as e:
+            logger.error(f"S3 bucket '{self.bucket}' is not reachable: {str(e)}")
+
+    async def put(self, key, data, content_type=None):
+        extra = {"ContentType": content_type} if content_type else {}
+        await asyncio.to_thread(
+            self.client.put_object, Bucket=self.bucket, Key=self.object_key(key), Body=data, **extra
+        )
+
+    async def get(self, key):
+        response = await asyncio.to_thread(self.client.get_object, Bucket=self.bucket, Key=self.object_key(key))
+        return await asyncio.to_thread(response["Body"].read)
+
+    async def delete(self, key):
+        # DeleteObject succeeds for missing keys
+        await asyncio.to_thread(self.client.delete_object, Bucket=self.bucket, Key=self.object_key(key))
+
+    async def _head(self, key):
+        from botocore.exceptions import ClientError
+        try:
+            return await asyncio.to_thread(self.client.head_object, Bucket=self.bucket, Key=self.object_key(key))
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+
+    async def exists(self, key):
+        return await self._head(key) is not None
+
+    async def size(self, key):
+        head = await self._head(key)
+        return head["ContentLength"] if head else None
+
+    async def list_blobs(self, batch_size=500):
+        pages = iter(self.client.get_paginator("list_objects_v2").paginate(
+            Bucket=self.bucket, Prefix=self.prefix, PaginationConfig={"PageSize": min(batch_size, 1000)}
+        ))
+        while True:
+            page = await asyncio.to_thread(next, pages, None)
+            if page is None:
+                break
+            blobs = []
+            for obj in page.get("Contents", []):
+                # Anything else in the bucket is not ours to garbage-collect
+                key = key_from_shard_path(obj["Key"][len(self.prefix):])
+                if key is not None:
+                    blobs.append(BlobInfo(key, obj["Size"], obj["LastModified"].timestamp()))
+            if blobs:
+                yield blobs
+
+    async def download_response(self, key, file_name, content_type=None):
+        if self.presigned_downloads:
+            params = {
+                "Bucket": self.bucket,
+                "Key": self.object_key(key),
+                "ResponseContentDisposition": content_disposition(file_name),
+            }
+            if content_type:
+                params["ResponseContentType"] = content_type
+            url = await asyncio.to_thread(
+                self.client.generate_presigned_url, "get_object", Params=params, ExpiresIn=self.presign_seconds
+            )
+            return RedirectResponse(url, status_code=307)
+
+        response = await asyncio.to_thread(self.client.get_object, Bucket=self.bucket, Key=self.object_key(key))
+        body = response["Body"]
+
+        async def chunks():
+            try:
+                while True:
+                    chunk = await asyncio.to_thread(body.read, 256 * 1024)
+                    if not chunk:
+                        break
+                    yield chunk
+            finally:
+                body.close()
+
+        return StreamingResponse(
+            chunks(),
+            media_type=content_type or response.get("ContentType") or "application/octet-stream",
+            headers={"Content-Disposition": content_disposition(file_name)}
+        )
+
+
+def create_storage(mode: str, upload_dir: Path) -> BlobStorage:
+    mode = (mode or "local").lower()
+    if mode == "local":
+        return LocalStorage(upload_dir)
+    if mode == "s3":
+        bucket = os.environ.get("S3_BUCKET")
+        if not bucket:
+            raise ValueError("STORAGE_BACKEND=s3 requires S3_BUCKET")
+        return S3Storage(
+            bucket,
+            endpoint_url=os.environ.get("S3_ENDPOINT_URL") or None,
+            region=os.environ.get("S3_REGION") or None,
+            presigned_downloads=os.environ.get("S3_PRESIGNED_DOWNLOADS", "true").lower() in ("1", "true", "yes"),
+            presign_seconds=int(os.environ.get("S3_PRESIGN_SECONDS", "300")),
+            prefix=os.environ.get("S3_PREFIX", ""),
+        )
+    raise ValueError(f"Unknown STORAGE_BACKEND '{mode}' (expected local or s3)")
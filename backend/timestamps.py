@@ -0,0 +1,52 @@
+"""
+Timestamps as native BSON dates.
+
+Documents used to store ISO strings ("2025-01-03T10:00:00.123456+00:00"). New writes store
+timezone-aware UTC datetimes, which are smaller, sort and range-scan as dates and can expire
+through TTL indexes; migrate_timestamps.py converts the old strings. Until it has run, a
+collection can hold both, so code that compares values in Python goes through parse().
+
+API responses keep the ISO string format: FastAPI encodes datetimes with isoformat(), and the
+response models declare IsoTimestamp, which accepts either representation.
+"""
+
+from datetime import datetime, timezone
+from typing import Annotated, Any, Optional
+
+from pydantic import BeforeValidator
+
+
+def utcnow() -> datetime:
+    """Current UTC time at millisecond precision, the resolution of a BSON date"""
+    now = datetime.now(timezone.utc)
+    return now.replace(microsecond=now.microsecond // 1000 * 1000)
+
+
+def parse(value: Any) -> Optional[datetime]:
+    """Aware UTC datetime from a stored datetime or ISO string; None when it is neither"""
+    if isinstance(value, datetime):
+        return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+    if isinstance(value, str) and value:
+        try:
+            parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+        return parse(parsed)
+    return None
+
+
+def iso(value: Any) -> Any:
+    """ISO string for a datetime (naive ones are UTC, as pymongo returns them); anything else unchanged"""
+    if isinstance(value, datetime):
+        return parse(value).isoformat()
+    return value
+
+
+def json_default(value: Any):
+    """json.dumps(default=...) for documents read from Mongo"""
+    if isinstance(value, datetime):
+        return iso(value)
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+IsoTimestamp = Annotated[str, BeforeValidator(iso)]
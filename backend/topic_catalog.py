@@ -0,0 +1,103 @@
+"""
+Materialized topic catalog for the flashcard and quiz pages.
+
+All active sources are read in one pass when the catalog is first needed after a change;
+each scope (a grade, or "*" for everything) is then rendered once to JSON bytes with an ETag
+derived from its content. Requests are served from memory, and a client sending the ETag
+back in If-None-Match gets a 304 without a body.
+
+Writes to ai_sources or subjects call invalidate(). Other workers do not see that call,
+so entries also expire after a TTL, like the prompt context cache.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from timestamps import json_default
+
+logger = logging.getLogger(__name__)
+
+GENERAL_SUBJECT_NAME = "Všeobecné"
+
+
+class TopicCatalog:
+    def __init__(self, get_db: Callable, ttl_seconds: float):
+        self.get_db = get_db
+        self.ttl_seconds = ttl_seconds
+        self.version = 0
+        self.builds = 0
+        self.not_modified = 0
+        self._lock = asyncio.Lock()
+        self._built_at: Optional[float] = None
+        self._built_version = -1
+        self._topics: List[Tuple[Optional[str], dict]] = []
+        self._subjects: List[dict] = []
+        self._rendered: Dict[str, Tuple[str, bytes]] = {}
+
+    def invalidate(self):
+        self.version += 1
+
+    def _fresh(self) -> bool:
+        return (self._built_version == self.version and self._built_at is not None
+                and time.monotonic() - self._built_at < self.ttl_seconds)
+
+    async def get(self, grade_id: Optional[str]) -> Tuple[str, bytes]:
+        """(ETag, JSON body) for students of a grade, or for everything when grade_id is None"""
+        if not self._fresh():
+            async with self._lock:
+                if not self._fresh():
+                    await self._build()
+        scope = grade_id or "*"
+        rendered = self._rendered.get(scope)
+        if rendered is None:
+            rendered = self._rendered[scope] = self._render(grade_id)
+        return rendered
+
+    async def _build(self):
+        start = time.perf_counter()
+        version = self.version
+        db = self.get_db()
+        subjects = await db.subjects.find({}, {"_id": 0}).to_list(None)
+        subject_names = {s["id"]: s["name"] for s in subjects}
+
+        topics = []
+        cursor = db.ai_sources.find(
+            {"is_active": True},
+            {"_id": 0, "id": 1, "file_name": 1, "description": 1, "subject_id": 1, "grade_id": 1}
+        ).sort("created_at", -1)
+        async for source in cursor:
+            topics.append((source.get("grade_id") or None, {
+                "id": source["id"],
+                "name": source["file_name"],
+                "description": source.get("description", ""),
+                "subject_id": source.get("subject_id"),
+                "subject_name": subject_names.get(source.get("subject_id"), GENERAL_SUBJECT_NAME)
+            }))
+
+        self._topics, self._subjects = topics, subjects
+        self._rendered = {}
+        # A write during the build leaves the catalog stale, so the next request rebuilds it
+        self._built_version = version
+        self._built_at = time.monotonic()
+        self.builds += 1
+        logger.info(f"Topic catalog built: {len(topics)} topics in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    def _render(self, grade_id: Optional[str]) -> Tuple[str, bytes]:
+        topics = [t for g, t in self._topics if grade_id is None or g in (None, grade_id)]
+        body = json.dumps({"topics": topics, "subjects": self._subjects}, ensure_ascii=False,
+                          default=json_default).encode("utf-8")
+        etag = '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+        return etag, body
+
+    def stats(self) -> dict:
+        return {
+            "version": self.version,
+            "builds": self.builds,
+            "topics": len(self._topics),
+            "scopes": len(self._rendered),
+            "not_modified": self.not_modified,
+        }
@@ -0,0 +1,115 @@
+"""
+Per-user LLM usage accounting.
+
+Usage events are aggregated in memory per (user, day, endpoint, provider, model)
+and flushed periodically as $inc upserts into daily rollup documents,
+so a busy lesson costs one bulk write per flush instead of one insert per call.
+"""
+
+import asyncio
+import logging
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from timestamps import utcnow
+
+logger = logging.getLogger(__name__)
+
+# Rough token estimate for mixed Slovak/English text
+CHARS_PER_TOKEN = 4
+
+COUNTERS = (
+    "calls", "failures", "prompt_chars", "response_chars",
+    "est_prompt_tokens", "est_response_tokens", "latency_ms_total", "fallback_depth_total",
+)
+
+
+def estimate_tokens(chars: int) -> int:
+    return (chars + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+class UsageRecorder:
+    def __init__(self):
+        self._pending: Dict[Tuple, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+        self._lock = asyncio.Lock()
+        self.events = 0
+        self.flushes = 0
+
+    def record(self, user_id: str, endpoint: str, provider: Optional[str], model: Optional[str],
+               prompt_chars: int, response_chars: int, latency_ms: float, fallback_depth: int, success: bool):
+        day = datetime.now(timezone.utc).date().isoformat()
+        counters = self._pending[(user_id, day, endpoint, provider or "fallback", model or "fallback")]
+        counters["calls"] += 1
+        counters["failures"] += 0 if success else 1
+        counters["prompt_chars"] += prompt_chars
+        counters["response_chars"] += response_chars
+        counters["est_prompt_tokens"] += estimate_tokens(prompt_chars)
+        counters["est_response_tokens"] += estimate_tokens(response_chars)
+        counters["latency_ms_total"] += latency_ms
+        counters["fallback_depth_total"] += fallback_depth
+        counters["latency_ms_max"] = max(counters["latency_ms_max"], latency_ms)
+        self.events += 1
+
+    @property
+    def pending_keys(self) -> int:
+        return len(self._pending)
+
+    async def flush(self, collection) -> int:
+        """Write pending aggregates as $inc upserts; returns the number of rollup documents touched"""
+        async with self._lock:
+            if not self._pending:
+                return 0
+            pending, self._pending = self._pending, defaultdict(lambda: defaultdict(float))
+            now = utcnow()
+            keys, ops = list(pending), []
+            for (user_id, day, endpoint, provider, model), counters in pending.items():
+                ops.append(UpdateOne(
+                    {"user_id": user_id, "day": day, "endpoint": endpoint, "provider": provider, "model": model},
+                    {
+                        "$inc": {k: round(counters[k], 1) if k.startswith("latency") else int(counters[k]) for k in COUNTERS},
+                        "$max": {"latency_ms_max": round(counters["latency_ms_max"], 1)},
+                        "$set": {"updated_at": now},
+                        "$setOnInsert": {"id": str(uuid.uuid4()), "created_at": now},
+                    },
+                    upsert=True
+                ))
+            try:
+                await collection.bulk_write(ops, ordered=False)
+            except BulkWriteError as e:
+                # Unordered: the other upserts were applied, and retrying them would count them twice.
+                # E11000 here is two workers inserting the same new rollup; the retry finds it.
+                failed = [keys[error["index"]] for error in e.details.get("writeErrors", [])]
+                logger.error(f"LLM usage flush failed for {len(failed)} of {len(ops)} rollups, keeping them for retry: "
+                             f"{str(e)}")
+                self._merge_back({key: pending[key] for key in failed})
+                self.flushes += 1
+                return len(ops) - len(failed)
+            except Exception as e:
+                logger.error(f"LLM usage flush failed, keeping {len(ops)} rollups for retry: {str(e)}")
+                self._merge_back(pending)
+                return 0
+            self.flushes += 1
+            return len(ops)
+
+    def _merge_back(self, pending):
+        for key, counters in pending.items():
+            target = self._pending[key]
+            for name, value in counters.items():
+                if name == "latency_ms_max":
+                    target[name] = max(target[name], value)
+                else:
+                    target[name] += value
+
+    async def run(self, get_collection, interval_seconds: float):
+        """Background flush loop"""
+        while True:
+            await asyncio.sleep(interval_seconds)
+            try:
+                await self.flush(get_collection())
+            except Exception as e:
+                logger.error(f"LLM usage flush loop error: {str(e)}")
@@ -0,0 +1,176 @@
+"""
+Bulk import of students and teachers from CSV.
+
+One pass over the file: headers are normalized (English or Slovak column names), grade and class
+names are resolved against in-memory maps, and every problem is reported per row instead of
+aborting the import. Password hashing runs in a thread pool (bcrypt releases the GIL).
+"""
+
+import asyncio
+import csv
+import io
+import secrets
+import string
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from pydantic import EmailStr, TypeAdapter, ValidationError
+
+MAX_ROWS = 20000
+
+# Column name (diacritics folded, lowercase) -> field
+HEADER_ALIASES = {
+    "email": "email", "e-mail": "email",
+    "first_name": "first_name", "meno": "first_name",
+    "last_name": "last_name", "priezvisko": "last_name",
+    "role": "role", "rola": "role",
+    "grade": "grade", "rocnik": "grade",
+    "class": "class", "trieda": "class",
+    "password": "password", "heslo": "password",
+}
+
+ROLE_ALIASES = {
+    "student": "student", "ziak": "student", "ziacka": "student",
+    "teacher": "teacher", "ucitel": "teacher", "ucitelka": "teacher",
+}
+
+email_adapter = TypeAdapter(EmailStr)
+
+
+def name_key(value: str) -> str:
+    """Case, diacritics and whitespace insensitive key: ' 1. Ročník ' -> '1. rocnik'"""
+    folded = unicodedata.normalize("NFKD", value or "")
+    folded = "".join(ch for ch in folded if not unicodedata.combining(ch))
+    return " ".join(folded.casefold().split())
+
+
+class ImportRow:
+    def __init__(self, row: int, email: str, first_name: str, last_name: str, role: str,
+                 grade_id: Optional[str], class_id: Optional[str], password: Optional[str]):
+        self.row = row
+        self.email = email
+        self.first_name = first_name
+        self.last_name = last_name
+        self.role = role
+        self.grade_id = grade_id
+        self.class_id = class_id
+        self.password = password
+
+
+def read_csv(content: bytes) -> Tuple[List[str], List[List[str]]]:
+    """Header and rows; accepts UTF-8 with or without BOM and ',' or ';' separators (Excel)"""
+    text = content.decode("utf-8-sig")
+    first_line = text.split("\n", 1)[0]
+    delimiter = ";" if first_line.count(";") > first_line.count(",") else ","
+    reader = csv.reader(io.StringIO(text), delimiter=delimiter)
+    header = next(reader, [])
+    return header, list(reader)
+
+
+def map_header(header: List[str]) -> Dict[str, int]:
+    columns = {}
+    for index, name in enumerate(header):
+        field = HEADER_ALIASES.get(name_key(name).replace(" ", "_"))
+        if field and field not in columns:
+            columns[field] = index
+    return columns
+
+
+def validate_rows(header: List[str], rows: List[List[str]], grades: List[dict], classes: List[dict]):
+    """Returns (valid ImportRows, errors); row numbers count the header as row 1"""
+    columns = map_header(header)
+    missing = [field for field in ("email", "first_name", "last_name") if field not in columns]
+    if missing:
+        return [], [{"row": 1, "email": None, "error": f"Chýbajú stĺpce: {', '.join(missing)}"}]
+
+    grades_by_name = {name_key(g["name"]): g["id"] for g in grades}
+    classes_by_grade = {(c["grade_id"], name_key(c["name"])): c for c in classes}
+    classes_by_name: Dict[str, List[dict]] = {}
+    for c in classes:
+        classes_by_name.setdefault(name_key(c["name"]), []).append(c)
+
+    def cell(values, field):
+        index = columns.get(field)
+        return values[index].strip() if index is not None and index < len(values) else ""
+
+    valid, errors, seen = [], [], set()
+    for number, values in enumerate(rows, start=2):
+        if not any(v.strip() for v in values):
+            continue
+        raw_email = cell(values, "email")
+
+        def fail(message):
+            errors.append({"row": number, "email": raw_email or None, "error": message})
+
+        try:
+            email = email_adapter.validate_python(raw_email)
+        except ValidationError:
+            fail("Neplatná emailová adresa")
+            continue
+        if email.lower() in seen:
+            fail("Email sa v súbore opakuje")
+            continue
+        seen.add(email.lower())
+
+        first_name, last_name = cell(values, "first_name"), cell(values, "last_name")
+        if not first_name or not last_name:
+            fail("Chýba meno alebo priezvisko")
+            continue
+
+        role = ROLE_ALIASES.get(name_key(cell(values, "role")) or "student")
+        if not role:
+            fail(f"Neznáma rola '{cell(values, 'role')}'")
+            continue
+
+        grade_id = class_id = None
+        grade_name, class_name = cell(values, "grade"), cell(values, "class")
+        if grade_name:
+            grade_id = grades_by_name.get(name_key(grade_name))
+            if not grade_id:
+                fail(f"Neznámy ročník '{grade_name}'")
+                continue
+        if class_name:
+            if grade_id:
+                match = classes_by_grade.get((grade_id, name_key(class_name)))
+            else:
+                # Without a grade the class name must be unique across grades
+                candidates = classes_by_name.get(name_key(class_name), [])
+                match = candidates[0] if len(candidates) == 1 else None
+            if not match:
+                fail(f"Neznáma trieda '{class_name}'")
+                continue
+            class_id = match["id"]
+            grade_id = grade_id or match["grade_id"]
+        if role != "student":
+            grade_id = class_id = None
+
+        valid.append(ImportRow(number, email, first_name, last_name, role, grade_id, class_id,
+                               cell(values, "password") or None))
+    return valid, errors
+
+
+def generate_password(length: int = 10) -> str:
+    alphabet = string.ascii_letters + string.digits
+    return "".join(secrets.choice(alphabet) for _ in range(length))
+
+
+async def hash_passwords(passwords: List[str], rounds: int, workers: int) -> List[str]:
+    """bcrypt hash per password, in order, computed in parallel"""
+    import bcrypt
+
+    def hash_one(password: str) -> str:
+        return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(rounds)).decode("utf-8")
+
+    # Every account gets its own salt, also when the initial passwords are the same
+    loop = asyncio.get_running_loop()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="user-import-bcrypt") as pool:
+        return list(await asyncio.gather(*(loop.run_in_executor(pool, hash_one, p) for p in passwords)))
+
+
+def bcrypt_rounds(password_hash: str) -> int:
+    """Cost factor of a '$2b$12$...' hash"""
+    try:
+        return int(password_hash.split("$")[2])
+    except (IndexError, ValueError):
+        return 0
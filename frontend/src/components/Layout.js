@@ -18,7 +18,9 @@ import {
   HelpCircle
 } from 'lucide-react';
 import { Button } from './ui/button';
-import { useState } from 'react';
+import { useState, useEffect } from 'react';
+import { toast } from 'sonner';
+import { subscribeAdminEvents } from '../services/api';
 
 const Layout = ({ children }) => {
   const { user, logout } = useAuth();
@@ -26,6 +28,18 @@ const Layout = ({ children }) => {
   const navigate = useNavigate();
   const [sidebarOpen, setSidebarOpen] = useState(false);
 
+  // Admins are told about new registrations on every page
+  useEffect(() => {
+    if (user?.role !== 'admin') return undefined;
+    return subscribeAdminEvents((type, data) => {
+      if (type === 'registration.created' && window.location.pathname !== '/approvals') {
+        toast.info(`Nová žiadosť o registráciu: ${data.first_name} ${data.last_name}`, {
+          action: { label: 'Zobraziť', onClick: () => navigate('/approvals') }
+        });
+      }
+    });
+  }, [user?.role, navigate]);
+
   const handleLogout = () => {
     logout();
     navigate('/login');
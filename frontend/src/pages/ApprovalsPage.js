@@ -3,7 +3,7 @@ import Layout from '../components/Layout';
 import { Card, CardContent, CardHeader, CardTitle } from '../components/ui/card';
 import { Button } from '../components/ui/button';
 import { Badge } from '../components/ui/badge';
-import { adminAPI } from '../services/api';
+import { adminAPI, subscribeAdminEvents } from '../services/api';
 import { 
   UserCheck, 
   UserX, 
@@ -21,6 +21,16 @@ const ApprovalsPage = () => {
 
   useEffect(() => {
     fetchRequests();
+    // Live deltas instead of reloading the list
+    return subscribeAdminEvents((type, data) => {
+      if (type === 'registration.created') {
+        setRequests((current) => (current.some(r => r.id === data.id) ? current : [...current, data]));
+      } else if (type === 'registration.approved' || type === 'registration.rejected') {
+        setRequests((current) => current.filter(r => r.id !== data.id));
+      } else if (type === 'resync') {
+        fetchRequests();
+      }
+    });
   }, []);
 
   const fetchRequests = async () => {
@@ -39,7 +49,7 @@ const ApprovalsPage = () => {
     setProcessingId(requestId);
     try {
       await adminAPI.approveRegistration(requestId);
-      setRequests(requests.filter(r => r.id !== requestId));
+      setRequests((current) => current.filter(r => r.id !== requestId));
       toast.success('Registrácia bola schválená');
     } catch (error) {
       toast.error('Nepodarilo sa schváliť registráciu');
@@ -54,7 +64,7 @@ const ApprovalsPage = () => {
     setProcessingId(requestId);
     try {
       await adminAPI.rejectRegistration(requestId);
-      setRequests(requests.filter(r => r.id !== requestId));
+      setRequests((current) => current.filter(r => r.id !== requestId));
       toast.success('Registrácia bola zamietnutá');
     } catch (error) {
       toast.error('Nepodarilo sa zamietnuť registráciu');
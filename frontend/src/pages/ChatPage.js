@@ -188,7 +188,11 @@ const ChatPage = () => {
     setMessages(prev => [...prev, tempUserMsg]);
 
     try {
-      const response = await chatAPI.sendMessage(currentChat.id, messageContent);
+      const response = await chatAPI.sendMessage(
+        currentChat.id,
+        messageContent,
+        currentAttachments.map(a => a.id)
+      );
       
       // Replace temp message and add AI response
       setMessages(prev => [
@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import Layout from '../components/Layout';
 import { Card, CardContent, CardHeader, CardTitle } from '../components/ui/card';
 import { Button } from '../components/ui/button';
@@ -6,18 +6,29 @@ import { Input } from '../components/ui/input';
 import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from '../components/ui/select';
 import { Badge } from '../components/ui/badge';
 import axios from 'axios';
+import { streamNdjson } from '../services/api';
 import { 
   Layers, 
   Loader2, 
   RotateCcw,
   ChevronLeft,
   ChevronRight,
-  Sparkles
+  Sparkles,
+  Repeat
 } from 'lucide-react';
 import { toast } from 'sonner';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
+// Reviews are sent to the server in batches of this size (and when the session ends)
+const REVIEW_BATCH_SIZE = 10;
+
+const REVIEW_GRADES = [
+  { quality: 1, label: 'Znova', className: 'bg-red-500 hover:bg-red-600' },
+  { quality: 3, label: 'Ťažké', className: 'bg-orange-500 hover:bg-orange-600' },
+  { quality: 4, label: 'Dobré', className: 'bg-green-500 hover:bg-green-600' },
+  { quality: 5, label: 'Ľahké', className: 'bg-sky-500 hover:bg-sky-600' },
+];
 
 const FlashcardsPage = () => {
   const [topic, setTopic] = useState('');
@@ -29,11 +40,67 @@ const FlashcardsPage = () => {
   const [isFlipped, setIsFlipped] = useState(false);
   const [loading, setLoading] = useState(false);
   const [count, setCount] = useState(10);
+  const [dueCards, setDueCards] = useState([]);
+  const [reviewMode, setReviewMode] = useState(false);
+  const pendingReviews = useRef([]);
 
   useEffect(() => {
     fetchTopics();
+    fetchDueCards();
+    return () => {
+      flushReviews();
+    };
   }, []);
 
+  const fetchDueCards = async () => {
+    try {
+      const response = await axios.get(`${API}/flashcards/due`, { params: { limit: 50 } });
+      setDueCards(response.data.cards);
+    } catch (error) {
+      console.error('Chyba pri načítaní kartičiek na opakovanie:', error);
+    }
+  };
+
+  const flushReviews = async () => {
+    const reviews = pendingReviews.current;
+    if (reviews.length === 0) return;
+    pendingReviews.current = [];
+    try {
+      await axios.post(`${API}/flashcards/review`, { reviews });
+    } catch (error) {
+      console.error('Chyba pri ukladaní opakovania:', error);
+      pendingReviews.current = reviews.concat(pendingReviews.current);
+    }
+  };
+
+  const startReview = () => {
+    setFlashcards(dueCards);
+    setCurrentIndex(0);
+    setIsFlipped(false);
+    setReviewMode(true);
+  };
+
+  const gradeCard = async (quality) => {
+    pendingReviews.current.push({
+      card_id: flashcards[currentIndex].id,
+      quality,
+      reviewed_at: new Date().toISOString()
+    });
+    const finished = currentIndex + 1 >= flashcards.length;
+    if (finished || pendingReviews.current.length >= REVIEW_BATCH_SIZE) {
+      await flushReviews();
+    }
+    if (finished) {
+      toast.success('Opakovanie dokončené! 🎉');
+      setFlashcards([]);
+      setReviewMode(false);
+      fetchDueCards();
+      return;
+    }
+    setIsFlipped(false);
+    setCurrentIndex(currentIndex + 1);
+  };
+
   const fetchTopics = async () => {
     try {
       const response = await axios.get(`${API}/topics`);
@@ -50,20 +117,25 @@ const FlashcardsPage = () => {
       return;
     }
 
+    await flushReviews();
     setLoading(true);
+    setReviewMode(false);
     setFlashcards([]);
     setCurrentIndex(0);
     setIsFlipped(false);
 
     try {
-      const response = await axios.post(`${API}/flashcards/generate`, {
+      // Cards appear one by one while the rest is still being generated
+      const summary = await streamNdjson('/flashcards/generate?stream=true', {
         topic: topic,
         subject_id: selectedSubject || null,
         count: count
-      });
+      }, (card) => setFlashcards((prev) => [...prev, card]));
       
-      setFlashcards(response.data.flashcards);
-      toast.success(`Vytvorených ${response.data.flashcards.length} kartičiek! 📚`);
+      toast.success(`Vytvorených ${summary?.count || 0} kartičiek! 📚`);
+      if (summary?.deck_id) {
+        fetchDueCards();
+      }
     } catch (error) {
       console.error('Chyba pri generovaní kartičiek:', error);
       toast.error('Nepodarilo sa vytvoriť kartičky');
@@ -100,6 +172,21 @@ const FlashcardsPage = () => {
           <p className="text-slate-400">Vytvorte si kartičky na učenie z ľubovoľnej témy</p>
         </div>
 
+        {/* Spaced repetition */}
+        {dueCards.length > 0 && !reviewMode && (
+          <Card className="bg-slate-800 border-slate-700">
+            <CardContent className="flex items-center justify-between p-4">
+              <p className="text-slate-300">
+                Na opakovanie čaká <span className="font-semibold text-pink-300">{dueCards.length}</span> kartičiek 🔁
+              </p>
+              <Button onClick={startReview} className="bg-pink-500 hover:bg-pink-600" data-testid="start-review-btn">
+                <Repeat className="w-4 h-4 mr-2" />
+                Opakovať
+              </Button>
+            </CardContent>
+          </Card>
+        )}
+
         {/* Generator */}
         <Card className="bg-slate-800 border-slate-700">
           <CardHeader>
@@ -245,7 +332,24 @@ const FlashcardsPage = () => {
               </div>
             </div>
 
+            {/* Review grades */}
+            {reviewMode && (
+              <div className="flex items-center justify-center gap-2 flex-wrap" data-testid="review-grades">
+                {REVIEW_GRADES.map((grade) => (
+                  <Button
+                    key={grade.quality}
+                    onClick={() => gradeCard(grade.quality)}
+                    disabled={!isFlipped}
+                    className={grade.className}
+                  >
+                    {grade.label}
+                  </Button>
+                ))}
+              </div>
+            )}
+
             {/* Navigation */}
+            {!reviewMode && (
             <div className="flex items-center justify-center gap-4">
               <Button
                 variant="outline"
@@ -265,6 +369,7 @@ const FlashcardsPage = () => {
                 <ChevronRight className="w-5 h-5 ml-1" />
               </Button>
             </div>
+            )}
           </div>
         )}
       </div>
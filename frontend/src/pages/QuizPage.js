@@ -6,6 +6,7 @@ import { Input } from '../components/ui/input';
 import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from '../components/ui/select';
 import { Badge } from '../components/ui/badge';
 import axios from 'axios';
+import { streamNdjson } from '../services/api';
 import { 
   HelpCircle, 
   Loader2, 
@@ -65,14 +66,18 @@ const QuizPage = () => {
     setQuizComplete(false);
 
     try {
-      const response = await axios.post(`${API}/quiz/generate`, {
+      // The first question can be answered while the others are still being generated
+      let received = 0;
+      await streamNdjson('/quiz/generate?stream=true', {
         topic: topic,
         subject_id: selectedSubject || null,
         question_count: questionCount
+      }, (question) => {
+        received += 1;
+        setQuestions((prev) => [...prev, question]);
       });
       
-      setQuestions(response.data.questions);
-      toast.success(`Kvíz s ${response.data.questions.length} otázkami je pripravený! 🎯`);
+      toast.success(`Kvíz s ${received} otázkami je pripravený! 🎯`);
     } catch (error) {
       console.error('Chyba pri generovaní kvízu:', error);
       toast.error('Nepodarilo sa vytvoriť kvíz');
@@ -308,10 +313,13 @@ const QuizPage = () => {
                   ) : (
                     <Button
                       onClick={nextQuestion}
+                      disabled={loading && currentIndex + 1 >= questions.length}
                       className="bg-pink-500 hover:bg-pink-600"
                       data-testid="next-question-btn"
                     >
-                      {currentIndex + 1 >= questions.length ? 'Zobraziť výsledky' : 'Ďalšia otázka'}
+                      {loading && currentIndex + 1 >= questions.length
+                        ? 'Generujem ďalšiu otázku...'
+                        : currentIndex + 1 >= questions.length ? 'Zobraziť výsledky' : 'Ďalšia otázka'}
                     </Button>
                   )}
                 </div>
@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import Layout from '../components/Layout';
 import { Card, CardContent, CardHeader, CardTitle } from '../components/ui/card';
 import { Button } from '../components/ui/button';
@@ -37,7 +37,10 @@ import {
   UserX,
   Trash2,
   ArrowUpCircle,
-  Edit
+  Edit,
+  Download,
+  Upload,
+  History
 } from 'lucide-react';
 import { toast } from 'sonner';
 
@@ -48,7 +51,11 @@ const UsersPage = () => {
   const [loading, setLoading] = useState(true);
   const [searchTerm, setSearchTerm] = useState('');
   const [roleFilter, setRoleFilter] = useState('all');
+  const [importing, setImporting] = useState(false);
+  const importInputRef = useRef(null);
   const [editDialog, setEditDialog] = useState(false);
+  const [historyUser, setHistoryUser] = useState(null);
+  const [historyEvents, setHistoryEvents] = useState([]);
   const [selectedUser, setSelectedUser] = useState(null);
   const [editForm, setEditForm] = useState({
     first_name: '',
@@ -111,6 +118,64 @@ const UsersPage = () => {
     }
   };
 
+  const handleExport = async () => {
+    try {
+      const params = { format: 'csv' };
+      if (roleFilter !== 'all') params.role = roleFilter;
+      const response = await adminAPI.exportData('users', params);
+      const url = window.URL.createObjectURL(response.data);
+      const link = document.createElement('a');
+      link.href = url;
+      link.download = `pocketbuddy-pouzivatelia-${new Date().toISOString().slice(0, 10)}.csv`;
+      link.click();
+      window.URL.revokeObjectURL(url);
+    } catch (error) {
+      toast.error('Nepodarilo sa exportovať používateľov');
+    }
+  };
+
+  const downloadCsv = (rows, fileName) => {
+    const csv = rows.map(row => row.map(v => `"${String(v ?? '').replace(/"/g, '""')}"`).join(';')).join('\n');
+    const url = window.URL.createObjectURL(new Blob(['\ufeff' + csv], { type: 'text/csv' }));
+    const link = document.createElement('a');
+    link.href = url;
+    link.download = fileName;
+    link.click();
+    window.URL.revokeObjectURL(url);
+  };
+
+  const handleImport = async (e) => {
+    const file = e.target.files?.[0];
+    e.target.value = '';
+    if (!file) return;
+
+    setImporting(true);
+    try {
+      const { data } = await adminAPI.importUsers(file);
+      if (data.generated_passwords.length > 0) {
+        // Generated passwords are returned only once
+        downloadCsv(
+          [['email', 'heslo'], ...data.generated_passwords.map(p => [p.email, p.password])],
+          `pocketbuddy-hesla-${new Date().toISOString().slice(0, 10)}.csv`
+        );
+      }
+      if (data.failed > 0) {
+        downloadCsv(
+          [['riadok', 'email', 'chyba'], ...data.errors.map(err => [err.row, err.email, err.error])],
+          `pocketbuddy-import-chyby-${new Date().toISOString().slice(0, 10)}.csv`
+        );
+        toast.warning(`Importovaných ${data.imported} používateľov, ${data.failed} riadkov s chybou`);
+      } else {
+        toast.success(`Importovaných ${data.imported} používateľov`);
+      }
+      fetchData();
+    } catch (error) {
+      toast.error(error.response?.data?.detail || 'Nepodarilo sa importovať používateľov');
+    } finally {
+      setImporting(false);
+    }
+  };
+
   const handlePromoteGrade = async (userId) => {
     try {
       const response = await adminAPI.promoteStudentGrade(userId);
@@ -121,6 +186,17 @@ const UsersPage = () => {
     }
   };
 
+  const openHistory = async (user) => {
+    setHistoryUser(user);
+    setHistoryEvents([]);
+    try {
+      const { data } = await adminAPI.getAuditLog({ target_id: user.id, limit: 100 });
+      setHistoryEvents(data.events);
+    } catch (error) {
+      toast.error('Nepodarilo sa načítať históriu zmien');
+    }
+  };
+
   const openEditDialog = (user) => {
     setSelectedUser(user);
     setEditForm({
@@ -194,6 +270,29 @@ const UsersPage = () => {
             <h1 className="text-2xl font-bold text-slate-800">Používatelia</h1>
             <p className="text-slate-500">Správa všetkých používateľov systému</p>
           </div>
+          <div className="flex gap-2">
+            <input
+              ref={importInputRef}
+              type="file"
+              accept=".csv,text/csv"
+              className="hidden"
+              onChange={handleImport}
+            />
+            <Button
+              variant="outline"
+              onClick={() => importInputRef.current?.click()}
+              disabled={importing}
+              className="rounded-xl"
+              data-testid="import-users-btn"
+            >
+              {importing ? <Loader2 className="w-4 h-4 mr-2 animate-spin" /> : <Upload className="w-4 h-4 mr-2" />}
+              Import CSV
+            </Button>
+            <Button variant="outline" onClick={handleExport} className="rounded-xl" data-testid="export-users-btn">
+              <Download className="w-4 h-4 mr-2" />
+              Export CSV
+            </Button>
+          </div>
         </div>
 
         {/* Filters */}
@@ -269,6 +368,10 @@ const UsersPage = () => {
                             <Edit className="w-4 h-4 mr-2" />
                             Upraviť
                           </DropdownMenuItem>
+                          <DropdownMenuItem onClick={() => openHistory(user)}>
+                            <History className="w-4 h-4 mr-2" />
+                            História zmien
+                          </DropdownMenuItem>
                           {user.is_active ? (
                             <DropdownMenuItem onClick={() => handleDeactivate(user.id)}>
                               <UserX className="w-4 h-4 mr-2" />
@@ -310,6 +413,37 @@ const UsersPage = () => {
           </CardContent>
         </Card>
 
+        {/* Change history */}
+        <Dialog open={!!historyUser} onOpenChange={(open) => !open && setHistoryUser(null)}>
+          <DialogContent className="max-w-2xl">
+            <DialogHeader>
+              <DialogTitle>História zmien</DialogTitle>
+              <DialogDescription>
+                {historyUser?.first_name} {historyUser?.last_name} ({historyUser?.email})
+              </DialogDescription>
+            </DialogHeader>
+            <div className="max-h-[400px] overflow-y-auto space-y-2" data-testid="user-history">
+              {historyEvents.length === 0 && (
+                <p className="text-sm text-slate-500">Žiadne zaznamenané zmeny</p>
+              )}
+              {historyEvents.map((event) => (
+                <div key={event.id} className="rounded-lg border border-slate-200 p-3 text-sm">
+                  <div className="flex justify-between gap-2">
+                    <span className="font-medium">{event.action}</span>
+                    <span className="text-slate-500">{new Date(event.created_at).toLocaleString('sk-SK')}</span>
+                  </div>
+                  <div className="text-slate-500">{event.actor_email}</div>
+                  {Object.entries(event.details || {}).map(([field, value]) => (
+                    <div key={field} className="text-slate-600">
+                      {field}: {Array.isArray(value) ? `${value[0] ?? '—'} → ${value[1] ?? '—'}` : String(value)}
+                    </div>
+                  ))}
+                </div>
+              ))}
+            </div>
+          </DialogContent>
+        </Dialog>
+
         {/* Edit Dialog */}
         <Dialog open={editDialog} onOpenChange={setEditDialog}>
           <DialogContent>
@@ -22,12 +22,25 @@ export const adminAPI = {
   activateUser: (userId) => axios.post(`${API}/admin/users/${userId}/activate`),
   promoteStudentGrade: (userId) => axios.post(`${API}/admin/users/${userId}/promote-grade`),
   getStatistics: () => axios.get(`${API}/admin/statistics`),
+  importUsers: (file, dryRun = false) => {
+    const formData = new FormData();
+    formData.append('file', file);
+    return axios.post(`${API}/admin/users/import`, formData, {
+      params: { dry_run: dryRun },
+      headers: { 'Content-Type': 'multipart/form-data' }
+    });
+  },
+  // kind: users | registrations | chats; params: format, role, grade_id, date_from, date_to, gzip
+  exportData: (kind, params = {}) =>
+    axios.get(`${API}/admin/export/${kind}`, { params, responseType: 'blob' }),
+  getAuditLog: (params = {}) => axios.get(`${API}/admin/audit`, { params }),
 };
 
 // Grades API
 export const gradesAPI = {
   getAll: () => axios.get(`${API}/grades`),
   create: (data) => axios.post(`${API}/grades`, data),
+  update: (gradeId, data) => axios.put(`${API}/grades/${gradeId}`, data),
   delete: (gradeId) => axios.delete(`${API}/grades/${gradeId}`),
 };
 
@@ -42,6 +55,7 @@ export const classesAPI = {
 export const subjectsAPI = {
   getAll: () => axios.get(`${API}/subjects`),
   create: (data) => axios.post(`${API}/subjects`, data),
+  update: (subjectId, data) => axios.put(`${API}/subjects/${subjectId}`, data),
   delete: (subjectId) => axios.delete(`${API}/subjects/${subjectId}`),
 };
 
@@ -68,7 +82,9 @@ export const chatAPI = {
   createChat: (title) => axios.post(`${API}/chats`, { title }),
   deleteChat: (chatId) => axios.delete(`${API}/chats/${chatId}`),
   getMessages: (chatId) => axios.get(`${API}/chats/${chatId}/messages`),
-  sendMessage: (chatId, content) => axios.post(`${API}/chats/${chatId}/messages`, { content }),
+  sendMessage: (chatId, content, attachmentIds = []) =>
+    axios.post(`${API}/chats/${chatId}/messages`, { content, attachment_ids: attachmentIds }),
+  searchMessages: (q, limit = 20) => axios.get(`${API}/chats/search`, { params: { q, limit } }),
 };
 
 // Attachments API
@@ -83,6 +99,107 @@ export const attachmentsAPI = {
   download: (attachmentId) => `${API}/attachments/${attachmentId}`,
 };
 
+// Streams an NDJSON response: calls onItem for every line and resolves with the closing {"done": true} line.
+// fetch instead of axios, which cannot read a response body incrementally in the browser.
+export const streamNdjson = async (path, body, onItem) => {
+  const response = await fetch(`${API}${path}`, {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/json',
+      Authorization: axios.defaults.headers.common['Authorization'],
+    },
+    body: JSON.stringify(body),
+  });
+  if (!response.ok) {
+    throw new Error(`HTTP ${response.status}`);
+  }
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  let summary = null;
+  for (;;) {
+    const { done, value } = await reader.read();
+    buffer += decoder.decode(value || new Uint8Array(), { stream: !done });
+    const lines = buffer.split('\n');
+    buffer = done ? '' : lines.pop();
+    for (const line of lines) {
+      if (!line.trim()) continue;
+      const item = JSON.parse(line);
+      if (item.done) {
+        summary = item;
+      } else {
+        onItem(item);
+      }
+    }
+    if (done) return summary;
+  }
+};
+
+// Admin event stream (server-sent events), one connection shared by all subscribers.
+// EventSource cannot send headers, so the stream is opened with a short-lived ticket rather
+// than the login token. It reconnects on its own while the ticket is valid; after that the
+// reconnect is refused and a new ticket is fetched. Missed events are replayed from the last id.
+const ADMIN_EVENT_TYPES = ['registration.created', 'registration.approved', 'registration.rejected', 'resync'];
+const ADMIN_EVENT_REOPEN_MS = 3000;
+const adminEventHandlers = new Set();
+let adminEventSource = null;
+let adminEventLastId = null;
+let adminEventReopen = null;
+
+const openAdminEvents = async () => {
+  adminEventReopen = null;
+  let ticket;
+  try {
+    ({ data: { ticket } } = await axios.post(`${API}/admin/events/ticket`));
+  } catch (error) {
+    const status = error.response?.status;
+    if (adminEventHandlers.size && status !== 401 && status !== 403) {
+      adminEventReopen = setTimeout(openAdminEvents, ADMIN_EVENT_REOPEN_MS);
+    }
+    return;
+  }
+  // Everyone unsubscribed while the ticket was on its way
+  if (!adminEventHandlers.size || adminEventSource) return;
+
+  const params = new URLSearchParams({ ticket });
+  if (adminEventLastId) params.set('last_event_id', adminEventLastId);
+  const source = new EventSource(`${API}/admin/events?${params}`);
+  ADMIN_EVENT_TYPES.forEach((type) => {
+    source.addEventListener(type, (event) => {
+      if (event.lastEventId) adminEventLastId = event.lastEventId;
+      const data = JSON.parse(event.data);
+      adminEventHandlers.forEach((handler) => handler(type, data));
+    });
+  });
+  source.onerror = () => {
+    // CLOSED means the reconnect was refused (expired ticket); CONNECTING retries by itself
+    if (source.readyState === EventSource.CLOSED && adminEventSource === source) {
+      adminEventSource = null;
+      adminEventReopen = setTimeout(openAdminEvents, ADMIN_EVENT_REOPEN_MS);
+    }
+  };
+  adminEventSource = source;
+};
+
+export const subscribeAdminEvents = (onEvent) => {
+  adminEventHandlers.add(onEvent);
+  if (adminEventHandlers.size === 1 && !adminEventSource && !adminEventReopen) {
+    openAdminEvents();
+  }
+  return () => {
+    adminEventHandlers.delete(onEvent);
+    if (!adminEventHandlers.size) {
+      clearTimeout(adminEventReopen);
+      adminEventReopen = null;
+      if (adminEventSource) {
+        adminEventSource.close();
+        adminEventSource = null;
+      }
+      adminEventLastId = null;
+    }
+  };
+};
+
 // Seed API
 export const seedAPI = {
   seed: () => axios.post(`${API}/seed`),
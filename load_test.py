@@ -0,0 +1,430 @@
+#!/usr/bin/env python3
+"""
+PocketBuddy Load Test Harness
+Boots the backend app in-process against a local mongod (or mongomock-motor)
+and a fake LLM backend, then drives realistic classroom traffic with many concurrent clients.
+Against a real mongod the report also shows average DB queries and DB time per endpoint.
+
+Examples:
+    python load_test.py --mongo mock --clients 30 --scenario lesson-start
+    python load_test.py --mongo mongodb://localhost:27017 --scenario mixed --json run.json
+    python load_test.py --mongo mock --scenario chat-burst --json new.json --compare run.json
+
+DB time per chat turn before and after a change (needs a real mongod; mongomock reports no
+query timings): run chat-burst on the old commit with --json, then on the new one with
+--compare pointing at that file. This has not been measured yet for the send_message round-trip
+cuts (05e5d3b): no before/after numbers are recorded, so that change is unverified until the
+commands below are run against a real mongod.
+
+    git checkout <old> && python load_test.py --mongo mongodb://localhost:27017 --scenario chat-burst --seed 1 --json before.json
+    git checkout <new> && python load_test.py --mongo mongodb://localhost:27017 --scenario chat-burst --seed 1 --compare before.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import sys
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent / "backend"))
+
+STUDENT_PASSWORD = "student123"
+
+SERVER_TIMING_DB = re.compile(r"db;dur=([0-9.]+)")
+
+FAKE_FLASHCARDS = json.dumps([
+    {"otazka": "Čo je fotosyntéza? 🌱", "odpoved": "Proces, pri ktorom rastliny vyrábajú cukry zo svetla."},
+    {"otazka": "Kde prebieha fotosyntéza? 🍃", "odpoved": "V chloroplastoch."},
+], ensure_ascii=False)
+
+FAKE_QUIZ = json.dumps([
+    {
+        "otazka": "Aký plyn rastliny uvoľňujú pri fotosyntéze? 🤔",
+        "moznosti": ["A) kyslík", "B) dusík", "C) hélium", "D) metán"],
+        "spravna": "A",
+        "vysvetlenie": "Pri fotosyntéze vzniká kyslík. ✨"
+    }
+], ensure_ascii=False)
+
+
+class FakeLLMBackend:
+    """Stand-in LLM backend with configurable latency and failure rate"""
+
+    name = "fake"
+
+    def __init__(self, latency_ms=800.0, jitter_ms=200.0, failure_rate=0.0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.failure_rate = failure_rate
+        self.calls = 0
+        self.failures = 0
+
+    async def complete(self, provider, model, system_message, text, session_id):
+        self.calls += 1
+        delay = max(0.0, random.gauss(self.latency_ms, self.jitter_ms)) / 1000
+        await asyncio.sleep(delay)
+        if random.random() < self.failure_rate:
+            self.failures += 1
+            raise RuntimeError(f"Fake {provider}/{model} failure")
+        if "kartičiek" in system_message:
+            return FAKE_FLASHCARDS
+        if "kvíz" in system_message:
+            return FAKE_QUIZ
+        return f"Ahoj! 😊 Toto je testovacia odpoveď na: {text[:80]}"
+
+
+class LatencyRecorder:
+    """Collects per-endpoint latencies and errors"""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.db_queries = defaultdict(int)
+        self.db_ms = defaultdict(float)
+        self.errors = defaultdict(int)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+
+    def record(self, name, elapsed_ms, status_code, db_queries=0, db_ms=0.0):
+        self.latencies[name].append(elapsed_ms)
+        self.db_queries[name] += db_queries
+        self.db_ms[name] += db_ms
+        self.statuses[name][status_code] += 1
+        if status_code >= 400:
+            self.errors[name] += 1
+
+    @staticmethod
+    def percentile(values, pct):
+        if not values:
+            return 0.0
+        ordered = sorted(values)
+        index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+        return ordered[index]
+
+    def report(self, wall_seconds):
+        endpoints = {}
+        total = 0
+        for name, values in sorted(self.latencies.items()):
+            total += len(values)
+            endpoints[name] = {
+                "requests": len(values),
+                "errors": self.errors[name],
+                "throughput_rps": round(len(values) / wall_seconds, 2) if wall_seconds else 0.0,
+                "p50_ms": round(self.percentile(values, 50), 2),
+                "p95_ms": round(self.percentile(values, 95), 2),
+                "p99_ms": round(self.percentile(values, 99), 2),
+                "max_ms": round(max(values), 2),
+                "avg_db_queries": round(self.db_queries[name] / len(values), 2),
+                "avg_db_ms": round(self.db_ms[name] / len(values), 2),
+                "statuses": {str(k): v for k, v in self.statuses[name].items()},
+            }
+        return {
+            "wall_seconds": round(wall_seconds, 3),
+            "total_requests": total,
+            "throughput_rps": round(total / wall_seconds, 2) if wall_seconds else 0.0,
+            "endpoints": endpoints,
+        }
+
+
+class LoadTestHarness:
+    def __init__(self, args):
+        self.args = args
+        self.recorder = LatencyRecorder()
+        self.server = None
+        self.llm = None
+        self.http = None
+        self.students = []
+        self.db_name = None
+
+    # ---------- setup ----------
+
+    async def boot(self):
+        """Import the app in-process and swap in the local database and fake LLM"""
+        self.db_name = f"pocketbuddy_loadtest_{uuid.uuid4().hex[:8]}"
+        mongo_url = self.args.mongo if self.args.mongo != "mock" else "mongodb://localhost:27017"
+        os.environ["MONGO_URL"] = mongo_url
+        os.environ["DB_NAME"] = self.db_name
+        # Per-request DB query counts and time come back in Server-Timing headers
+        os.environ["SERVER_TIMING"] = "true"
+
+        import server
+        import httpx
+
+        self.server = server
+        if self.args.mongo == "mock":
+            from mongomock_motor import AsyncMongoMockClient
+            server.client = AsyncMongoMockClient(tz_aware=True)
+            server.db = server.client[self.db_name]
+
+        self.llm = FakeLLMBackend(self.args.llm_latency_ms, self.args.llm_jitter_ms, self.args.llm_failure_rate)
+        server.llm_backend = self.llm
+
+        # ASGITransport does not run the lifespan handler
+        await server.init_resources()
+
+        limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+        self.http = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=server.app),
+            base_url="http://loadtest",
+            timeout=self.args.timeout,
+            limits=limits,
+        )
+
+    async def seed(self):
+        """Seed grades/subjects/admin and create approved students directly in the DB"""
+        print("🌱 Seeding data...")
+        server = self.server
+        await self.http.post("/api/seed")
+        grades = await server.db.grades.find({}, {"_id": 0}).to_list(100)
+        subjects = await server.db.subjects.find({}, {"_id": 0}).to_list(100)
+        admin = await server.db.users.find_one({"role": "admin"}, {"_id": 0})
+
+        now = datetime.now(timezone.utc)
+        password_hash = server.hash_password(STUDENT_PASSWORD)
+        self.students = []
+        docs = []
+        for i in range(self.args.clients):
+            grade = grades[i % len(grades)]
+            email = f"student{i}@loadtest.sk"
+            docs.append({
+                "id": str(uuid.uuid4()),
+                "email": email,
+                "password_hash": password_hash,
+                "first_name": "Študent",
+                "last_name": str(i),
+                "role": "student",
+                "is_approved": True,
+                "is_active": True,
+                "grade_id": grade["id"],
+                "class_id": None,
+                "created_at": now,
+                "updated_at": now
+            })
+            self.students.append(email)
+        await server.db.users.insert_many(docs)
+
+        sources = []
+        for i in range(self.args.sources):
+            sources.append({
+                "id": str(uuid.uuid4()),
+                "uploaded_by_user_id": admin["id"],
+                "subject_id": subjects[i % len(subjects)]["id"],
+                "grade_id": grades[i % len(grades)]["id"] if i % 3 else None,
+                "file_name": f"material_{i}.pdf",
+                "file_path": f"/dev/null/material_{i}.pdf",
+                "description": f"Študijný materiál {i}",
+                "is_active": True,
+                "created_at": now,
+                "updated_at": now
+            })
+        if sources:
+            await server.db.ai_sources.insert_many(sources)
+        print(f"   👥 {len(docs)} students, 📚 {len(sources)} AI sources")
+
+    async def teardown(self):
+        await self.http.aclose()
+        if self.args.mongo != "mock":
+            await self.server.client.drop_database(self.db_name)
+        await self.server.close_resources()
+
+    # ---------- requests ----------
+
+    async def call(self, name, method, path, token=None, **kwargs):
+        headers = kwargs.pop("headers", {})
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+        start = time.perf_counter()
+        db_queries, db_ms = 0, 0.0
+        try:
+            response = await self.http.request(method, path, headers=headers, **kwargs)
+            status_code = response.status_code
+            db_queries = int(response.headers.get("X-DB-Query-Count", 0))
+            match = SERVER_TIMING_DB.search(response.headers.get("Server-Timing", ""))
+            db_ms = float(match.group(1)) if match else 0.0
+        except Exception:
+            response = None
+            status_code = 599
+        self.recorder.record(name, (time.perf_counter() - start) * 1000, status_code, db_queries, db_ms)
+        return response
+
+    async def login(self, email):
+        response = await self.call("POST /api/auth/login", "POST", "/api/auth/login",
+                                   json={"email": email, "password": STUDENT_PASSWORD})
+        if response is None or response.status_code != 200:
+            return None
+        return response.json()["token"]
+
+    async def think(self):
+        if self.args.think_ms:
+            await asyncio.sleep(random.uniform(0, self.args.think_ms) / 1000)
+
+    # ---------- scenarios ----------
+
+    async def lesson_start_client(self, email):
+        """Whole class logs in at the bell and opens the dashboard"""
+        token = await self.login(email)
+        if not token:
+            return
+        await self.call("GET /api/auth/me", "GET", "/api/auth/me", token)
+        await self.call("GET /api/chats", "GET", "/api/chats", token)
+        await self.call("GET /api/topics", "GET", "/api/topics", token)
+
+    async def chat_burst_client(self, email):
+        """Each student opens a chat and fires off several questions"""
+        token = await self.login(email)
+        if not token:
+            return
+        response = await self.call("POST /api/chats", "POST", "/api/chats", token, json={"title": "Záťažový test"})
+        if response is None or response.status_code != 200:
+            return
+        chat_id = response.json()["id"]
+        for i in range(self.args.messages):
+            await self.call("POST /api/chats/{id}/messages", "POST", f"/api/chats/{chat_id}/messages", token,
+                            json={"content": f"Vysvetli mi fotosyntézu, otázka {i} 🌱"})
+            await self.think()
+        await self.call("GET /api/chats/{id}/messages", "GET", f"/api/chats/{chat_id}/messages", token)
+
+    async def flashcard_storm_client(self, email):
+        """Teacher asks the class to generate flashcards and a quiz on the same topic"""
+        token = await self.login(email)
+        if not token:
+            return
+        await self.call("POST /api/flashcards/generate", "POST", "/api/flashcards/generate", token,
+                        json={"topic": "Fotosyntéza", "count": 5})
+        await self.think()
+        await self.call("POST /api/quiz/generate", "POST", "/api/quiz/generate", token,
+                        json={"topic": "Fotosyntéza", "question_count": 5})
+
+    async def mixed_client(self, email):
+        """Weighted mix of everything a student does during a lesson"""
+        token = await self.login(email)
+        if not token:
+            return
+        chat_id = None
+        for _ in range(self.args.messages):
+            roll = random.random()
+            if roll < 0.45:
+                if not chat_id:
+                    response = await self.call("POST /api/chats", "POST", "/api/chats", token, json={"title": "Mix"})
+                    if response is None or response.status_code != 200:
+                        continue
+                    chat_id = response.json()["id"]
+                await self.call("POST /api/chats/{id}/messages", "POST", f"/api/chats/{chat_id}/messages", token,
+                                json={"content": "Čo je derivácia? 🤔"})
+            elif roll < 0.6:
+                await self.call("POST /api/flashcards/generate", "POST", "/api/flashcards/generate", token,
+                                json={"topic": "Derivácie", "count": 5})
+            elif roll < 0.7:
+                await self.call("POST /api/quiz/generate", "POST", "/api/quiz/generate", token,
+                                json={"topic": "Derivácie", "question_count": 5})
+            elif roll < 0.85:
+                await self.call("GET /api/chats", "GET", "/api/chats", token)
+            else:
+                await self.call("GET /api/topics", "GET", "/api/topics", token)
+            await self.think()
+
+    SCENARIOS = {
+        "lesson-start": "lesson_start_client",
+        "chat-burst": "chat_burst_client",
+        "flashcard-storm": "flashcard_storm_client",
+        "mixed": "mixed_client",
+    }
+
+    async def run(self):
+        print(f"🚀 PocketBuddy load test: scenario={self.args.scenario} clients={self.args.clients} mongo={self.args.mongo}")
+        await self.boot()
+        try:
+            await self.seed()
+            client_fn = getattr(self, self.SCENARIOS[self.args.scenario])
+            print(f"🔥 Running {self.args.clients} concurrent clients...")
+            start = time.perf_counter()
+            await asyncio.gather(*(client_fn(email) for email in self.students))
+            wall_seconds = time.perf_counter() - start
+        finally:
+            await self.teardown()
+
+        report = self.recorder.report(wall_seconds)
+        report["config"] = {
+            "scenario": self.args.scenario,
+            "clients": self.args.clients,
+            "messages": self.args.messages,
+            "mongo": "mock" if self.args.mongo == "mock" else "mongod",
+            "llm_latency_ms": self.args.llm_latency_ms,
+            "llm_failure_rate": self.args.llm_failure_rate,
+            "started_at": datetime.now(timezone.utc).isoformat(),
+        }
+        report["llm"] = {
+            "calls": self.llm.calls,
+            "failures": self.llm.failures,
+            "coalescing": self.server.llm_singleflight.stats(),
+            "admission": self.server.llm_admission.stats(),
+        }
+        return report
+
+
+def print_report(report, baseline=None):
+    print("\n" + "=" * 114)
+    print(f"📊 {report['total_requests']} requests in {report['wall_seconds']}s → {report['throughput_rps']} req/s "
+          f"(LLM calls: {report['llm']['calls']}, failures: {report['llm']['failures']})")
+    print("=" * 114)
+    print(f"{'endpoint':<36}{'reqs':>7}{'err':>6}{'rps':>9}{'p50':>10}{'p95':>10}{'p99':>10}{'queries':>9}{'db ms':>9}")
+    for name, stats in report["endpoints"].items():
+        line = (f"{name:<36}{stats['requests']:>7}{stats['errors']:>6}{stats['throughput_rps']:>9}"
+                f"{stats['p50_ms']:>10}{stats['p95_ms']:>10}{stats['p99_ms']:>10}"
+                f"{stats['avg_db_queries']:>9}{stats['avg_db_ms']:>9}")
+        base = (baseline or {}).get("endpoints", {}).get(name)
+        if base and base["p95_ms"]:
+            change = (stats["p95_ms"] - base["p95_ms"]) / base["p95_ms"] * 100
+            line += f"   p95 {change:+.1f}%"
+            # Reports from before Server-Timing was read have no DB columns
+            if "avg_db_queries" in base:
+                line += (f", queries {base['avg_db_queries']} → {stats['avg_db_queries']}"
+                         f", db {base['avg_db_ms']} → {stats['avg_db_ms']} ms")
+            line += " vs baseline"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PocketBuddy in-process load test")
+    parser.add_argument("--mongo", default="mock", help="'mock' for mongomock-motor or a mongodb:// URL for a local mongod")
+    parser.add_argument("--scenario", choices=sorted(LoadTestHarness.SCENARIOS), default="mixed")
+    parser.add_argument("--clients", type=int, default=30, help="Concurrent simulated students")
+    parser.add_argument("--messages", type=int, default=5, help="Actions per client in chat-burst/mixed")
+    parser.add_argument("--sources", type=int, default=20, help="AI sources to seed")
+    parser.add_argument("--think-ms", type=float, default=0, help="Max random pause between client actions")
+    parser.add_argument("--llm-latency-ms", type=float, default=800)
+    parser.add_argument("--llm-jitter-ms", type=float, default=200)
+    parser.add_argument("--llm-failure-rate", type=float, default=0.0, help="Probability that a fake LLM call raises")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for reproducible mixes")
+    parser.add_argument("--json", dest="json_path", help="Write the report as JSON to this file")
+    parser.add_argument("--compare", help="Baseline JSON report to compare p95 latency, DB queries and DB time against")
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    report = asyncio.run(LoadTestHarness(args).run())
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"\n💾 Report written to {args.json_path}")
+
+    errors = sum(stats["errors"] for stats in report["endpoints"].values())
+    return 0 if errors == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
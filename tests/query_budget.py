@@ -0,0 +1,24 @@
+"""
+Query budget helper - fails a test when an endpoint issues more Mongo commands than allowed.
+Reads the X-DB-Query-Count header, so the server must run with SERVER_TIMING=true.
+"""
+import pytest
+
+
+def db_query_count(response):
+    """Number of Mongo commands the server issued for this response"""
+    count = response.headers.get("X-DB-Query-Count")
+    if count is None:
+        pytest.skip("Server does not expose query counts (set SERVER_TIMING=true)")
+    return int(count)
+
+
+def assert_max_queries(response, max_queries):
+    """Assert that the request behind `response` stayed within its query budget"""
+    count = db_query_count(response)
+    request = response.request
+    assert count <= max_queries, (
+        f"{request.method} {request.url} issued {count} DB queries, budget is {max_queries} "
+        f"(Server-Timing: {response.headers.get('Server-Timing')})"
+    )
+    return count
@@ -0,0 +1,109 @@
+"""
+Admin event stream tests - local delivery, replay after reconnect and slow clients (in-memory collection)
+"""
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+from admin_events import RESYNC, AdminEvents
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, key, direction):
+        return self
+
+    async def to_list(self, length):
+        return [{k: v for k, v in d.items() if k != "_id"} for d in self.docs]
+
+
+class FakeCollection:
+    def __init__(self):
+        self.docs = []
+
+    async def insert_one(self, doc):
+        self.docs.append(doc)
+
+    def find(self, query=None, projection=None):
+        return FakeCursor(self.docs)
+
+
+class FakeDb:
+    def __init__(self):
+        self.collection = FakeCollection()
+
+    def __getitem__(self, name):
+        return self.collection
+
+
+async def take(stream, count):
+    return [await stream.__anext__() for _ in range(count)]
+
+
+class TestAdminEvents:
+    """Broadcaster without a tailing cursor"""
+
+    def test_published_events_reach_subscribers(self):
+        """Test that every connected stream gets the event and idle streams get heartbeats"""
+        db = FakeDb()
+        events = AdminEvents(lambda: db, heartbeat_seconds=0.01)
+
+        async def run():
+            first, second = events.events(), events.events()
+            pending = [asyncio.ensure_future(take(s, 1)) for s in (first, second)]
+            await asyncio.sleep(0)
+            await events.publish("registration.created", {"id": "r1"})
+            received = await asyncio.gather(*pending)
+            heartbeat = await first.__anext__()
+            await first.aclose()
+            await second.aclose()
+            return received, heartbeat
+
+        received, heartbeat = asyncio.run(run())
+        assert [r[0]["data"]["id"] for r in received] == ["r1", "r1"]
+        assert heartbeat is None
+        assert len(db.collection.docs) == 1
+        assert events.stats()["subscribers"] == 0
+        print("✓ Event delivered to both streams, heartbeat when idle")
+
+    def test_reconnect_replays_missed_events(self):
+        """Test that Last-Event-ID replays later events, and an unknown id asks for a resync"""
+        db = FakeDb()
+        events = AdminEvents(lambda: db, heartbeat_seconds=0.01)
+
+        async def run():
+            published = [await events.publish("registration.created", {"id": f"r{i}"}) for i in range(3)]
+            resumed = await take(events.events(published[0]["id"]), 2)
+            unknown = await take(events.events("rolled-off"), 1)
+            return resumed, unknown
+
+        resumed, unknown = asyncio.run(run())
+        assert [e["data"]["id"] for e in resumed] == ["r1", "r2"]
+        assert unknown[0]["type"] == RESYNC
+        print("✓ Missed events replayed, resync when they are gone")
+
+    def test_slow_client_stream_ends(self):
+        """Test that a stream whose queue fills up is closed instead of blocking publishers"""
+        db = FakeDb()
+        events = AdminEvents(lambda: db, subscriber_queue=2, heartbeat_seconds=0.01)
+
+        async def run():
+            stream = events.events()
+            first = asyncio.ensure_future(stream.__anext__())
+            await asyncio.sleep(0)
+            for i in range(4):
+                await events.publish("registration.approved", {"id": f"r{i}"})
+            received = [await first]
+            async for event in stream:
+                received.append(event)
+            return received
+
+        received = asyncio.run(run())
+        assert events.stats()["overflows"] == 1
+        assert events.stats()["subscribers"] == 0
+        assert len(received) < 4
+        print(f"✓ Slow stream closed after {len(received)} events")
@@ -0,0 +1,78 @@
+"""
+Answer cache tests - normalization, near-duplicate hits, scoping and eviction (no LLM)
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+from answer_cache import AnswerCache, normalize
+
+ANSWER = "Fotosyntéza je proces, pri ktorom rastliny premieňajú svetlo na energiu. 🌱"
+
+
+class TestNormalize:
+    """Case, diacritics, punctuation and stop words"""
+
+    def test_normalize(self):
+        """Test that phrasing noise disappears"""
+        assert normalize("Čo to je FOTOSYNTÉZA??") == "fotosynteza"
+        assert normalize("  co je   fotosynteza ") == "fotosynteza"
+        print("✓ Questions normalized")
+
+
+class TestAnswerCache:
+    """MinHash/LSH lookups"""
+
+    def test_near_duplicate_hit_and_miss(self):
+        """Test that rephrased questions hit and different questions miss"""
+        cache = AnswerCache(threshold=0.8, max_entries=100, ttl_seconds=60)
+        cache.put("g1:abc", "Čo je fotosyntéza?", ANSWER)
+        assert cache.get("g1:abc", "co je fotosynteza") == ANSWER
+        assert cache.get("g1:abc", "Prosím, čo to je fotosyntéza?!") == ANSWER
+        assert cache.get("g1:abc", "Čo je fotosyntéza a dýchanie rastlín?") is None
+        assert cache.get("g1:abc", "Čo je mitóza?") is None
+        stats = cache.stats()
+        assert (stats["lookups"], stats["hits"]) == (4, 2)
+        assert stats["hit_rate"] == 0.5
+        print(f"✓ Hit rate {stats['hit_rate']}, {stats['avg_lookup_ms']} ms per lookup")
+
+    def test_numbers_and_operators_must_match(self):
+        """Test that math questions differing only in a number or operator never share an answer"""
+        cache = AnswerCache(threshold=0.8, max_entries=100, ttl_seconds=60)
+        cache.put("g1:abc", "Vyrieš rovnicu 2x + 5 = 15", "x = 5")
+        cache.put("g1:abc", "Zderivuj funkciu x^2 + 3x", "2x + 3")
+        cache.put("g1:abc", "Koľko je 1234 krát 5678?", "7006652")
+        assert cache.get("g1:abc", "Vyrieš rovnicu 2x + 5 = 17") is None
+        assert cache.get("g1:abc", "Vyrieš rovnicu 2x - 5 = 15") is None
+        assert cache.get("g1:abc", "Zderivuj funkciu x^3 + 3x") is None
+        assert cache.get("g1:abc", "Koľko je 1234 krát 5679?") is None
+        assert cache.get("g1:abc", "vyries rovnicu 2x+5=15") == "x = 5"
+        assert cache.get("g1:abc", "Koľko je 1234 krát 5678") == "7006652"
+        print("✓ Near-miss math questions are not served a cached answer")
+
+    def test_scope_and_short_questions(self):
+        """Test that other grades or source sets never share answers and greetings are not cached"""
+        cache = AnswerCache(threshold=0.8, max_entries=100, ttl_seconds=60)
+        cache.put("g1:abc", "Čo je fotosyntéza?", ANSWER)
+        assert cache.get("g2:abc", "Čo je fotosyntéza?") is None
+        assert cache.get("g1:def", "Čo je fotosyntéza?") is None
+        cache.put("g1:abc", "Ahoj", "Ahoj! 👋")
+        assert cache.get("g1:abc", "Ahoj") is None
+        print("✓ Scopes isolated")
+
+    def test_lru_eviction_and_ttl(self):
+        """Test that the cache stays bounded and expired answers are dropped"""
+        cache = AnswerCache(threshold=0.8, max_entries=2, ttl_seconds=60)
+        for topic in ("fotosyntéza", "mitóza", "Pytagorova veta"):
+            cache.put("*:x", f"Čo je {topic}?", topic)
+        assert cache.stats()["entries"] == 2
+        assert cache.stats()["evictions"] == 1
+        assert cache.get("*:x", "Čo je fotosyntéza?") is None
+        assert cache.get("*:x", "Čo je mitóza?") == "mitóza"
+
+        expired = AnswerCache(threshold=0.8, max_entries=10, ttl_seconds=0)
+        expired.put("*:x", "Čo je fotosyntéza?", ANSWER)
+        assert expired.get("*:x", "Čo je fotosyntéza?") is None
+        assert expired.stats()["entries"] == 0
+        print("✓ Bounded and expiring")
@@ -0,0 +1,74 @@
+"""
+Audit log tests - batched background writes, back-pressure and retries (in-memory collection)
+"""
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+from audit import AuditLog, changes
+
+ADMIN = {"id": "a1", "email": "admin@pocketbuddy.sk"}
+
+
+class FakeCollection:
+    def __init__(self, fail_times=0):
+        self.docs = []
+        self.calls = 0
+        self.fail_times = fail_times
+
+    async def insert_many(self, docs, ordered=True):
+        self.calls += 1
+        if self.fail_times:
+            self.fail_times -= 1
+            raise ConnectionError("Mongo nedostupné")
+        self.docs.extend(docs)
+
+
+class TestAuditLog:
+    """Queue, writer and back-pressure"""
+
+    def test_events_written_in_batches(self):
+        """Test that queued events are stored with one insert per batch"""
+        collection = FakeCollection()
+        log = AuditLog(lambda: collection, batch_size=10)
+
+        async def run():
+            for i in range(25):
+                await log.record(ADMIN, "user.update", "user", f"u{i}", {"first_name": ["A", "B"]})
+            writer = asyncio.create_task(log.run())
+            await asyncio.sleep(0.01)
+            writer.cancel()
+
+        asyncio.run(run())
+        assert len(collection.docs) == 25
+        assert collection.calls == 3
+        assert collection.docs[0]["actor_email"] == "admin@pocketbuddy.sk"
+        assert log.stats()["queued"] == 0
+        print(f"✓ 25 events in {collection.calls} inserts")
+
+    def test_back_pressure_and_retry(self):
+        """Test that a full queue drops after the timeout and a failed batch is retried"""
+        collection = FakeCollection(fail_times=1)
+        log = AuditLog(lambda: collection, max_queue=2, put_timeout=0.01, retry_seconds=0)
+
+        async def run():
+            for i in range(3):
+                await log.record(ADMIN, "user.delete", "user", f"u{i}")
+            writer = asyncio.create_task(log.run())
+            await asyncio.sleep(0.01)
+            writer.cancel()
+
+        asyncio.run(run())
+        stats = log.stats()
+        assert (stats["recorded"], stats["dropped"], stats["written"]) == (2, 1, 2)
+        assert collection.calls == 2
+        print("✓ Dropped on a full queue, failed batch retried")
+
+    def test_changes(self):
+        """Test that only changed fields are recorded"""
+        before = {"first_name": "Ján", "last_name": "Novák", "is_active": True}
+        after = {"first_name": "Jana", "is_active": True, "updated_at": "2025-01-01"}
+        assert changes(before, after) == {"first_name": ["Ján", "Jana"]}
+        print("✓ Field changes recorded")
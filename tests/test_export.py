@@ -0,0 +1,50 @@
+"""
+Export encoder tests - CSV cells, formula injection and gzip framing
+"""
+import asyncio
+import csv
+import gzip
+import io
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+from export import encode
+
+COLUMNS = ["email", "content", "score", "created_at"]
+
+
+async def rows(items):
+    for item in items:
+        yield item
+
+
+def export_csv(items, gzip_output=False):
+    async def collect():
+        return b"".join([chunk async for chunk in encode(rows(items), "csv", COLUMNS, gzip_output)])
+
+    data = asyncio.run(collect())
+    if gzip_output:
+        data = gzip.decompress(data)
+    return list(csv.DictReader(io.StringIO(data.decode("utf-8-sig"))))
+
+
+class TestCsvExport:
+    """CSV encoding of user content"""
+
+    def test_formula_cells_are_escaped(self):
+        """Test that cells a spreadsheet would evaluate are prefixed with an apostrophe"""
+        created = datetime(2025, 3, 1, 8, 0, tzinfo=timezone.utc)
+        parsed = export_csv([
+            {"email": "=HYPERLINK(\"http://zle.sk\")", "content": "+421 900 000 000", "score": -3, "created_at": created},
+            {"email": "@SUM(A1)", "content": "-1 je záporné", "score": 5, "created_at": None},
+            {"email": "\tx", "content": "\rzle", "score": 0, "created_at": None},
+            {"email": "jana@skola.sk", "content": "Čo je 2 + 2 = 4?", "score": 1, "created_at": None},
+        ], gzip_output=True)
+        assert [row["email"] for row in parsed] == ["'=HYPERLINK(\"http://zle.sk\")", "'@SUM(A1)", "'\tx", "jana@skola.sk"]
+        assert [row["content"] for row in parsed] == ["'+421 900 000 000", "'-1 je záporné", "'\rzle", "Čo je 2 + 2 = 4?"]
+        # Numbers and dates are not user text
+        assert parsed[0]["score"] == "-3" and parsed[0]["created_at"] == created.isoformat()
+        print("✓ Formula-like cells escaped")
@@ -0,0 +1,50 @@
+"""
+Incremental JSON array parser tests - chunked input, prose around the array, broken elements
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+from json_stream import JsonArrayStream, parse_array
+
+RESPONSE = (
+    'Jasné! [poznámka] Tu sú kartičky 📚:\n'
+    '[\n  {"otazka": "Čo je {x}?", "odpoved": "Premenná \\"x\\" [číslo]"},\n'
+    '  {"otazka": "Druhá", "odpoved": "áno"}\n]\n'
+    'Veľa šťastia! {"otazka": "mimo poľa"} ]'
+)
+
+
+class TestJsonArrayStream:
+    """Objects come out as soon as they are closed"""
+
+    def test_every_chunk_size_gives_the_same_items(self):
+        """Test that the result does not depend on where the chunks are cut"""
+        expected = [
+            {"otazka": "Čo je {x}?", "odpoved": 'Premenná "x" [číslo]'},
+            {"otazka": "Druhá", "odpoved": "áno"},
+        ]
+        for size in (1, 2, 7, len(RESPONSE)):
+            parser = JsonArrayStream()
+            items = []
+            for i in range(0, len(RESPONSE), size):
+                items += parser.feed(RESPONSE[i:i + size])
+            assert items == expected, size
+            assert parser.done
+        print("✓ Same items for every chunk size")
+
+    def test_object_emitted_before_array_closes(self):
+        """Test that the first object is returned before the rest of the array arrives"""
+        parser = JsonArrayStream()
+        assert parser.feed('[{"otazka": "A", "odpoved": "a"}, {"otazka": "B",') == [{"otazka": "A", "odpoved": "a"}]
+        assert not parser.done
+        assert parser.feed(' "odpoved": "b"}') == [{"otazka": "B", "odpoved": "b"}]
+        print("✓ Objects emitted incrementally")
+
+    def test_broken_elements_and_missing_end(self):
+        """Test that broken or non-object elements are skipped and an unclosed array still yields"""
+        items = parse_array('[{"a": 1}, {"b": 2,,}, "text", [1, 2], {"c": 3}, {"d": ')
+        assert items == [{"a": 1}, {"c": 3}]
+        assert parse_array("Prepáč, nerozumiem.") == []
+        print("✓ Broken elements skipped")
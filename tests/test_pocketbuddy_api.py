@@ -2,11 +2,15 @@
 PocketBuddy API Tests - Slovak AI Assistant for Secondary Schools
 Tests: Authentication, Admin, Flashcards, Quiz, Chat, Subjects, AI Sources
 """
+import gzip
+import json
 import pytest
 import requests
 import os
 import time
 
+from tests.query_budget import assert_max_queries
+
 BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', 'https://learndash-slovak.preview.emergentagent.com')
 
 # Test credentials
@@ -24,7 +28,20 @@ class TestHealthAndSeed:
         assert data["message"] == "PocketBuddy API"
         assert data["version"] == "1.0.0"
         print("✓ API root endpoint working")
-    
+
+    def test_health_probes(self):
+        """Test liveness and readiness probes"""
+        response = requests.get(f"{BASE_URL}/api/health/live")
+        assert response.status_code == 200
+        assert response.json()["status"] == "ok"
+
+        response = requests.get(f"{BASE_URL}/api/health/ready")
+        assert response.status_code == 200
+        data = response.json()
+        assert data["status"] == "ready"
+        assert "pool" in data
+        print(f"✓ Health probes OK, mongo ping {data['mongo_ping_ms']} ms")
+
     def test_seed_data(self):
         """Test seed data creation"""
         response = requests.post(f"{BASE_URL}/api/seed")
@@ -135,6 +152,156 @@ class TestAdminEndpoints:
         data = response.json()
         assert isinstance(data, list)
         print(f"✓ Got {len(data)} pending registration requests")
+    
+    def test_get_llm_stats(self, admin_token):
+        """Test LLM backend and coalescing stats"""
+        response = requests.get(f"{BASE_URL}/api/admin/llm/stats", headers={
+            "Authorization": f"Bearer {admin_token}"
+        })
+        assert response.status_code == 200
+        data = response.json()
+        assert "backend" in data
+        assert "coalesced" in data["coalescing"]
+        print(f"✓ LLM stats: backend={data['backend']}, coalescing={data['coalescing']}")
+    
+    def test_get_llm_usage(self, admin_token):
+        """Test per-user daily LLM usage rollups"""
+        response = requests.get(f"{BASE_URL}/api/admin/llm/usage", headers={
+            "Authorization": f"Bearer {admin_token}"
+        })
+        assert response.status_code == 200
+        data = response.json()
+        assert isinstance(data["rows"], list)
+        assert "calls" in data["totals"]
+        assert data["total_rows"] >= len(data["rows"])
+        page = requests.get(f"{BASE_URL}/api/admin/llm/usage", params={"limit": 1}, headers={
+            "Authorization": f"Bearer {admin_token}"
+        }).json()
+        # Totals cover every rollup, not just the page
+        assert page["totals"] == data["totals"] and len(page["rows"]) <= 1
+        assert page["truncated"] == (data["total_rows"] > 1)
+        print(f"✓ LLM usage: {data['totals']} over {data['total_rows']} rollups")
+
+    def test_export_users_csv(self, admin_token):
+        """Test streaming CSV export of users without password hashes"""
+        response = requests.get(f"{BASE_URL}/api/admin/export/users", params={"format": "csv"}, headers={
+            "Authorization": f"Bearer {admin_token}"
+        })
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/csv")
+        text = response.content.decode("utf-8-sig")
+        assert text.splitlines()[0].startswith("id,email,")
+        assert ADMIN_EMAIL in text
+        assert "password_hash" not in text
+        print(f"✓ Exported {len(text.splitlines()) - 1} users as CSV")
+
+    def test_export_chats_ndjson_gzip(self, admin_token):
+        """Test gzip-compressed NDJSON export of chat messages"""
+        response = requests.get(f"{BASE_URL}/api/admin/export/chats", params={"gzip": "true"}, headers={
+            "Authorization": f"Bearer {admin_token}"
+        })
+        assert response.status_code == 200
+        lines = gzip.decompress(response.content).decode("utf-8").splitlines()
+        for line in lines[:10]:
+            assert "message_id" in json.loads(line)
+        print(f"✓ Exported {len(lines)} chat messages as gzip NDJSON")
+
+    def test_audit_log_query(self, admin_token):
+        """Test querying the audit log by target and date"""
+        headers = {"Authorization": f"Bearer {admin_token}"}
+        response = requests.get(f"{BASE_URL}/api/admin/audit?target_type=user&limit=10", headers=headers)
+        assert response.status_code == 200
+        data = response.json()
+        assert "events" in data
+        assert all(event["target_type"] == "user" for event in data["events"])
+        response = requests.get(f"{BASE_URL}/api/admin/audit?date_from=2025-13-01", headers=headers)
+        assert response.status_code == 400
+        print(f"✓ Audit log returned {len(data['events'])} events")
+
+    def test_admin_event_stream(self, admin_token):
+        """Test that a new registration is pushed to the admin event stream"""
+        response = requests.get(f"{BASE_URL}/api/admin/events", params={"ticket": "neplatny"})
+        assert response.status_code == 401
+        # The login token itself does not open the stream, and a ticket is no login token
+        response = requests.get(f"{BASE_URL}/api/admin/events", params={"ticket": admin_token})
+        assert response.status_code == 401
+        ticket = requests.post(f"{BASE_URL}/api/admin/events/ticket", headers={
+            "Authorization": f"Bearer {admin_token}"
+        }).json()["ticket"]
+        assert requests.get(f"{BASE_URL}/api/auth/me", headers={"Authorization": f"Bearer {ticket}"}).status_code == 401
+        email = f"sse_{int(time.time() * 1000)}@test.sk"
+        with requests.get(f"{BASE_URL}/api/admin/events", params={"ticket": ticket},
+                          stream=True, timeout=10) as stream:
+            assert stream.status_code == 200
+            assert stream.headers["content-type"].startswith("text/event-stream")
+            requests.post(f"{BASE_URL}/api/auth/register", json={
+                "email": email, "password": "test123", "first_name": "SSE", "last_name": "Test", "role": "student"
+            })
+            event_type = None
+            for line in stream.iter_lines(decode_unicode=True):
+                if line.startswith("event: "):
+                    event_type = line[7:]
+                elif line.startswith("data: ") and event_type == "registration.created":
+                    if json.loads(line[6:])["email"] == email:
+                        break
+        print(f"✓ Registration of {email} pushed to the admin stream")
+
+    def test_request_profile(self, admin_token):
+        """Test that an admin can profile one request and download the collapsed stacks"""
+        headers = {"Authorization": f"Bearer {admin_token}"}
+        response = requests.get(f"{BASE_URL}/api/ai-sources", headers={**headers, "X-Profile": "1"})
+        assert response.status_code == 200
+        name = response.headers.get("X-Profile-File")
+        if name is None:
+            pytest.skip("Request profiling is disabled on this server")
+        listing = requests.get(f"{BASE_URL}/api/admin/profiles", headers=headers).json()
+        if name not in [p["name"] for p in listing["profiles"]]:
+            # Served by another worker; profiles are kept per worker
+            pytest.skip(f"Profile {name} is on another worker")
+        profile = requests.get(f"{BASE_URL}/api/admin/profiles/{name}", headers=headers)
+        assert profile.status_code == 200
+        assert all(line.rsplit(" ", 1)[1].isdigit() for line in profile.text.splitlines())
+        assert requests.get(f"{BASE_URL}/api/admin/profiles/..%2Fserver.py", headers=headers).status_code == 404
+        print(f"✓ Profiled request saved as {name}")
+
+    def test_tracemalloc_snapshot(self, admin_token):
+        """Test that tracemalloc can be started, snapshotted and stopped"""
+        headers = {"Authorization": f"Bearer {admin_token}"}
+        response = requests.post(f"{BASE_URL}/api/admin/profiling/tracemalloc/start", params={"frames": 5},
+                                 headers=headers)
+        assert response.status_code == 200
+        try:
+            response = requests.get(f"{BASE_URL}/api/admin/profiling/tracemalloc", params={"limit": 5},
+                                    headers=headers)
+            # Snapshots are per worker; another one may not be tracing
+            assert response.status_code in (200, 409)
+            if response.status_code == 200:
+                assert len(response.json()["top"]) <= 5
+        finally:
+            requests.post(f"{BASE_URL}/api/admin/profiling/tracemalloc/stop", headers=headers)
+        print("✓ tracemalloc snapshot taken")
+
+    def test_storage_gc_dry_run(self, admin_token):
+        """Test that a dry-run sweep reports reclaimable attachments without deleting"""
+        response = requests.post(f"{BASE_URL}/api/admin/storage/gc", params={"dry_run": "true"}, headers={
+            "Authorization": f"Bearer {admin_token}"
+        })
+        assert response.status_code == 200
+        data = response.json()
+        assert data["dry_run"] is True
+        assert data["bytes_reclaimed"] >= 0
+        print(f"✓ Storage GC dry run: {data['orphaned_attachments']} orphaned, {data['unreferenced_files']} unreferenced files")
+
+    def test_chat_retention_dry_run(self, admin_token):
+        """Test that a dry-run retention pass reports without purging or archiving"""
+        response = requests.post(f"{BASE_URL}/api/admin/retention", params={"dry_run": "true"}, headers={
+            "Authorization": f"Bearer {admin_token}"
+        })
+        assert response.status_code == 200
+        data = response.json()
+        assert data["dry_run"] is True
+        assert data["chats_purged"] >= 0 and data["chats_archived"] >= 0
+        print(f"✓ Retention dry run: {data['chats_purged']} to purge, {data['chats_archived']} to archive")
 
 
 class TestSubjects:
@@ -238,6 +405,36 @@ class TestFlashcards:
         print(f"✓ Generated {len(data['flashcards'])} flashcards for topic: {data['topic']}")
         if len(data["flashcards"]) > 0:
             print(f"  Sample: {data['flashcards'][0]}")
+    
+    def test_generate_flashcards_stream(self, admin_token):
+        """Test NDJSON streaming: one card per line, then a closing summary line"""
+        response = requests.post(f"{BASE_URL}/api/flashcards/generate?stream=true",
+            json={"topic": "Fotosyntéza", "count": 3},
+            headers={"Authorization": f"Bearer {admin_token}"},
+            timeout=60
+        )
+        assert response.status_code == 200
+        assert response.headers["Content-Type"].startswith("application/x-ndjson")
+        lines = [json.loads(line) for line in response.text.splitlines() if line]
+        assert lines[-1]["done"] is True
+        assert all("otazka" in card and "odpoved" in card for card in lines[:-1])
+        print(f"✓ Streamed {len(lines) - 1} flashcards")
+    
+    def test_review_due_flashcards(self, admin_token):
+        """Test that due cards can be reviewed in one batch and are rescheduled"""
+        headers = {"Authorization": f"Bearer {admin_token}"}
+        response = requests.get(f"{BASE_URL}/api/flashcards/due?limit=5", headers=headers)
+        assert response.status_code == 200
+        cards = response.json()["cards"]
+        if not cards:
+            pytest.skip("No due flashcards")
+        reviews = [{"card_id": card["id"], "quality": 4} for card in cards]
+        response = requests.post(f"{BASE_URL}/api/flashcards/review", json={"reviews": reviews}, headers=headers)
+        assert response.status_code == 200
+        data = response.json()
+        assert data["updated"] == len(cards)
+        assert all(card["interval_days"] >= 1 for card in data["cards"])
+        print(f"✓ Reviewed {data['updated']} flashcards")
 
 
 class TestQuiz:
@@ -350,6 +547,30 @@ class TestChat:
             print(f"✓ Got {len(data)} messages from chat")
         else:
             print("⚠ No chats available to test messages")
+    
+    def test_search_chat_history(self, admin_token):
+        """Test diacritic-insensitive search across own chats"""
+        create_response = requests.post(f"{BASE_URL}/api/chats", 
+            json={"title": "TEST_Search"},
+            headers={"Authorization": f"Bearer {admin_token}"}
+        )
+        chat_id = create_response.json()["id"]
+        requests.post(f"{BASE_URL}/api/chats/{chat_id}/messages", 
+            json={"content": "Vysvetli mi fotosyntézu"},
+            headers={"Authorization": f"Bearer {admin_token}"},
+            timeout=60
+        )
+        
+        # Query without diacritics still matches
+        response = requests.get(f"{BASE_URL}/api/chats/search", params={"q": "fotosyntezu"}, headers={
+            "Authorization": f"Bearer {admin_token}"
+        })
+        assert response.status_code == 200
+        data = response.json()
+        assert any(hit["chat_id"] == chat_id for hit in data)
+        hit = next(hit for hit in data if hit["chat_id"] == chat_id)
+        assert hit["highlights"]
+        print(f"✓ Search found {len(data)} messages, snippet: {hit['snippet'][:60]}")
 
 
 class TestTopics:
@@ -373,6 +594,65 @@ class TestTopics:
         assert "topics" in data
         assert "subjects" in data
         print(f"✓ Got {len(data['topics'])} topics and {len(data['subjects'])} subjects")
+    
+    def test_topics_etag_revalidation(self, admin_token):
+        """Test that sending the ETag back returns 304 without a body"""
+        headers = {"Authorization": f"Bearer {admin_token}"}
+        response = requests.get(f"{BASE_URL}/api/topics", headers=headers)
+        etag = response.headers.get("ETag")
+        assert etag
+        response = requests.get(f"{BASE_URL}/api/topics", headers={**headers, "If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.content == b""
+        print(f"✓ Topics revalidated with ETag {etag}")
+
+
+class TestQueryBudgets:
+    """Per-endpoint DB query budgets - catches N+1 regressions"""
+    
+    @pytest.fixture
+    def admin_token(self):
+        response = requests.post(f"{BASE_URL}/api/auth/login", json={
+            "email": ADMIN_EMAIL,
+            "password": ADMIN_PASSWORD
+        })
+        return response.json()["token"]
+    
+    @pytest.mark.parametrize("endpoint,budget", [
+        ("/api/auth/me", 1),
+        ("/api/grades", 2),
+        ("/api/subjects", 2),
+        ("/api/chats", 2),
+        ("/api/topics", 3),
+        ("/api/ai-sources", 2),
+    ])
+    def test_endpoint_query_budget(self, admin_token, endpoint, budget):
+        """Test that read endpoints stay within their query budget"""
+        response = requests.get(f"{BASE_URL}{endpoint}", headers={
+            "Authorization": f"Bearer {admin_token}"
+        })
+        assert response.status_code == 200
+        assert "X-Request-ID" in response.headers
+        count = assert_max_queries(response, budget)
+        print(f"✓ {endpoint}: {count} queries (budget {budget})")
+    
+    def test_send_message_query_budget(self, admin_token):
+        """Test that a chat turn needs at most 5 DB commands"""
+        create_response = requests.post(f"{BASE_URL}/api/chats", 
+            json={"title": "TEST_Query budget"},
+            headers={"Authorization": f"Bearer {admin_token}"}
+        )
+        chat_id = create_response.json()["id"]
+        
+        response = requests.post(f"{BASE_URL}/api/chats/{chat_id}/messages", 
+            json={"content": "Ahoj!"},
+            headers={"Authorization": f"Bearer {admin_token}"},
+            timeout=60
+        )
+        assert response.status_code == 200
+        # user + chat/sources lookups + insert_many + chat update
+        count = assert_max_queries(response, 5)
+        print(f"✓ send_message: {count} queries")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,100 @@
+"""
+Profiling tests - per-context sampling, collapsed-stack output and the profile directory
+"""
+import asyncio
+import os
+import signal
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+from profiling import PROFILE_NAME, ProfileStore, RequestProfile, SamplingProfiler, current_profile, profile_name
+
+
+def busy_loop(seconds):
+    total = 0
+    deadline = time.process_time() + seconds
+    while time.process_time() < deadline:
+        total += sum(range(200))
+    return total
+
+
+class TestSamplingProfiler:
+    """Only the marked context is sampled"""
+
+    @pytest.mark.skipif(not hasattr(signal, "setitimer"), reason="needs setitimer")
+    def test_samples_marked_task_only(self):
+        """Test that a profiled task is sampled while a concurrent unmarked task is not"""
+        profiler = SamplingProfiler(0.001)
+        profile = RequestProfile("test.folded")
+
+        async def marked():
+            current_profile.set(profile)
+            for _ in range(5):
+                busy_loop(0.04)
+                await asyncio.sleep(0)
+
+        async def unmarked():
+            for _ in range(5):
+                busy_loop(0.04)
+                await asyncio.sleep(0)
+
+        async def run():
+            profiler.start(profile)
+            try:
+                await asyncio.gather(marked(), unmarked())
+            finally:
+                assert profiler.stop(profile)
+
+        asyncio.run(run())
+        assert profile.sample_count > 0
+        assert profile.duration_ms > 0 and not profiler.stop(profile)
+        assert signal.getsignal(signal.SIGPROF) in (signal.SIG_DFL, None)
+        stacks = list(profile.samples)
+        assert all("marked (test_profiling.py" in stack for stack in stacks)
+        assert not any("unmarked" in stack for stack in stacks)
+        assert any(stack.endswith(")") and "busy_loop" in stack for stack in stacks)
+        print(f"✓ {profile.sample_count} samples, all from the marked task")
+
+    def test_collapsed_format(self):
+        """Test that the output is one 'frame;frame;frame count' line per stack, hottest first"""
+        profile = RequestProfile("test.folded")
+        profile.samples["a;b;c"] += 3
+        profile.samples["a;d"] += 1
+        assert profile.collapsed() == "a;b;c 3\na;d 1\n"
+        assert profile.sample_count == 4
+        print("✓ Collapsed stacks ready for flamegraph tools")
+
+
+class TestProfileStore:
+    """Saved profiles are pruned and looked up by validated name"""
+
+    def test_prunes_and_validates(self, tmp_path):
+        """Test that only the newest profiles are kept and odd names are refused"""
+        store = ProfileStore(tmp_path / "profiles", keep=2)
+        names = []
+        for i in range(3):
+            profile = RequestProfile(profile_name("GET", "/api/ai-sources", f"request-{i}"))
+            profile.name = f"{i}-{profile.name}"
+            profile.samples["main;handler"] = i + 1
+            path = store.save(profile)
+            os.utime(path, (1000 + i, 1000 + i))
+            names.append(profile.name)
+
+        assert [p["name"] for p in store.list()] == [names[2], names[1]]
+        assert store.path(names[0]) is None
+        assert store.path(names[2]).read_text() == "main;handler 3\n"
+        assert store.path("../server.py") is None and store.path("..") is None
+        assert names[0].endswith("-get-api_ai-sources-request-.folded")
+        # X-Request-ID is client-supplied
+        hostile = profile_name("GET", "/api/ai-sources", "../../x")
+        assert "/" not in hostile and hostile.endswith("-_x.folded")
+        assert PROFILE_NAME.match(hostile)
+        path = store.save(RequestProfile(hostile))
+        assert path.parent == store.directory and store.path(hostile) == path
+        assert profile_name("GET", "/", "").endswith("-get-root-request.folded")
+        print("✓ Profile directory pruned to the newest files, traversal refused")
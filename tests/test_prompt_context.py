@@ -0,0 +1,50 @@
+"""
+Prompt context cache tests - hits, invalidation, expiry and the entry bound
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+from prompt_context import PromptContextCache
+
+CONTEXT = "\nMáš prístup k nasledujúcim študijným materiálom:\n- Fotosyntéza.pdf\n"
+
+
+class TestPromptContextCache:
+    """Versioned, expiring, bounded"""
+
+    def test_hit_and_invalidate(self):
+        """Test that a stored context hits until the sources change, and stale puts are dropped"""
+        cache = PromptContextCache(ttl_seconds=60, max_entries=10)
+        version = cache.version
+        cache.put(("chat", "g1"), CONTEXT, version)
+        assert cache.get(("chat", "g1")) == CONTEXT
+        cache.invalidate()
+        assert cache.get(("chat", "g1")) is None
+        # Computed before the invalidation
+        cache.put(("chat", "g1"), CONTEXT, version)
+        assert cache.get(("chat", "g1")) is None
+        assert (cache.hits, cache.misses) == (1, 2)
+        print("✓ Invalidation drops current and in-flight entries")
+
+    def test_bounded_by_max_entries(self):
+        """Test that random subject ids cannot grow the cache past its bound"""
+        cache = PromptContextCache(ttl_seconds=60, max_entries=3)
+        cache.put(("chat", "g1"), CONTEXT, cache.version)
+        for i in range(100):
+            cache.put(("study", f"nahodny-{i}"), "", cache.version)
+            # The chat context is in use, so it stays
+            assert cache.get(("chat", "g1")) == CONTEXT
+        stats = cache.stats()
+        assert stats["entries"] == 3 and stats["evictions"] == 98
+        assert cache.get(("study", "nahodny-0")) is None
+        print(f"✓ {stats['evictions']} entries evicted, {stats['entries']} kept")
+
+    def test_expired_entries_are_dropped(self):
+        """Test that an expired entry misses and is removed"""
+        cache = PromptContextCache(ttl_seconds=0, max_entries=10)
+        cache.put(("study", None), CONTEXT, cache.version)
+        assert cache.get(("study", None)) is None
+        assert cache.stats()["entries"] == 0
+        print("✓ Expired entry removed on lookup")
@@ -0,0 +1,194 @@
+"""
+Chat retention tests - purge, archive and restore, including a restore racing the archiver (mongomock)
+"""
+import asyncio
+import sys
+from datetime import timedelta
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+from retention import ChatRetention, load_archived_messages, restore_chat
+from timestamps import utcnow
+
+OLD = utcnow() - timedelta(days=400)
+
+
+def fresh_db():
+    return mongomock_motor.AsyncMongoMockClient(tz_aware=True)["retention"]
+
+
+async def seed_chat(db, chat_id, messages=3, **fields):
+    await db.chats.insert_one({"id": chat_id, "user_id": "u1", "is_deleted": False, "updated_at": OLD, **fields})
+    await db.messages.insert_many([
+        {"id": f"{chat_id}-m{i}", "chat_id": chat_id, "user_id": "u1", "sender_type": "user",
+         "content": f"Otázka {i}", "created_at": OLD + timedelta(minutes=i)}
+        for i in range(messages)
+    ])
+
+
+async def message_ids(db, chat_id):
+    hot = await db.messages.distinct("id", {"chat_id": chat_id})
+    archived = [m["id"] for m in await load_archived_messages(db, chat_id)]
+    return sorted(set(hot) | set(archived))
+
+
+class Proxy:
+    """Collection/database wrapper that runs a hook before one method"""
+
+    def __init__(self, target, hooks):
+        self._target = target
+        self._hooks = hooks
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        hook = self._hooks.get(name)
+        if isinstance(hook, dict):
+            return Proxy(attr, hook)
+        if hook is not None:
+            async def hooked(*args, **kwargs):
+                await hook()
+                return await attr(*args, **kwargs)
+            return hooked
+        return attr
+
+    def __getitem__(self, name):
+        return self._target[name]
+
+
+def retention(db, **kwargs):
+    return ChatRetention(lambda: db, deleted_days=kwargs.get("deleted_days", 30),
+                         inactive_days=kwargs.get("inactive_days", 180), pause_seconds=0)
+
+
+class TestRetention:
+    """Purge and archive passes"""
+
+    def test_purge_soft_deleted(self):
+        """Test that old soft-deleted chats lose their messages and archive, and attachments are unlinked"""
+        async def run():
+            db = fresh_db()
+            await seed_chat(db, "gone", is_deleted=True, deleted_at=OLD)
+            await seed_chat(db, "kept", updated_at=utcnow())
+            await db.chat_attachments.insert_one({"id": "a1", "message_id": "gone-m0", "created_at": OLD})
+            dry = await retention(db).sweep(dry_run=True)
+            assert dry["chats_purged"] == 1 and await db.chats.count_documents({"id": "gone"}) == 1
+            report = await retention(db).sweep()
+            assert (report["chats_purged"], report["messages_purged"]) == (1, 3)
+            assert await db.chats.count_documents({}) == 1
+            assert await message_ids(db, "gone") == []
+            assert len(await message_ids(db, "kept")) == 3
+            assert (await db.chat_attachments.find_one({"id": "a1"}))["message_id"] is None
+
+        asyncio.run(run())
+        print("✓ Soft-deleted chat purged, attachment unlinked")
+
+    def test_archive_and_restore(self):
+        """Test that an inactive chat moves into a compressed archive and back"""
+        async def run():
+            db = fresh_db()
+            await seed_chat(db, "old")
+            report = await retention(db).sweep()
+            assert report["chats_archived"] == 1 and report["messages_archived"] == 3
+            assert (await db.chats.find_one({"id": "old"}))["archived"] is True
+            assert await db.messages.count_documents({"chat_id": "old"}) == 0
+            assert [m["created_at"] for m in await load_archived_messages(db, "old")][0] == OLD
+
+            await restore_chat(db, "old")
+            assert (await db.chats.find_one({"id": "old"}))["archived"] is False
+            assert await db.messages.count_documents({"chat_id": "old"}) == 3
+            assert await db.chat_archives.count_documents({}) == 0
+
+        asyncio.run(run())
+        print("✓ Inactive chat archived and restored")
+
+
+class TestRestoreRace:
+    """restore_chat landing between the archiver's flag and its delete"""
+
+    @pytest.mark.parametrize("before", ["delete_many", "find_one"])
+    def test_restore_between_flag_and_delete(self, before):
+        """Test that no message is lost when a write restores the chat while it is being archived"""
+        async def run():
+            db = fresh_db()
+            await seed_chat(db, "race")
+            restored = []
+
+            async def restore_once():
+                if not restored:
+                    restored.append(True)
+                    await restore_chat(db, "race")
+
+            # Before the hot delete, or between the delete and the archiver's re-check
+            hooks = {"messages": {"delete_many": restore_once}} if before == "delete_many" \
+                else {"chats": {"find_one": restore_once}}
+            report = await retention(Proxy(db, hooks)).sweep()
+
+            assert restored and report["chats_archived"] == 0
+            assert (await db.chats.find_one({"id": "race"}))["archived"] is False
+            assert await db.chat_archives.count_documents({}) == 0
+            assert await db.messages.count_documents({"chat_id": "race"}) == 3
+            assert len(await db.messages.distinct("id", {"chat_id": "race"})) == 3
+
+        asyncio.run(run())
+        print(f"✓ Restore before {before} kept every message exactly once")
+
+    def test_concurrent_restores(self):
+        """Test that two writes restoring the same chat insert its messages once"""
+        async def run():
+            db = fresh_db()
+            await seed_chat(db, "twice")
+            await retention(db).sweep()
+            await asyncio.gather(restore_chat(db, "twice"), restore_chat(db, "twice"))
+            assert await db.messages.count_documents({"chat_id": "twice"}) == 3
+
+        asyncio.run(run())
+        print("✓ Concurrent restores inserted each message once")
+
+
+class TestConcurrentArchivers:
+    """Sweeps of several workers meeting on one chat"""
+
+    def test_second_archiver_between_write_and_flag(self):
+        """Test that a worker archiving the same chat mid-way through another's run loses no message"""
+        async def run():
+            db = fresh_db()
+            await seed_chat(db, "shared")
+            other = []
+
+            async def other_worker():
+                if not other:
+                    other.append(await retention(db).sweep())
+
+            # Worker B runs a whole sweep after A wrote its archive, before A flags the chat
+            report = await retention(Proxy(db, {"chat_archives": {"replace_one": other_worker}})).sweep()
+
+            assert report["chats_archived"] + other[0]["chats_archived"] == 1
+            chat = await db.chats.find_one({"id": "shared"})
+            assert chat["archived"] is True and "archive_lease" not in chat
+            assert await db.chat_archives.count_documents({"chat_id": "shared"}) == 1
+            assert await message_ids(db, "shared") == ["shared-m0", "shared-m1", "shared-m2"]
+
+        asyncio.run(run())
+        print("✓ Second worker skipped a chat leased by the first")
+
+    def test_concurrent_sweeps(self):
+        """Test that two workers sweeping at once archive every chat exactly once"""
+        async def run():
+            db = fresh_db()
+            for i in range(5):
+                await seed_chat(db, f"c{i}")
+            reports = await asyncio.gather(retention(db).sweep(), retention(db).sweep())
+
+            assert sum(r["chats_archived"] for r in reports) == 5
+            assert await db.chats.count_documents({"archived": True}) == 5
+            assert await db.chat_archives.count_documents({}) == 5
+            for i in range(5):
+                assert len(await message_ids(db, f"c{i}")) == 3
+
+        asyncio.run(run())
+        print("✓ Concurrent sweeps archived each chat once")
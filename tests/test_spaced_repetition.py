@@ -0,0 +1,65 @@
+"""
+Spaced repetition tests - SM-2 intervals, ease factor and LLM card validation (no database)
+"""
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+from spaced_repetition import MIN_EASE, initial_state, parse_time, schedule, valid_cards
+
+NOW = datetime(2025, 3, 1, 8, 0, tzinfo=timezone.utc)
+
+
+class TestSchedule:
+    """SM-2 review scheduling"""
+
+    def test_intervals_grow_with_successful_reviews(self):
+        """Test the 1, 6, 6*EF day progression for good answers"""
+        card = initial_state(NOW)
+        assert card["due_at"] == NOW
+        intervals = []
+        for _ in range(4):
+            card.update(schedule(card, 4, NOW))
+            intervals.append(card["interval_days"])
+        assert intervals[:2] == [1, 6]
+        assert intervals[2] == round(6 * 2.5)
+        assert card["repetitions"] == 4
+        assert card["due_at"] == NOW + timedelta(days=intervals[-1])
+        print(f"✓ Intervals {intervals}")
+
+    def test_failed_review_starts_over(self):
+        """Test that a failed review resets repetitions and lowers the ease factor"""
+        card = {"ease_factor": 2.5, "interval_days": 15, "repetitions": 3}
+        updated = schedule(card, 1, NOW)
+        assert (updated["repetitions"], updated["interval_days"]) == (0, 1)
+        assert updated["ease_factor"] < 2.5
+        for _ in range(10):
+            card.update(schedule(card, 0, NOW))
+        assert card["ease_factor"] == MIN_EASE
+        print("✓ Failed review rescheduled for tomorrow")
+
+
+class TestInputs:
+    """LLM output and client timestamps"""
+
+    def test_valid_cards(self):
+        """Test that malformed cards are dropped"""
+        cards = valid_cards([
+            {"otazka": " Čo je fotosyntéza? ", "odpoved": "Premena svetla na energiu"},
+            {"otazka": "Bez odpovede"},
+            "text",
+            {"otazka": "", "odpoved": "x"},
+        ])
+        assert cards == [{"otazka": "Čo je fotosyntéza?", "odpoved": "Premena svetla na energiu"}]
+        assert valid_cards({"otazka": "x"}) == []
+        print("✓ Only complete cards kept")
+
+    def test_parse_time(self):
+        """Test that review times are normalized to UTC and capped at the server clock"""
+        assert parse_time("2025-03-01T09:00:00+02:00", NOW) == datetime(2025, 3, 1, 7, 0, tzinfo=timezone.utc)
+        assert parse_time("2030-01-01T00:00:00Z", NOW) == NOW
+        assert parse_time("2025-03-01T07:00:00", NOW) == NOW
+        assert parse_time("zajtra", NOW) == NOW
+        print("✓ Review times normalized")
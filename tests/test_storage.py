@@ -0,0 +1,126 @@
+"""
+Blob storage tests - local sharded backend, and S3 against a local MinIO when configured:
+
+    docker run -p 9000:9000 minio/minio server /data
+    S3_TEST_ENDPOINT_URL=http://localhost:9000 S3_TEST_BUCKET=pocketbuddy-test \
+    AWS_ACCESS_KEY_ID=minioadmin AWS_SECRET_ACCESS_KEY=minioadmin pytest tests/test_storage.py
+"""
+import asyncio
+import os
+import sys
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+from storage import LocalStorage, S3Storage, shard_path
+
+
+async def listed_keys(storage):
+    return sorted([blob.key async for blobs in storage.list_blobs(10) for blob in blobs])
+
+
+def round_trip(storage):
+    key = f"chat_{uuid.uuid4()}.txt"
+
+    async def run():
+        await storage.init()
+        assert not await storage.exists(key)
+        await storage.put(key, "Fotosyntéza".encode("utf-8"), "text/plain")
+        assert await storage.exists(key)
+        assert (await storage.get(key)).decode("utf-8") == "Fotosyntéza"
+        await storage.delete(key)
+        assert not await storage.exists(key)
+        # Deleting twice is not an error
+        await storage.delete(key)
+
+    asyncio.run(run())
+
+
+class TestLocalStorage:
+    """Hash-prefix sharded local directory"""
+
+    def test_round_trip(self, tmp_path):
+        """Test put, get, exists and delete"""
+        round_trip(LocalStorage(tmp_path))
+        print("✓ Local storage round trip")
+
+    def test_files_are_sharded(self, tmp_path):
+        """Test that files land in two levels of hash-prefix directories, not in the root"""
+        storage = LocalStorage(tmp_path)
+        keys = [f"attachment_{uuid.uuid4()}.pdf" for _ in range(50)]
+        for key in keys:
+            asyncio.run(storage.put(key, b"%PDF"))
+        assert not [p for p in tmp_path.iterdir() if p.is_file()]
+        for key in keys:
+            path = storage.path_for(key)
+            assert path.is_file()
+            assert path.relative_to(tmp_path).as_posix() == shard_path(key)
+        assert len({shard_path(k).split("/")[0] for k in keys}) > 10
+        print("✓ Uploads spread over shard directories")
+
+    def test_listing_skips_files_outside_the_layout(self, tmp_path):
+        """Test that only files at their own shard path are listed for the sweeper"""
+        storage = LocalStorage(tmp_path)
+        asyncio.run(storage.put("chat_a.pdf", b"%PDF"))
+        misplaced = tmp_path / "00" / "00" / "chat_b.pdf"
+        misplaced.parent.mkdir(parents=True, exist_ok=True)
+        misplaced.write_bytes(b"%PDF")
+        assert asyncio.run(listed_keys(storage)) == ["chat_a.pdf"]
+        print("✓ Misplaced file not listed")
+
+
+class FakePaginator:
+    def __init__(self, keys):
+        self.keys = keys
+        self.prefix = None
+
+    def paginate(self, Bucket, Prefix, PaginationConfig):
+        self.prefix = Prefix
+        modified = datetime(2025, 1, 1, tzinfo=timezone.utc)
+        return [{"Contents": [{"Key": key, "Size": 4, "LastModified": modified}
+                              for key in self.keys if key.startswith(Prefix)]}]
+
+
+class FakeS3Client:
+    def __init__(self, keys):
+        self.paginator = FakePaginator(keys)
+
+    def get_paginator(self, name):
+        return self.paginator
+
+
+class TestS3Listing:
+    """Bucket listing for the sweeper (no S3 needed)"""
+
+    def test_lists_only_sharded_keys_under_prefix(self):
+        """Test that objects outside the prefix or the shard layout are never offered for deletion"""
+        storage = S3Storage("bucket", prefix="/uploads/")
+        storage._client = FakeS3Client([
+            "uploads/" + shard_path("chat_a.pdf"),
+            "uploads/" + shard_path("chat_b.pdf"),
+            "uploads/chat_c.pdf",
+            "uploads/00/00/chat_d.pdf",
+            "backups/" + shard_path("chat_e.pdf"),
+        ])
+        assert asyncio.run(listed_keys(storage)) == ["chat_a.pdf", "chat_b.pdf"]
+        assert storage._client.paginator.prefix == "uploads/"
+        assert storage.object_key("chat_a.pdf") == "uploads/" + shard_path("chat_a.pdf")
+        print("✓ Only our own objects listed")
+
+
+@pytest.mark.skipif(not os.environ.get("S3_TEST_ENDPOINT_URL"), reason="S3_TEST_ENDPOINT_URL not set (MinIO)")
+class TestS3Storage:
+    """S3-compatible backend against MinIO"""
+
+    def test_round_trip(self):
+        """Test put, get, exists and delete"""
+        round_trip(S3Storage(
+            os.environ.get("S3_TEST_BUCKET", "pocketbuddy-test"),
+            endpoint_url=os.environ["S3_TEST_ENDPOINT_URL"],
+            region=os.environ.get("S3_REGION", "us-east-1"),
+        ))
+        print("✓ S3 storage round trip")
@@ -0,0 +1,131 @@
+"""
+Timestamp tests - parsing both stored formats, string-compatible responses and the resumable migration
+"""
+import asyncio
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+from pydantic import BaseModel
+
+from migrate_timestamps import migrate_collection
+from timestamps import IsoTimestamp, parse, utcnow
+
+NOW = datetime(2025, 3, 1, 8, 0, 0, 123000, tzinfo=timezone.utc)
+
+
+class Row(BaseModel):
+    created_at: IsoTimestamp
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+        self.count = None
+
+    def sort(self, key, direction):
+        self.docs = sorted(self.docs, key=lambda d: d[key])
+        return self
+
+    def limit(self, count):
+        self.count = count
+        return self
+
+    async def to_list(self, length):
+        return [dict(d) for d in self.docs[:self.count]]
+
+
+class BulkResult:
+    def __init__(self, modified_count):
+        self.modified_count = modified_count
+
+
+class FakeCollection:
+    def __init__(self, docs=None, fail_after_batches=None):
+        self.docs = docs or []
+        self.fail_after_batches = fail_after_batches
+
+    def find(self, query, projection=None):
+        after = query.get("_id", {}).get("$gt")
+        return FakeCursor([d for d in self.docs if after is None or d["_id"] > after])
+
+    async def find_one(self, query):
+        return next((d for d in self.docs if d["_id"] == query["_id"]), None)
+
+    async def bulk_write(self, ops, ordered=True):
+        if self.fail_after_batches is not None:
+            if self.fail_after_batches == 0:
+                raise ConnectionError("Mongo nedostupné")
+            self.fail_after_batches -= 1
+        modified = 0
+        for op in ops:
+            query, update = op._filter, op._doc
+            for doc in self.docs:
+                if all(doc.get(k) == v for k, v in query.items()):
+                    doc.update(update["$set"])
+                    modified += 1
+        return BulkResult(modified)
+
+    async def update_one(self, query, update, upsert=False):
+        doc = await self.find_one(query)
+        if doc is None:
+            doc = {"_id": query["_id"]}
+            self.docs.append(doc)
+        doc.update(update.get("$set", {}))
+        for k, v in update.get("$inc", {}).items():
+            doc[k] = doc.get(k, 0) + v
+
+
+class FakeDb:
+    def __init__(self, **collections):
+        self.collections = collections
+
+    def __getitem__(self, name):
+        return self.collections.setdefault(name, FakeCollection())
+
+
+class TestTimestamps:
+    """Both stored formats read the same"""
+
+    def test_parse_and_serialize(self):
+        """Test that ISO strings, aware and naive datetimes all parse to the same UTC instant"""
+        assert parse(NOW.isoformat()) == NOW
+        assert parse("2025-03-01T08:00:00.123Z") == NOW
+        assert parse(NOW.replace(tzinfo=None)) == NOW
+        assert parse(NOW.astimezone(timezone(timedelta(hours=1)))) == NOW
+        assert parse("včera") is None and parse(None) is None
+        assert Row(created_at=NOW).created_at == Row(created_at=NOW.isoformat()).created_at == NOW.isoformat()
+        assert utcnow().microsecond % 1000 == 0
+        print("✓ Strings and datetimes parse alike, responses stay ISO strings")
+
+
+class TestMigration:
+    """Batched, guarded, checkpointed conversion"""
+
+    def test_converts_and_resumes(self):
+        """Test that an interrupted run resumes from its checkpoint and leaves bad values alone"""
+        docs = [{"_id": i, "created_at": (NOW + timedelta(minutes=i)).isoformat()} for i in range(10)]
+        docs[3]["created_at"] = "neplatný dátum"
+        docs[4]["created_at"] = NOW
+        messages = FakeCollection(docs, fail_after_batches=2)
+        db = FakeDb(messages=messages)
+
+        async def run():
+            try:
+                await migrate_collection(db, "messages", ("created_at",), batch_size=3)
+            except ConnectionError:
+                pass
+            messages.fail_after_batches = None
+            return await migrate_collection(db, "messages", ("created_at",), batch_size=3)
+
+        totals = asyncio.run(run())
+        assert totals["resumed"] and totals["scanned"] == 4
+        assert all(isinstance(d["created_at"], datetime) for d in messages.docs if d["_id"] != 3)
+        assert messages.docs[3]["created_at"] == "neplatný dátum"
+        assert messages.docs[9]["created_at"] == NOW + timedelta(minutes=9)
+        checkpoint = asyncio.run(db["migrations"].find_one({"_id": "timestamps:messages"}))
+        assert checkpoint["done"] and checkpoint["converted"] == 8
+        assert asyncio.run(migrate_collection(db, "messages", ("created_at",))).get("skipped")
+        print("✓ Migration resumed after a failed batch and skips a finished collection")
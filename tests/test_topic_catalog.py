@@ -0,0 +1,84 @@
+"""
+Topic catalog tests - grade scopes, ETags and invalidation (in-memory Mongo stand-in)
+"""
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+from topic_catalog import TopicCatalog
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, field, direction):
+        self.docs = sorted(self.docs, key=lambda d: d[field], reverse=direction < 0)
+        return self
+
+    async def to_list(self, length):
+        return list(self.docs)
+
+    def __aiter__(self):
+        async def gen():
+            for doc in self.docs:
+                yield doc
+        return gen()
+
+
+class FakeCollection:
+    def __init__(self, docs):
+        self.docs = docs
+        self.finds = 0
+
+    def find(self, query, projection=None):
+        self.finds += 1
+        return FakeCursor([d for d in self.docs if all(d.get(k) == v for k, v in query.items())])
+
+
+class FakeDb:
+    def __init__(self, sources, subjects):
+        self.ai_sources = FakeCollection(sources)
+        self.subjects = FakeCollection(subjects)
+
+
+def source(i, grade_id, active=True):
+    return {"id": f"s{i}", "file_name": f"{i}.pdf", "subject_id": "m", "grade_id": grade_id,
+            "is_active": active, "created_at": f"2025-01-{i:02d}"}
+
+
+SUBJECTS = [{"id": "m", "name": "Matematika"}]
+
+
+class TestTopicCatalog:
+    """Materialized per-grade catalog"""
+
+    def test_scopes_and_order(self):
+        """Test that students see their grade plus general sources, newest first, without a cap"""
+        db = FakeDb([source(1, None), source(2, "g1"), source(3, "g2"), source(4, "g1", active=False)], SUBJECTS)
+        catalog = TopicCatalog(lambda: db, ttl_seconds=60)
+        everything = json.loads(asyncio.run(catalog.get(None))[1])
+        grade = json.loads(asyncio.run(catalog.get("g1"))[1])
+        assert [t["id"] for t in everything["topics"]] == ["s3", "s2", "s1"]
+        assert [t["id"] for t in grade["topics"]] == ["s2", "s1"]
+        assert grade["topics"][0]["subject_name"] == "Matematika"
+        # One build serves every scope
+        assert db.ai_sources.finds == 1
+        print("✓ Grade scopes rendered from one build")
+
+    def test_etag_changes_only_with_content(self):
+        """Test that rebuilding unchanged data keeps the ETag and a change produces a new one"""
+        db = FakeDb([source(1, None)], SUBJECTS)
+        catalog = TopicCatalog(lambda: db, ttl_seconds=60)
+        etag, _ = asyncio.run(catalog.get(None))
+        assert asyncio.run(catalog.get(None))[0] == etag
+        catalog.invalidate()
+        assert asyncio.run(catalog.get(None))[0] == etag
+        db.ai_sources.docs.append(source(2, None))
+        catalog.invalidate()
+        assert asyncio.run(catalog.get(None))[0] != etag
+        assert catalog.stats()["builds"] == 3
+        print("✓ ETag follows content")
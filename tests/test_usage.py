@@ -0,0 +1,97 @@
+"""
+LLM usage tests - in-memory aggregation, rollup upserts and retries after failed flushes (in-memory collection)
+"""
+import asyncio
+import sys
+from pathlib import Path
+
+from pymongo.errors import BulkWriteError
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+from usage import UsageRecorder, estimate_tokens
+
+
+class FakeCollection:
+    """Applies UpdateOne $inc/$max upserts; can fail some ops or the whole call"""
+
+    def __init__(self):
+        self.rollups = {}
+        self.fail_indexes = set()
+        self.unavailable = False
+
+    async def bulk_write(self, ops, ordered=True):
+        if self.unavailable:
+            raise ConnectionError("Mongo nedostupné")
+        errors = []
+        for index, op in enumerate(ops):
+            if index in self.fail_indexes:
+                errors.append({"index": index, "code": 11000, "errmsg": "E11000 duplicate key error"})
+                continue
+            key = tuple(op._filter.values())
+            doc = self.rollups.setdefault(key, {"latency_ms_max": 0})
+            for name, value in op._doc["$inc"].items():
+                doc[name] = doc.get(name, 0) + value
+            doc["latency_ms_max"] = max(doc["latency_ms_max"], op._doc["$max"]["latency_ms_max"])
+        self.fail_indexes = set()
+        if errors:
+            raise BulkWriteError({"writeErrors": errors, "nInserted": 0, "nUpserted": len(ops) - len(errors)})
+
+
+def record(recorder, user_id, endpoint="chat", latency_ms=100.0, success=True):
+    recorder.record(user_id, endpoint, "openai", "gpt-4o-mini", prompt_chars=40, response_chars=400,
+                    latency_ms=latency_ms, fallback_depth=0, success=success)
+
+
+def calls(collection):
+    return {key[0]: doc["calls"] for key, doc in collection.rollups.items()}
+
+
+class TestUsageRecorder:
+    """Aggregation and flushing"""
+
+    def test_aggregates_per_rollup(self):
+        """Test that events for one user, day, endpoint and model become one $inc upsert"""
+        recorder = UsageRecorder()
+        collection = FakeCollection()
+        for latency in (100.0, 250.0, 50.0):
+            record(recorder, "u1", latency_ms=latency)
+        record(recorder, "u1", success=False)
+        record(recorder, "u2", endpoint="quiz")
+        assert recorder.pending_keys == 2
+
+        assert asyncio.run(recorder.flush(collection)) == 2
+        doc = collection.rollups[next(k for k in collection.rollups if k[0] == "u1")]
+        assert (doc["calls"], doc["failures"]) == (4, 1)
+        assert doc["est_response_tokens"] == 4 * estimate_tokens(400)
+        assert doc["latency_ms_total"] == 500.0 and doc["latency_ms_max"] == 250.0
+        assert recorder.pending_keys == 0 and asyncio.run(recorder.flush(collection)) == 0
+        print("✓ 5 events flushed as 2 rollups")
+
+    def test_failed_flush_is_retried(self):
+        """Test that counters from a flush that failed entirely are kept and written next time"""
+        recorder = UsageRecorder()
+        collection = FakeCollection()
+        record(recorder, "u1")
+        collection.unavailable = True
+        assert asyncio.run(recorder.flush(collection)) == 0
+        record(recorder, "u1")
+        collection.unavailable = False
+        asyncio.run(recorder.flush(collection))
+        assert calls(collection) == {"u1": 2}
+        print("✓ Counters kept across a failed flush")
+
+    def test_partial_bulk_write_error_retries_only_failed_ops(self):
+        """Test that upserts applied before a BulkWriteError are not counted again on the retry"""
+        recorder = UsageRecorder()
+        collection = FakeCollection()
+        for user_id in ("u1", "u2", "u3"):
+            record(recorder, user_id)
+        # A concurrent worker inserted u2's new rollup first: E11000 for that op only
+        collection.fail_indexes = {1}
+        assert asyncio.run(recorder.flush(collection)) == 2
+        assert recorder.pending_keys == 1
+
+        asyncio.run(recorder.flush(collection))
+        assert calls(collection) == {"u1": 1, "u2": 1, "u3": 1}
+        print("✓ Only the rejected rollup was retried")
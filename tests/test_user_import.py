@@ -0,0 +1,76 @@
+"""
+Bulk user import tests - CSV parsing, name resolution and row-level errors (no database)
+"""
+import asyncio
+import sys
+from pathlib import Path
+
+import bcrypt
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+from user_import import bcrypt_rounds, hash_passwords, read_csv, validate_rows
+
+GRADES = [{"id": "g1", "name": "1. ročník"}, {"id": "g2", "name": "2. ročník"}]
+CLASSES = [
+    {"id": "c1", "name": "1.A", "grade_id": "g1"},
+    {"id": "c2", "name": "2.A", "grade_id": "g2"},
+    {"id": "c3", "name": "B", "grade_id": "g1"},
+    {"id": "c4", "name": "B", "grade_id": "g2"},
+]
+
+
+class TestValidateRows:
+    """One pass over the CSV with per-row errors"""
+
+    def test_slovak_headers_and_name_resolution(self):
+        """Test Excel-style ';' CSV with Slovak headers and diacritics-insensitive names"""
+        content = "\ufeffMeno;Priezvisko;E-mail;Rola;Ročník;Trieda\n" \
+                  "Ján;Novák;jan@skola.sk;žiak;1. rocnik;1.a\n" \
+                  "Eva;Malá;eva@skola.sk;učiteľka;;\n" \
+                  "Peter;Veľký;peter@skola.sk;;;2.A\n"
+        valid, errors = validate_rows(*read_csv(content.encode("utf-8")), GRADES, CLASSES)
+        assert errors == []
+        jan, eva, peter = valid
+        assert (jan.role, jan.grade_id, jan.class_id) == ("student", "g1", "c1")
+        assert (eva.role, eva.grade_id, eva.class_id) == ("teacher", None, None)
+        # Grade is taken from the class when only the class is given
+        assert (peter.grade_id, peter.class_id) == ("g2", "c2")
+        print("✓ Slovak CSV resolved to grade and class ids")
+
+    def test_row_errors(self):
+        """Test that bad rows are reported with their line number and do not stop the import"""
+        content = "email,first_name,last_name,role,grade,class\n" \
+                  "ok@skola.sk,A,B,student,,\n" \
+                  "not-an-email,A,B,student,,\n" \
+                  "OK@skola.sk,A,B,student,,\n" \
+                  "x@skola.sk,,B,student,,\n" \
+                  "y@skola.sk,A,B,riaditeľ,,\n" \
+                  "z@skola.sk,A,B,student,5. ročník,\n" \
+                  "w@skola.sk,A,B,student,,B\n"
+        valid, errors = validate_rows(*read_csv(content.encode("utf-8")), GRADES, CLASSES)
+        assert [row.email for row in valid] == ["ok@skola.sk"]
+        assert [error["row"] for error in errors] == [3, 4, 5, 6, 7, 8]
+        # Class "B" exists in two grades, so it is ambiguous without a grade
+        assert "Neznáma trieda" in errors[-1]["error"]
+        print(f"✓ {len(errors)} row errors reported")
+
+    def test_missing_columns(self):
+        """Test that a file without required columns is rejected as a whole"""
+        valid, errors = validate_rows(*read_csv(b"email,role\na@skola.sk,student\n"), GRADES, CLASSES)
+        assert valid == []
+        assert errors[0]["row"] == 1
+        print("✓ Missing columns reported")
+
+
+class TestHashPasswords:
+    """Parallel bcrypt hashing"""
+
+    def test_hashes_verify_and_use_requested_cost(self):
+        """Test that every row gets its own salted hash at the requested cost"""
+        hashes = asyncio.run(hash_passwords(["heslo1", "heslo2", "heslo1"], rounds=4, workers=2))
+        assert len(hashes) == 3
+        assert bcrypt.checkpw(b"heslo1", hashes[0].encode()) and bcrypt.checkpw(b"heslo1", hashes[2].encode())
+        assert hashes[0] != hashes[2]
+        assert bcrypt_rounds(hashes[1]) == 4
+        print("✓ Passwords hashed in the worker pool")